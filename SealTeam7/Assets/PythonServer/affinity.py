@@ -0,0 +1,35 @@
+import argparse
+import os
+
+
+def parse_cpu_list(value):
+    """argparse type for a list of CPU numbers like taskset's: "0-3,6" -> [0, 1, 2, 3, 6]"""
+    cpus = []
+    try:
+        for part in value.split(','):
+            first, _, last = part.partition('-')
+            cpus.extend(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected a list of CPUs like 0-3,6, got "{value}"')
+    if not cpus:
+        raise argparse.ArgumentTypeError('empty CPU list')
+    return sorted(set(cpus))
+
+def format_cpu_list(cpus):
+    return ','.join(str(cpu) for cpu in cpus)
+
+def available_cpus():
+    """CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+def pin_to_cpus(cpus):
+    """Restrict the current process to the given CPUs. On Linux this only applies to the calling thread and the
+    threads it starts afterwards, so call it before creating the landmarker and any other threads."""
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    else:
+        import win32api
+        import win32process
+        win32process.SetProcessAffinityMask(win32api.GetCurrentProcess(), sum(1 << cpu for cpu in cpus))
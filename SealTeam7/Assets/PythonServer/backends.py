@@ -0,0 +1,199 @@
+import dataclasses
+import threading
+import time
+
+import numpy as np
+from mediapipe.tasks.python import BaseOptions
+from mediapipe.tasks.python.components.containers.bounding_box import BoundingBox
+from mediapipe.tasks.python.components.containers.category import Category
+from mediapipe.tasks.python.components.containers.detections import Detection, DetectionResult
+from mediapipe.tasks.python.components.containers.landmark import NormalizedLandmark
+from mediapipe.tasks.python.vision import HandLandmarker, HandLandmarkerResult, ObjectDetector, RunningMode
+
+
+BACKENDS = ('gpu', 'cpu', 'stub')
+"""gpu and cpu run the MediaPipe model with that delegate, stub returns scripted landmarks without running a model"""
+
+STUB_SCRIPT_PERIOD = 120
+"""Number of frames after which the built-in stub script repeats"""
+
+STUB_OBJECTS = (("bunker", (0.15, 0.2, 0.1, 0.12)), ("spawner", (0.75, 0.25, 0.08, 0.1)))
+"""Category names and normalised (x, y, width, height) boxes the stub object detector finds in every image"""
+
+
+def default_backend(platform):
+    return 'cpu' if platform == 'windows' else 'gpu'
+
+def create_hand_landmarker(backend, options, stub_latency=0.0, stub_script=None):
+    """Create a hand landmarker for the given HandLandmarkerOptions, with the delegate chosen by the backend.
+
+    The stub ignores the model and returns scripted landmarks after sleeping for stub_latency seconds. stub_script is
+    an optional array of normalised (x, y, z) landmarks of shape (frames, hands, 21, 3), with NaN for an absent hand;
+    by default two hands move in circles."""
+    if backend == 'stub':
+        return StubHandLandmarker(options.running_mode, options.num_hands, stub_latency, stub_script,
+                                  options.result_callback)
+
+    delegate = BaseOptions.Delegate.GPU if backend == 'gpu' else BaseOptions.Delegate.CPU
+    options = dataclasses.replace(options, base_options=dataclasses.replace(options.base_options, delegate=delegate))
+    return HandLandmarker.create_from_options(options)
+
+def create_object_detector(backend, options, stub_latency=0.0):
+    """Create an object detector for the given ObjectDetectorOptions in the IMAGE running mode, with the delegate
+    chosen by the backend. The stub ignores the model and finds STUB_OBJECTS after sleeping for stub_latency seconds."""
+    if backend == 'stub':
+        return StubObjectDetector(stub_latency)
+
+    delegate = BaseOptions.Delegate.GPU if backend == 'gpu' else BaseOptions.Delegate.CPU
+    options = dataclasses.replace(options, base_options=dataclasses.replace(options.base_options, delegate=delegate))
+    return ObjectDetector.create_from_options(options)
+
+
+def _hand_template():
+    """Normalised (x, y, z) landmarks of an open right hand with the wrist at the origin"""
+    landmarks = np.zeros((21, 3))
+    for finger, angle in enumerate(np.radians([-60, -25, -5, 15, 35])):
+        direction = np.array([np.sin(angle), -np.cos(angle)])
+        for joint in range(4):
+            distance = 0.03 + 0.025 * joint
+            landmarks[1 + finger * 4 + joint, :2] = direction * distance
+            landmarks[1 + finger * 4 + joint, 2] = -0.005 * (joint + 1)
+    return landmarks
+
+def default_stub_script(num_frames=STUB_SCRIPT_PERIOD):
+    """Left hand (mirrored template) and right hand each moving in a circle on their side of the frame"""
+    template = _hand_template()
+    mirrored = template * [-1, 1, 1]
+    phase = 2 * np.pi * np.arange(num_frames) / num_frames
+    script = np.empty((num_frames, 2, 21, 3))
+    for hand, (landmarks, centre_x) in enumerate(((mirrored, 0.3), (template, 0.7))):
+        centres = np.stack([centre_x + 0.1 * np.cos(phase), 0.6 + 0.1 * np.sin(phase), np.zeros(num_frames)], axis=1)
+        script[:, hand] = centres[:, None, :] + landmarks
+    return script
+
+
+class StubHandLandmarker:
+    """Stands in for MediaPipe's HandLandmarker without running a model, for benchmarking everything around it.
+
+    Every call returns the next frame of the script, regardless of the image, so the results are deterministic. The
+    landmarks are normalised to whatever image is passed in, so with --roi they do not follow the crop. Hands in the
+    script are labelled Left and Right in order.
+
+    In the LIVE_STREAM running mode, detect_async hands the frames to a worker thread that calls result_callback, and
+    like MediaPipe only keeps the newest frame waiting while it is busy, dropping older ones without a callback."""
+
+    def __init__(self, running_mode, num_hands=2, latency=0.0, script=None, result_callback=None):
+        self.running_mode = running_mode
+        self.latency = latency
+        self.__last_timestamp_ms = -1
+        self.__frame = 0
+        script = default_stub_script() if script is None else script
+        self.__results = [self.__make_result(hands[:num_hands]) for hands in script]
+
+        self.__worker = None
+        if running_mode == RunningMode.LIVE_STREAM:
+            if result_callback is None:
+                raise ValueError("The LIVE_STREAM running mode requires a result_callback")
+            self.__result_callback = result_callback
+            self.__queued = None
+            self.__closed = False
+            self.__queue_changed = threading.Condition()
+            self.__worker = threading.Thread(target=self.__run_live_stream, name="stub hand landmarker", daemon=True)
+            self.__worker.start()
+
+    @staticmethod
+    def __make_result(hands):
+        hand_landmarks = []
+        handedness = []
+        for index, landmarks in enumerate(hands):
+            if np.isnan(landmarks).any():
+                continue
+            hand_landmarks.append([NormalizedLandmark(x=float(x), y=float(y), z=float(z)) for x, y, z in landmarks])
+            handedness.append([Category(index=index, score=1.0, display_name="Left" if index == 0 else "Right",
+                                        category_name="Left" if index == 0 else "Right")])
+        return HandLandmarkerResult(handedness=handedness, hand_landmarks=hand_landmarks, hand_world_landmarks=[])
+
+    def __next_result(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        result = self.__results[self.__frame % len(self.__results)]
+        self.__frame += 1
+        return result
+
+    def detect(self, image):
+        if self.running_mode != RunningMode.IMAGE:
+            raise ValueError("detect requires the IMAGE running mode")
+        return self.__next_result()
+
+    def detect_for_video(self, image, timestamp_ms):
+        if self.running_mode != RunningMode.VIDEO:
+            raise ValueError("detect_for_video requires the VIDEO running mode")
+        if timestamp_ms <= self.__last_timestamp_ms:
+            raise ValueError(f"Input timestamp must be monotonically increasing, got {timestamp_ms} after "
+                             f"{self.__last_timestamp_ms}")
+        self.__last_timestamp_ms = timestamp_ms
+        return self.__next_result()
+
+    def detect_async(self, image, timestamp_ms):
+        if self.running_mode != RunningMode.LIVE_STREAM:
+            raise ValueError("detect_async requires the LIVE_STREAM running mode")
+        if timestamp_ms <= self.__last_timestamp_ms:
+            raise ValueError(f"Input timestamp must be monotonically increasing, got {timestamp_ms} after "
+                             f"{self.__last_timestamp_ms}")
+        self.__last_timestamp_ms = timestamp_ms
+        with self.__queue_changed:
+            self.__queued = (image, timestamp_ms)  # replaces (drops) a frame that is still waiting
+            self.__queue_changed.notify()
+
+    def __run_live_stream(self):
+        while True:
+            with self.__queue_changed:
+                self.__queue_changed.wait_for(lambda: self.__queued is not None or self.__closed)
+                if self.__queued is None:
+                    return
+                image, timestamp_ms = self.__queued
+                self.__queued = None
+            self.__result_callback(self.__next_result(), image, timestamp_ms)
+
+    def close(self):
+        if self.__worker is not None:
+            # Like MediaPipe, finish the frame that is waiting before stopping
+            with self.__queue_changed:
+                self.__closed = True
+                self.__queue_changed.notify()
+            self.__worker.join()
+            self.__worker = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StubObjectDetector:
+    """Stands in for MediaPipe's ObjectDetector without running a model. Every call finds the STUB_OBJECTS, scaled to
+    the image that is passed in."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def detect(self, image):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        detections = []
+        for index, (name, (x, y, width, height)) in enumerate(STUB_OBJECTS):
+            box = BoundingBox(origin_x=int(x * image.width), origin_y=int(y * image.height),
+                              width=int(width * image.width), height=int(height * image.height))
+            detections.append(Detection(bounding_box=box, categories=[
+                Category(index=index, score=1.0, display_name=name, category_name=name)]))
+        return DetectionResult(detections=detections)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from ipc import READY_EVENT_NAME, DONE_EVENT_NAME, LinuxIPC, namespaced
+
+
+# Measures the ready/done handshake between a producer and the server's wait_ready on Linux, without frames or a
+# model: the round trip from posting the ready semaphore to receiving the done post, and the time the server takes to
+# exit after SIGINT. "blocking" is how the server waits now, "polling" waits 100 ms at a time and only notices a
+# shutdown between waits, as the server used to.
+POLL_INTERVAL = 0.1  # seconds
+WAIT_MODES = ('blocking', 'polling')
+
+def serve(mode, namespace):
+    """Echo a done post for every ready post until SIGINT"""
+    ipc = LinuxIPC(namespace=namespace)
+    stop = False
+
+    def signal_handler(signum, frame):
+        nonlocal stop
+        stop = True
+        if mode == 'blocking':
+            ipc.request_shutdown()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    print("Ready.", flush=True)
+    try:
+        while not stop:
+            if ipc.wait_ready(None if mode == 'blocking' else POLL_INTERVAL) and not stop:
+                ipc.set_done()
+    finally:
+        ipc.close()
+
+def measure(mode, round_trips):
+    """Start a server waiting in the given mode. Returns the round trip latencies and the shutdown latency in seconds."""
+    import posix_ipc
+    namespace = f"benchmark_{mode}_{os.getpid()}"
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--namespace', namespace],
+                              stdout=subprocess.PIPE, text=True)
+    ready_event = done_event = None
+    try:
+        if server.stdout.readline().strip() != "Ready.":
+            raise SystemExit(f"The server exited before it was ready (code {server.wait()})")
+        ready_event = posix_ipc.Semaphore(namespaced(READY_EVENT_NAME, namespace))
+        done_event = posix_ipc.Semaphore(namespaced(DONE_EVENT_NAME, namespace))
+
+        latencies = np.zeros(round_trips)
+        for i in range(round_trips):
+            start_time = time.perf_counter()
+            ready_event.release()
+            done_event.acquire()
+            latencies[i] = time.perf_counter() - start_time
+
+        time.sleep(POLL_INTERVAL * np.random.rand())  # signals land at random points of the polling interval
+        start_time = time.perf_counter()
+        server.send_signal(signal.SIGINT)
+        server.wait()
+        return latencies, time.perf_counter() - start_time
+    finally:
+        if server.poll() is None:
+            server.kill()
+            server.wait()
+        for event in (ready_event, done_event):
+            if event is not None:
+                event.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure the round trip latency of the ready/done handshake and the '
+                                                 'shutdown latency of blocking and polling waits.')
+    parser.add_argument('--round-trips', type=int, default=10000, metavar='N', help='Handshakes per run. Default 10000.')
+    parser.add_argument('--runs', type=int, default=5, metavar='N',
+                        help='Servers to start per mode, for the shutdown latency. Default 5.')
+    parser.add_argument('--serve', choices=WAIT_MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--namespace', default='', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        serve(args.serve, args.namespace)
+        sys.exit()
+
+    for mode in WAIT_MODES:
+        runs = [measure(mode, args.round_trips) for _ in range(args.runs)]
+        latencies_us = np.concatenate([latencies for latencies, _ in runs]) * 1e6
+        shutdown_ms = np.array([shutdown for _, shutdown in runs]) * 1000
+        print(f"\n{mode}:")
+        print(f"Round trip: {np.mean(latencies_us):.1f} us mean, {np.percentile(latencies_us, 50):.1f} us p50, "
+              f"{np.percentile(latencies_us, 99):.1f} us p99, {np.max(latencies_us):.1f} us max")
+        print(f"Shutdown: {np.mean(shutdown_ms):.1f} ms mean, {np.max(shutdown_ms):.1f} ms max")
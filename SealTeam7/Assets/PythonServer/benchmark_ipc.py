@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from ipc import COLOUR_IMAGE_NUM_CHANNELS, FRAME_CAPACITY, MAX_FRAME_SLOTS, LinuxIPC, LinuxProducerIPC
+from preprocess import parse_resolution
+
+
+# Measures the IPC layer on its own: a producer writes frames over the same shared memory and semaphores as
+# testing.py and replay.py, and an echo consumer (a child process using LinuxIPC like main.py) copies each frame out as
+# the mp.Image would and signals done straight away. Frames are sent at the benchmarked size, which the frame header
+# tells the consumer. For every frame size, number of frame slots and way of writing the frame it reports the round
+# trip latency of one frame at a time and the sustained frame rate with the ring kept full.
+#
+# Write modes:
+#   tobytes           frame.tobytes() and copy the bytes into the slot
+#   view              copy the frame into an ndarray view of the slot (LinuxProducerIPC.next_frame)
+#   cvtcolor_tobytes  convert a BGR capture to RGB into a new array, then as tobytes
+#   cvtcolor_view     convert a BGR capture to RGB straight into the view of the slot with dst=
+#   bgr_view          copy a BGR capture into the view of the slot as is and mark it as BGR, as testing.py does
+WRITE_MODES = ('tobytes', 'view', 'cvtcolor_tobytes', 'cvtcolor_view', 'bgr_view')
+SERVER_SHUTDOWN_TIMEOUT = 10  # seconds
+
+def serve(namespace, frame_slots):
+    """Echo consumer: copy every frame as its header describes it and signal done, until SIGINT"""
+    ipc = LinuxIPC(frame_slots, namespace=namespace)
+    signal.signal(signal.SIGINT, lambda signum, frame: ipc.request_shutdown())
+    copy = np.empty(FRAME_CAPACITY, dtype=np.uint8)
+    print("Ready.", flush=True)
+    try:
+        while ipc.wait_ready():
+            result = ipc.read_frame()
+            if result is None:
+                continue
+            seq, frame, header = result
+            np.copyto(copy[:frame.size].reshape(frame.shape), frame)
+            del frame
+            ipc.set_done()
+    finally:
+        ipc.close()
+
+def write(ipc, mode, capture):
+    """Write one frame (a BGR capture of the benchmarked size) in the given mode and signal the server"""
+    height, width, _ = capture.shape
+    slot = ipc.next_frame(width, height, 'bgr' if mode == 'bgr_view' else 'rgb')
+    if mode == 'tobytes':
+        slot.reshape(-1)[:] = np.frombuffer(capture.tobytes(), dtype=np.uint8)
+    elif mode in ('view', 'bgr_view'):
+        np.copyto(slot, capture)
+    elif mode == 'cvtcolor_tobytes':
+        slot.reshape(-1)[:] = np.frombuffer(cv2.cvtColor(capture, cv2.COLOR_BGR2RGB).tobytes(), dtype=np.uint8)
+    else:
+        cv2.cvtColor(capture, cv2.COLOR_BGR2RGB, dst=slot)
+    del slot  # don't keep the shared memory exported
+    ipc.publish_frame()
+
+def measure(ipc, mode, capture, frames, duration):
+    """Round trip latencies of frames written one at a time, in seconds, and the frame rate with the ring kept full"""
+    latencies = np.zeros(frames)
+    for i in range(frames):
+        start_time = time.perf_counter()
+        write(ipc, mode, capture)
+        ipc.wait_done()
+        latencies[i] = time.perf_counter() - start_time
+
+    frames_sent = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < duration:
+        write(ipc, mode, capture)
+        frames_sent += 1
+    while ipc.frames_in_flight > 0:
+        ipc.wait_done()
+    return latencies, frames_sent / (time.perf_counter() - start_time)
+
+def run(frame_slots, size, modes, frames, duration):
+    """Start an echo consumer and measure every write mode against it. Returns one result dict per mode."""
+    width, height = size
+    frame_size = width * height * COLOUR_IMAGE_NUM_CHANNELS
+    namespace = f"benchmark_ipc_{os.getpid()}"
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', namespace, str(frame_slots)],
+                              stdout=subprocess.PIPE, text=True)
+    ipc = None
+    try:
+        if server.stdout.readline().strip() != "Ready.":
+            raise SystemExit(f"The echo consumer exited before it was ready (code {server.wait()})")
+        ipc = LinuxProducerIPC(namespace)
+        capture = np.random.default_rng(0).integers(0, 256, (height, width, COLOUR_IMAGE_NUM_CHANNELS), dtype=np.uint8)
+        results = []
+        for mode in modes:
+            measure(ipc, mode, capture, 10, 0)  # warm up
+            latencies, frames_per_second = measure(ipc, mode, capture, frames, duration)
+            latencies_us = latencies * 1e6
+            results.append({
+                "frame_size": f"{width}x{height}",
+                "frame_bytes": frame_size,
+                "frame_slots": frame_slots,
+                "mode": mode,
+                "round_trip_us": {
+                    "mean": float(np.mean(latencies_us)),
+                    "p50": float(np.percentile(latencies_us, 50)),
+                    "p95": float(np.percentile(latencies_us, 95)),
+                    "p99": float(np.percentile(latencies_us, 99)),
+                    "max": float(np.max(latencies_us)),
+                },
+                "frames_per_second": frames_per_second,
+            })
+        return results
+    finally:
+        if ipc is not None:
+            ipc.close()
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(SERVER_SHUTDOWN_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+def regressions(results, baseline, tolerance):
+    """Describe the results that are more than tolerance (a fraction) worse than the matching baseline result"""
+    key = lambda result: (result["frame_size"], result["frame_slots"], result["mode"])
+    baseline_results = {key(result): result for result in baseline["results"]}
+    found = []
+    for result in results:
+        previous = baseline_results.get(key(result))
+        if previous is None:
+            continue
+        name = f"{result['frame_size']}, {result['frame_slots']} slot(s), {result['mode']}"
+        if result["round_trip_us"]["p50"] > previous["round_trip_us"]["p50"] * (1 + tolerance):
+            found.append(f"{name}: p50 round trip {previous['round_trip_us']['p50']:.0f} -> "
+                         f"{result['round_trip_us']['p50']:.0f} us")
+        if result["frames_per_second"] < previous["frames_per_second"] * (1 - tolerance):
+            found.append(f"{name}: {previous['frames_per_second']:.0f} -> {result['frames_per_second']:.0f} frames/s")
+    return found
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--serve']:
+        serve(sys.argv[2], int(sys.argv[3]))
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description='Measure the round trip latency and frame rate of the shared memory '
+                                                 'IPC layer with an echo consumer, on Linux.')
+    parser.add_argument('--sizes', type=parse_resolution, nargs='+', metavar='WIDTHxHEIGHT',
+                        default=[(640, 360), (1280, 720), (1920, 1080)], help='Frame sizes, at most 1920x1080.')
+    parser.add_argument('--frame-slots', type=int, nargs='+', default=[1, 3], metavar='N',
+                        help='Numbers of frame slots to compare. Default 1 3.')
+    parser.add_argument('--modes', nargs='+', choices=WRITE_MODES, default=list(WRITE_MODES))
+    parser.add_argument('--frames', type=int, default=500, metavar='N',
+                        help='Frames to send one at a time for the round trip latency. Default 500.')
+    parser.add_argument('--duration', type=float, default=2, metavar='SECONDS',
+                        help='Time to send frames as fast as possible for the frame rate. Default 2.')
+    parser.add_argument('--output', metavar='PATH', help='Write the results to PATH as JSON.')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='JSON results of an earlier run to compare against. Exits with status 1 on a regression.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Fraction by which a result may be worse than the baseline. Default 0.2.')
+    args = parser.parse_args()
+    for frame_slots in args.frame_slots:
+        if not 1 <= frame_slots <= MAX_FRAME_SLOTS:
+            parser.error(f'--frame-slots must be between 1 and {MAX_FRAME_SLOTS}')
+
+    results = []
+    for frame_slots in args.frame_slots:
+        for size in args.sizes:
+            for result in run(frame_slots, size, args.modes, args.frames, args.duration):
+                results.append(result)
+                latency = result["round_trip_us"]
+                print(f"{result['frame_size']}, {frame_slots} slot(s), {result['mode']}: round trip "
+                      f"{latency['mean']:.0f} us mean, {latency['p50']:.0f} us p50, {latency['p99']:.0f} us p99, "
+                      f"{latency['max']:.0f} us max; {result['frames_per_second']:.0f} frames/s")
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count(),
+                    "python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__},
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote the results to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print(f"Regression: {regression}")
+        if found:
+            sys.exit(1)
+        print("No regressions against the baseline")
@@ -0,0 +1,77 @@
+import time
+import numpy as np
+from mediapipe.tasks.python.components.containers.category import Category
+from mediapipe.tasks.python.components.containers.landmark import NormalizedLandmark
+from mediapipe.tasks.python.vision import HandLandmarkerResult
+
+from hand_tracking import MAX_DETECTED_HANDS, result_to_array
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT
+
+
+def landmarks_to_array(landmarks):
+    """Per-hand converter of the original main.py, kept here for comparison"""
+    if landmarks is None:
+        return None
+    arr = np.array([[landmark.x * COLOUR_IMAGE_FULL_WIDTH,
+                     -landmark.z * COLOUR_IMAGE_FULL_WIDTH,
+                     landmark.y * COLOUR_IMAGE_FULL_HEIGHT] for landmark in landmarks])
+    return arr
+
+def make_result(num_hands, rng):
+    hand_landmarks = [[NormalizedLandmark(x=x, y=y, z=z) for x, y, z in rng.random((21, 3))]
+                      for _ in range(num_hands)]
+    handedness = [[Category(index=i, score=1.0, category_name="Left" if i == 0 else "Right")]
+                  for i in range(num_hands)]
+    return HandLandmarkerResult(handedness=handedness, hand_landmarks=hand_landmarks, hand_world_landmarks=[])
+
+def benchmark_per_hand(results):
+    """The original main.py converted each detected hand once, whichever handedness branch it took"""
+    start_time = time.perf_counter()
+    for result in results:
+        hands = [landmarks_to_array(landmarks) for landmarks in result.hand_landmarks]
+    end_time = time.perf_counter()
+    return (end_time - start_time) / len(results)
+
+def benchmark_batched(results):
+    out = np.zeros((MAX_DETECTED_HANDS, 21, 3), dtype=np.float32)
+    start_time = time.perf_counter()
+    for result in results:
+        hands = result_to_array(result, out)
+    end_time = time.perf_counter()
+    return (end_time - start_time) / len(results)
+
+def best_of(repeats, benchmarks, results):
+    """Fastest time per frame of each benchmark over several interleaved runs, which is far less noisy than a single
+    run on a busy machine"""
+    times = [float('inf')] * len(benchmarks)
+    for _ in range(repeats):
+        for i, benchmark in enumerate(benchmarks):
+            times[i] = min(times[i], benchmark(results))
+    return times
+
+if __name__ == "__main__":
+    n_frames = 5000
+    repeats = 15
+    rng = np.random.default_rng(0)
+    print(f"Benchmarking landmark conversion over {n_frames:,} frames, best of {repeats} runs:")
+
+    # Check both converters agree
+    result = make_result(2, rng)
+    out = np.zeros((MAX_DETECTED_HANDS, 21, 3), dtype=np.float32)
+    expected = np.stack([landmarks_to_array(landmarks) for landmarks in result.hand_landmarks])
+    assert np.allclose(result_to_array(result, out), expected, rtol=1e-6, atol=1e-3)
+
+    for num_hands in (1, 2):
+        results = [make_result(num_hands, rng) for _ in range(n_frames)]
+
+        # Warm up
+        benchmark_per_hand(results[:100])
+        benchmark_batched(results[:100])
+
+        # Actual benchmark
+        per_hand_time, batched_time = best_of(repeats, (benchmark_per_hand, benchmark_batched), results)
+
+        print(f"\n{num_hands} hand(s) per frame:")
+        print(f"Original per-hand conversion: {per_hand_time * 1e6:.1f} us/frame")
+        print(f"result_to_array into the tracker's buffer: {batched_time * 1e6:.1f} us/frame")
+        print(f"Speedup: {per_hand_time / batched_time:.2f}x")
@@ -0,0 +1,110 @@
+import argparse
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+from mediapipe.tasks.python import BaseOptions
+from mediapipe.tasks.python.vision import HandLandmarker, HandLandmarkerOptions, RunningMode
+
+from hand_tracking import MAX_DETECTED_HANDS, result_to_array
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT
+from preprocess import INTERPOLATIONS, Downscaler, parse_resolution
+
+
+def read_clip(path, max_frames):
+    """Yield RGB frames of a recorded clip at the full server resolution"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open {path}")
+    try:
+        for _ in range(max_frames):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame.shape[:2] != (COLOUR_IMAGE_FULL_HEIGHT, COLOUR_IMAGE_FULL_WIDTH):
+                frame = cv2.resize(frame, (COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT))
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        cap.release()
+
+def run(clip, max_frames, options, size, interpolation):
+    """Run the landmarker over the clip at the given input size.
+
+    Returns the per-frame latency of downscaling plus inference in seconds, and per frame a dict from handedness to
+    the (21, 3) landmarks in full-frame pixels."""
+    downscaler = None if size == (COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT) else Downscaler(*size, interpolation)
+    out = np.zeros((MAX_DETECTED_HANDS, 21, 3), dtype=np.float32)
+    latencies = []
+    hands_per_frame = []
+    with HandLandmarker.create_from_options(options) as hand_landmarker:
+        for i, frame in enumerate(read_clip(clip, max_frames)):
+            start_time = time.perf_counter()
+            if downscaler is not None:
+                frame = downscaler(frame)
+            result = hand_landmarker.detect_for_video(mp.Image(image_format=mp.ImageFormat.SRGB, data=frame),
+                                                      i * 33)  # timestamps only need to increase
+            end_time = time.perf_counter()
+            latencies.append(end_time - start_time)
+
+            hands = result_to_array(result, out)
+            hands_per_frame.append({handedness[0].category_name: landmarks.copy()
+                                    for handedness, landmarks in zip(result.handedness, hands)})
+    return np.array(latencies), hands_per_frame
+
+def deviation(reference, hands_per_frame):
+    """Per-landmark distance in pixels (x and y only) from the reference, over the hands found in both runs.
+    Also returns the fraction of the reference's hands that were found."""
+    distances = []
+    found, total = 0, 0
+    for reference_hands, hands in zip(reference, hands_per_frame):
+        for handedness, reference_landmarks in reference_hands.items():
+            total += 1
+            if handedness in hands:
+                found += 1
+                offset = hands[handedness][:, [0, 2]] - reference_landmarks[:, [0, 2]]
+                distances.append(np.linalg.norm(offset, axis=1))
+    distances = np.concatenate(distances) if distances else np.zeros(0)
+    return distances, found / total if total else float('nan')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare landmarker latency and accuracy at different input sizes on '
+                                                 'a recorded clip. The first size is the reference.')
+    parser.add_argument('clip', help='Video file to read frames from.')
+    parser.add_argument('--sizes', type=parse_resolution, nargs='+', metavar='WIDTHxHEIGHT',
+                        default=[(1920, 1080), (960, 540), (640, 360)], help='Input sizes to compare.')
+    parser.add_argument('--interpolation', choices=INTERPOLATIONS, default='linear')
+    parser.add_argument('--frames', type=int, default=300, help='Maximum number of frames to read from the clip.')
+    parser.add_argument('--model', default='hand_landmarking_model.task')
+    parser.add_argument('--gpu', action='store_true', help='Use the GPU delegate, as the server does on Linux.')
+    args = parser.parse_args()
+
+    base_options = BaseOptions(model_asset_path=args.model,
+                               delegate=BaseOptions.Delegate.GPU if args.gpu else BaseOptions.Delegate.CPU)
+    options = HandLandmarkerOptions(
+        base_options=base_options,
+        running_mode=RunningMode.VIDEO,
+        num_hands=2,
+        min_hand_detection_confidence=0.05,
+        min_hand_presence_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+    reference = None
+    for width, height in args.sizes:
+        run(args.clip, 10, options, (width, height), args.interpolation)  # warm up
+        latencies, hands_per_frame = run(args.clip, args.frames, options, (width, height), args.interpolation)
+        if reference is None:
+            reference = hands_per_frame
+
+        print(f"\n{width}x{height} ({len(latencies)} frames):")
+        print(f"Latency: {np.mean(latencies) * 1000:.1f} ms/frame mean, "
+              f"{np.percentile(latencies, 95) * 1000:.1f} ms p95")
+        if hands_per_frame is reference:
+            print("Reference for landmark deviation")
+            continue
+        distances, found = deviation(reference, hands_per_frame)
+        print(f"Hands found: {found:.1%} of reference")
+        if len(distances) > 0:
+            print(f"Landmark deviation: {np.mean(distances):.1f} px mean, {np.percentile(distances, 95):.1f} px p95, "
+                  f"{np.max(distances):.1f} px max")
@@ -0,0 +1,75 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from ipc import open_stats
+from metrics import format_report, snapshot
+
+
+# Compares the VIDEO and LIVE_STREAM running modes of the server end to end: for each mode a server is started in its
+# own namespace, replay.py plays a recording to it, and the frame rate and round trip latency that replay.py measured
+# are printed together with the server's frame counts. Linux only, like replay.py.
+RUNNING_MODES = ('video', 'live_stream')
+SERVER_SHUTDOWN_TIMEOUT = 10  # seconds
+
+directory = os.path.dirname(os.path.abspath(__file__))
+
+def run(mode, recording, replay_args, server_args):
+    """Replay the recording to a server in the given running mode. Returns the lines printed by replay.py and the
+    server's summary line."""
+    namespace = f"benchmark_{mode}_{os.getpid()}"
+    server = subprocess.Popen([sys.executable, '-u', os.path.join(directory, 'main.py'), '--platform', 'linux',
+                               '--namespace', namespace, '--running-mode', mode, *server_args],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        for line in server.stdout:
+            if line.strip() == "Ready.":
+                break
+        else:
+            raise SystemExit(f"The server exited before it was ready (code {server.wait()})")
+        threading.Thread(target=server.stdout.read, daemon=True).start()  # so that its output can't fill the pipe
+
+        replay = subprocess.run([sys.executable, os.path.join(directory, 'replay.py'), recording, '--namespace',
+                                 namespace, *replay_args], capture_output=True, text=True)
+        if replay.returncode != 0:
+            raise SystemExit(f"replay.py failed:\n{replay.stdout}{replay.stderr}")
+        stats_buffer = open_stats('linux', namespace)
+        try:
+            summary = format_report(snapshot(stats_buffer))[-1]
+        finally:
+            stats_buffer.close()
+        return replay.stdout.splitlines()[1:], summary
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(SERVER_SHUTDOWN_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare the throughput and latency of the server in the VIDEO and LIVE_STREAM running modes by '
+                    'replaying a recording to it.',
+        epilog='Arguments after "--" are passed to the server, e.g. -- --frame-slots 3 --backend stub')
+    parser.add_argument('recording', help='File written by main.py --record.')
+    parser.add_argument('--loops', type=int, default=3, metavar='N', help='Replay the recording N times. Default 3.')
+    parser.add_argument('--recorded-rate', action='store_true',
+                        help='Replay at the recorded frame rate instead of as fast as the server accepts frames.')
+    parser.add_argument('--modes', nargs='+', choices=RUNNING_MODES, default=list(RUNNING_MODES))
+    argv = sys.argv[1:]
+    server_args = []
+    if '--' in argv:
+        argv, server_args = argv[:argv.index('--')], argv[argv.index('--') + 1:]
+    args = parser.parse_args(argv)
+    replay_args = ['--loops', str(args.loops)] + ([] if args.recorded_rate else ['--max-rate'])
+
+    for mode in args.modes:
+        replay_lines, summary = run(mode, args.recording, replay_args, server_args)
+        print(f"\n{mode}:")
+        for line in replay_lines:
+            print(line)
+        print(summary)
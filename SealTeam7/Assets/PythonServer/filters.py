@@ -0,0 +1,90 @@
+import numpy as np
+
+from ipc import HAND_LANDMARKS_SHAPE
+
+
+class OneEuroFilter:
+    """One Euro filter (Casiez et al. 2012) over the landmarks of both hands at once.
+
+    Each coordinate is low-pass filtered with a cutoff frequency that rises with its speed: min_cutoff (Hz) removes
+    jitter while a hand is still and beta (Hz per pixel/s) reduces lag while it moves. The filtered speed is kept as
+    well, which is used to extrapolate the landmarks a short time ahead. All state lives in preallocated float32 arrays
+    of shape (hands, 21, 3), and a hand's state is reset when it is not detected so that it doesn't drift in from where
+    it was lost. A sample that is not newer than the last one of its hand is skipped, keeping the hand's state."""
+
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0, shape=HAND_LANDMARKS_SHAPE):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value = np.zeros(shape, dtype=np.float32)
+        """Filtered landmarks"""
+        self.velocity = np.zeros(shape, dtype=np.float32)
+        """Filtered rate of change of the landmarks per second"""
+        self.present = np.zeros(shape[0], dtype=bool)
+        self.__timestamps = np.zeros(shape[0], dtype=np.int64)
+        self.__raw = np.zeros(shape, dtype=np.float32)
+        self.__previous_raw = np.zeros(shape, dtype=np.float32)
+        self.__alpha = np.zeros(shape, dtype=np.float32)
+        self.__scratch = np.zeros(shape, dtype=np.float32)
+        self.__dt = np.zeros((shape[0], 1, 1), dtype=np.float32)
+
+    def update(self, timestamp, hands):
+        """Filter one frame. timestamp is in nanoseconds and hands is a sequence with a (21, 3) array or None per hand.
+        Returns the filtered landmarks, which are only valid for the hands in present. A hand whose last sample is not
+        older than timestamp keeps its filtered state and its sample is ignored."""
+        was_present = self.present.copy()
+        for i, hand in enumerate(hands):
+            self.present[i] = hand is not None
+            if hand is not None:
+                self.__raw[i] = hand
+        update = self.present & was_present & (self.__timestamps < timestamp)
+        start = self.present & ~was_present
+        accepted = update | start
+
+        # Hands that (re)appeared start from their raw position at rest
+        self.value[start] = self.__raw[start]
+        self.velocity[start] = 0
+        dt = self.__dt
+        dt[:, 0, 0] = (timestamp - self.__timestamps) / 1e9
+        dt[~update] = 1  # anything positive, the result is discarded
+        self.__timestamps[accepted] = timestamp
+        if not update.any():
+            np.copyto(self.__previous_raw, self.__raw, where=accepted[:, None, None])
+            return self.value
+
+        # Speed between the raw landmarks of consecutive frames, smoothed with the fixed derivative cutoff. (The paper
+        # differences against the previous filtered value, which overestimates the speed by the lag of the filter.)
+        speed = np.subtract(self.__raw, self.__previous_raw, out=self.__scratch)
+        speed /= dt
+        self.__smoothing_factor(self.d_cutoff, dt)
+        speed -= self.velocity
+        speed *= self.__alpha
+        np.add(self.velocity, speed, out=self.velocity, where=update[:, None, None])
+        # Landmarks, smoothed with a cutoff that rises with the speed
+        cutoff = np.abs(self.velocity, out=self.__scratch)
+        cutoff *= self.beta
+        cutoff += self.min_cutoff
+        self.__smoothing_factor(cutoff, dt)
+        change = np.subtract(self.__raw, self.value, out=self.__scratch)
+        change *= self.__alpha
+        np.add(self.value, change, out=self.value, where=update[:, None, None])
+        np.copyto(self.__previous_raw, self.__raw, where=accepted[:, None, None])
+        return self.value
+
+    def __smoothing_factor(self, cutoff, dt):
+        """alpha = 1 / (1 + tau / dt) with tau = 1 / (2 pi cutoff), into self.__alpha"""
+        alpha = self.__alpha
+        np.multiply(cutoff, 2 * np.pi, out=alpha)
+        alpha *= dt
+        alpha += 1
+        np.reciprocal(alpha, out=alpha)
+        np.subtract(1, alpha, out=alpha)
+
+    def predict(self, horizon, out):
+        """Extrapolate the filtered landmarks horizon seconds ahead at their filtered speed, into out"""
+        np.multiply(self.velocity, horizon, out=out)
+        out += self.value
+        return out
+
+    def reset(self):
+        self.present.fill(False)
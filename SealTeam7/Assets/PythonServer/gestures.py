@@ -0,0 +1,113 @@
+import numpy as np
+
+from ipc import HAND_LANDMARKS_SHAPE
+
+
+GESTURE_MAP = {
+    "None": 0,
+    "Closed_Fist": 1,
+    "Open_Palm": 2,
+    "Pointing_Up": 3,
+    "Thumb_Down": 4,
+    "Thumb_Up": 5,
+    "Victory": 6,
+    "Spock": 7,
+    "Calling": 8,
+    "ILoveYou": 9
+}
+"""Gesture IDs written to the gestures segment, as listed in Gestures.cs"""
+
+GESTURE_FINGERS = {
+    "Closed_Fist": (0, 0, 0, 0, 0),
+    "Open_Palm": (1, 1, 1, 1, 1),
+    "Pointing_Up": (0, 1, 0, 0, 0),
+    "Thumb_Up": (1, 0, 0, 0, 0),
+    "Victory": (0, 1, 1, 0, 0),
+    "Calling": (1, 0, 0, 0, 1),
+    "ILoveYou": (1, 1, 0, 0, 1),
+}
+"""Which fingers (thumb, index, middle, ring, pinky) are extended in each gesture. Thumb_Down is Thumb_Up with the
+thumb pointing down the image and Spock is Open_Palm with a gap between the middle and ring finger."""
+
+FINGER_TIPS = [4, 8, 12, 16, 20]
+FINGER_JOINTS = [2, 6, 10, 14, 18]
+"""Thumb MCP and the PIP joints of the other fingers"""
+WRIST, INDEX_MCP, PINKY_MCP = 0, 5, 17
+
+EXTENDED_RATIO = np.array([[1.1, 1.0, 1.0, 1.0, 1.0], [1.5, 1.4, 1.4, 1.4, 1.4]], dtype=np.float32)
+"""Distance of a fingertip over the distance of its joint, from the wrist (from the pinky MCP for the thumb), at which a
+finger starts to count as extended and at which it is fully extended. A curled fingertip is closer than its joint."""
+SPOCK_GAP_RATIO = 1.8
+"""Gap between the middle and ring fingertips, relative to the mean gap between the index and middle and between the
+ring and pinky fingertips, from which an open palm is Spock"""
+
+
+class GestureClassifier:
+    """Classifies the gestures of both hands from their landmarks, without a second model.
+
+    Each finger gets an extension score between 0 (curled) and 1 (extended) from how far its tip is from the wrist
+    compared to its middle joint, and each gesture scores the worst match of any finger against its pattern in
+    GESTURE_FINGERS. The best gesture is reported if it scores over 0.5, otherwise None. All of this runs on both hands
+    at once in a few numpy operations on the (hands, 21, 3) landmarks.
+
+    With debounce_frames N, a different gesture is only reported once it has been the best for N frames in a row, and
+    the previous one is held until then, so that a gesture doesn't flicker while the hand changes shape."""
+
+    def __init__(self, debounce_frames=0, shape=HAND_LANDMARKS_SHAPE):
+        self.debounce_frames = max(1, debounce_frames)
+        self.gestures = np.zeros(shape[0], dtype=np.int32)
+        """Reported gesture of each hand, a value of GESTURE_MAP"""
+        self.confidences = np.zeros(shape[0], dtype=np.float32)
+        """This frame's score of the reported gesture of each hand, 0 for an absent hand"""
+        self.__landmarks = np.zeros(shape, dtype=np.float32)
+        self.__present = np.zeros(shape[0], dtype=bool)
+        self.__scores = np.zeros((shape[0], len(GESTURE_MAP)), dtype=np.float32)
+        self.__candidates = np.zeros(shape[0], dtype=np.int32)
+        self.__candidate_frames = np.zeros(shape[0], dtype=np.int32)
+        self.__patterns = np.array(list(GESTURE_FINGERS.values()), dtype=bool)
+        self.__pattern_gestures = np.array([GESTURE_MAP[name] for name in GESTURE_FINGERS])
+
+    def classify(self, hands):
+        """Classify one frame. hands is a sequence with a (21, 3) array in pixel coordinates or None per hand.
+        Returns the gestures and confidences, which are overwritten by the next call."""
+        for i, hand in enumerate(hands):
+            self.__present[i] = hand is not None
+            if hand is not None:
+                self.__landmarks[i] = hand
+        scores = self.__score(self.__landmarks)
+        best = np.argmax(scores, axis=1).astype(np.int32)
+
+        # Report a new gesture once it has been the best for debounce_frames frames, an absent hand straight away
+        self.__candidate_frames = np.where(best == self.__candidates, self.__candidate_frames + 1, 1)
+        self.__candidates = best
+        accept = (self.__candidate_frames >= self.debounce_frames) | ~self.__present
+        self.gestures[:] = np.where(self.__present, np.where(accept, best, self.gestures), GESTURE_MAP["None"])
+        self.confidences[:] = np.where(self.__present, np.take_along_axis(scores, self.gestures[:, None], 1)[:, 0], 0)
+        return self.gestures, self.confidences
+
+    def __score(self, landmarks):
+        """Score of every gesture for every hand, shape (hands, len(GESTURE_MAP))"""
+        distance = lambda a, b: np.linalg.norm(landmarks[:, a] - landmarks[:, b], axis=-1)
+        origins = [PINKY_MCP, WRIST, WRIST, WRIST, WRIST]
+        ratio = distance(FINGER_TIPS, origins) / np.maximum(distance(FINGER_JOINTS, origins), 1e-6)
+        extension = np.clip((ratio - EXTENDED_RATIO[0]) / (EXTENDED_RATIO[1] - EXTENDED_RATIO[0]), 0, 1)
+
+        # Worst finger match against each pattern, shape (hands, patterns)
+        matches = np.where(self.__patterns, extension[:, None, :], 1 - extension[:, None, :]).min(axis=2)
+        scores = self.__scores
+        scores.fill(0)
+        scores[:, self.__pattern_gestures] = matches
+
+        # Split the patterns that two gestures share
+        thumb_down = landmarks[:, FINGER_TIPS[0], 2] > landmarks[:, FINGER_JOINTS[0], 2]  # y grows down the image
+        thumb_up = scores[:, GESTURE_MAP["Thumb_Up"]]
+        scores[:, GESTURE_MAP["Thumb_Down"]] = np.where(thumb_down, thumb_up, 0)
+        scores[:, GESTURE_MAP["Thumb_Up"]] = np.where(thumb_down, 0, thumb_up)
+        gaps = distance(FINGER_TIPS[1:4], FINGER_TIPS[2:5])
+        spock = gaps[:, 1] > SPOCK_GAP_RATIO * (gaps[:, 0] + gaps[:, 2]) / 2
+        open_palm = scores[:, GESTURE_MAP["Open_Palm"]]
+        scores[:, GESTURE_MAP["Spock"]] = np.where(spock, open_palm, 0)
+        scores[:, GESTURE_MAP["Open_Palm"]] = np.where(spock, 0, open_palm)
+
+        scores[:, GESTURE_MAP["None"]] = 1 - scores.max(axis=1)
+        return scores
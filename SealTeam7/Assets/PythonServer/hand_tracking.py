@@ -0,0 +1,219 @@
+from itertools import chain
+from operator import attrgetter
+
+import numpy as np
+
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT
+
+
+MAX_DETECTED_HANDS = 4
+"""Capacity of the landmark buffer. The landmarker is configured for two hands, but keep room for a few more."""
+
+LANDMARK_SCALE = np.array([COLOUR_IMAGE_FULL_WIDTH, -COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT], dtype=np.float32)
+"""Scale from MediaPipe's normalised (x, z, y) to pixel coordinates, with z flipped"""
+
+HANDEDNESS_PENALTY = 100
+"""Extra cost in pixels (mean landmark distance) of assigning a hand against MediaPipe's handedness. Tracking
+overrides the handedness when it is this much closer to the other hand's projected position."""
+
+MAX_PROJECTION_INTERVALS = 5
+"""Limit on how many frame intervals ahead a hand is projected, so that a pause in the stream doesn't send the
+projections off the table"""
+
+_get_xzy = attrgetter('x', 'z', 'y')
+
+
+def result_to_array(hand_landmarker_result, out, scale=LANDMARK_SCALE, offset=None):
+    """Convert all hands in a HandLandmarkerResult to pixel coordinates (x, -z, y).
+
+    Writes into the preallocated float32 array out of shape (n, 21, 3) and returns the view of it holding the
+    detected hands. Hands beyond the capacity of out are ignored. scale and offset map the normalised (x, z, y) to
+    pixels; the defaults are for a result on the full frame. Reading the attributes of the MediaPipe landmarks is
+    most of the cost, so the (x, z, y) tuples of all hands are scaled straight into out by a single multiply."""
+    hands = hand_landmarker_result.hand_landmarks
+    num_hands = min(len(hands), len(out))
+    landmarks = out[:num_hands]
+    if num_hands:
+        np.multiply(list(map(_get_xzy, chain.from_iterable(hands[:num_hands]))), scale, out=landmarks.reshape(-1, 3))
+        if offset is not None:
+            landmarks += offset
+    return landmarks
+
+class HandTracker:
+    """Assigns detected hands to the left and right hand and projects where each hand will be in the next frame.
+
+    Projections assume constant velocity between the capture times of the last two frames, so frames that are late or
+    dropped don't look like the hands slowed down or sped up."""
+
+    def __init__(self, gap_fill_frames=0, gap_fill_decay=0.5):
+        self.gap_fill_frames = gap_fill_frames
+        """Fill in a missing hand with its projected position for up to this many frames"""
+        self.gap_fill_decay = gap_fill_decay
+        """Confidence of a filled in hand is gap_fill_decay ** (number of frames it has been missing)"""
+        self.left_hand_history = []  # Will store numpy arrays of shape (21, 3)
+        self.right_hand_history = []
+        self.timestamp_history = []  # capture timestamps of the frames in the history, None if unknown
+        self.projected_left_hand = np.zeros((21, 3))
+        self.projected_right_hand = np.zeros((21, 3))
+
+        self.left_hand_absent_count = 0
+        self.right_hand_absent_count = 0
+        self.left_hand_extrapolated = False
+        self.right_hand_extrapolated = False
+
+        self.identity_swapped = False
+        """Whether the last assign_hands kept a hand's identity against MediaPipe's handedness"""
+
+        self.__landmarks = np.zeros((MAX_DETECTED_HANDS, 21, 3), dtype=np.float32)
+        self.__tracks = np.zeros((2, 21, 3), dtype=np.float32)
+
+    def tracked_hands(self):
+        """Projected landmarks of the hands that were found in the previous frame"""
+        hands = []
+        if self.left_hand_history and self.left_hand_absent_count == 0:
+            hands.append(self.projected_left_hand)
+        if self.right_hand_history and self.right_hand_absent_count == 0:
+            hands.append(self.projected_right_hand)
+        return hands
+
+    def speed(self):
+        """Distance in pixels the wrist of the fastest tracked hand is projected to move in the next frame"""
+        speed = 0.0
+        for history, projected, absent_count in ((self.left_hand_history, self.projected_left_hand,
+                                                  self.left_hand_absent_count),
+                                                 (self.right_hand_history, self.projected_right_hand,
+                                                  self.right_hand_absent_count)):
+            if history and absent_count == 0:
+                speed = max(speed, float(np.linalg.norm((projected[0] - history[-1][0])[[0, 2]])))
+        return speed
+
+    def assign_hands(self, hand_landmarker_result, scale=LANDMARK_SCALE, offset=None):
+        """Determine handedness and scale to pixel coordinates. Returns the (21, 3) arrays for the left and right
+        hand, or None for a hand that was not detected and not filled in (see left/right_hand_extrapolated). The arrays
+        are only valid until the next call.
+        scale and offset are passed to result_to_array, e.g. for a result on a cropped image."""
+        hands = result_to_array(hand_landmarker_result, self.__landmarks, scale, offset)
+        if len(hands) > 2:
+            print("Warning: More than 2 hands detected.")
+
+        left = None
+        right = None
+        self.identity_swapped = False
+        if len(hands) > 0:
+            left_index, right_index = self.__match(hands, hand_landmarker_result.handedness)
+            if left_index is not None:
+                left = hands[left_index]
+            if right_index is not None:
+                right = hands[right_index]
+        self.left_hand_absent_count = 0 if left is not None else self.left_hand_absent_count + 1
+        self.right_hand_absent_count = 0 if right is not None else self.right_hand_absent_count + 1
+
+        # Fill in missing hands with their projected positions for a few frames
+        self.left_hand_extrapolated = left is None and self.__can_gap_fill(self.left_hand_absent_count,
+                                                                          self.left_hand_history)
+        if self.left_hand_extrapolated:
+            left = self.projected_left_hand
+        self.right_hand_extrapolated = right is None and self.__can_gap_fill(self.right_hand_absent_count,
+                                                                            self.right_hand_history)
+        if self.right_hand_extrapolated:
+            right = self.projected_right_hand
+
+        return left, right
+
+    def __match(self, hands, handedness):
+        """Indices of the detected hands to use as the left and right hand (None if there is only one hand).
+
+        The cost of assigning a hand to a track is the mean distance of its landmarks (x and y) to the track's projected
+        landmarks, plus HANDEDNESS_PENALTY if MediaPipe labelled it as the other hand. A track that was not there in the
+        previous frame has no projection, so only the label counts. The cheapest assignment of two different hands to
+        the two tracks is found over all pairs at once."""
+        tracks = self.__tracks
+        tracks[0] = self.projected_left_hand
+        tracks[1] = self.projected_right_hand
+        tracked = np.array([self.__was_present(self.left_hand_history), self.__was_present(self.right_hand_history)])
+
+        offsets = hands[:, None, :, ::2] - tracks[None, :, :, ::2]  # (hands, tracks, 21, [x, y])
+        distances = np.sqrt(np.einsum('htlc,htlc->htl', offsets, offsets)).mean(axis=2)
+        labelled_right = np.array([categories[0].category_name == "Right" for categories in handedness[:len(hands)]])
+        costs = np.where(tracked, distances, 0) + HANDEDNESS_PENALTY * (labelled_right[:, None] != [False, True])
+
+        if len(hands) == 1:
+            track = int(np.argmin(costs[0]))
+            assignment = (0, None) if track == 0 else (None, 0)
+        else:
+            pair_costs = costs[:, 0, None] + costs[None, :, 1]  # left = row, right = column
+            np.fill_diagonal(pair_costs, np.inf)
+            assignment = np.unravel_index(np.argmin(pair_costs), pair_costs.shape)
+            assignment = (int(assignment[0]), int(assignment[1]))
+
+        # Count an identity swap when a tracked hand keeps its identity against MediaPipe's handedness
+        for track, index in enumerate(assignment):
+            if index is not None and tracked[track] and labelled_right[index] != bool(track):
+                self.identity_swapped = True
+        return assignment
+
+    @staticmethod
+    def __was_present(history):
+        return len(history) > 0 and history[-1].any()
+
+    def __can_gap_fill(self, absent_count, history):
+        # Only continue from a hand that was there in the previous frame, detected or filled in
+        return 0 < absent_count <= self.gap_fill_frames and self.__was_present(history)
+
+    def confidences(self, left, right):
+        """Confidence of the hands returned by the last assign_hands: 1 for a detected hand, decaying for a filled in
+        hand and 0 for a missing one"""
+        confidences = []
+        for hand, absent_count, extrapolated in ((left, self.left_hand_absent_count, self.left_hand_extrapolated),
+                                                 (right, self.right_hand_absent_count, self.right_hand_extrapolated)):
+            if hand is None:
+                confidences.append(0.0)
+            elif extrapolated:
+                confidences.append(self.gap_fill_decay ** absent_count)
+            else:
+                confidences.append(1.0)
+        return confidences
+
+    def update(self, left, right, timestamp=None):
+        """Record this frame's hands and its capture timestamp (perf counter ns) and project their positions for the
+        next frame, one frame interval ahead until project is called with its capture timestamp"""
+        # Keep track of previous results
+        if len(self.left_hand_history) >= 2:
+            self.left_hand_history.pop(0)
+            self.right_hand_history.pop(0)
+            self.timestamp_history.pop(0)
+        self.left_hand_history.append(left.copy() if left is not None else np.zeros((21, 3)))
+        self.right_hand_history.append(right.copy() if right is not None else np.zeros((21, 3)))
+        self.timestamp_history.append(timestamp)
+
+        # Calculate projection to fill in gaps where model doesn't find hands
+        self.__project(1)
+
+    def project(self, timestamp):
+        """Project the hands to the capture timestamp (perf counter ns) of the next frame, before assigning its hands.
+        Keeps the projection from update if the timestamps of the previous frames are unknown."""
+        if len(self.timestamp_history) < 2 or None in self.timestamp_history:
+            return
+        interval = self.timestamp_history[-1] - self.timestamp_history[-2]
+        if interval > 0:
+            # a frame captured before the last one (e.g. from a restarted producer) is not projected backwards
+            self.__project(max(0, min((timestamp - self.timestamp_history[-1]) / interval, MAX_PROJECTION_INTERVALS)))
+
+    def __project(self, intervals):
+        """Project the hands the given number of frame intervals past the last frame"""
+        if len(self.left_hand_history) == 1:
+            # use previous location of hands
+            self.projected_left_hand = self.left_hand_history[-1]
+            self.projected_right_hand = self.right_hand_history[-1]
+        else:
+            # assume constant velocity and rigid hand
+            last_wrist = self.left_hand_history[-1][0]
+            prev_wrist = self.left_hand_history[-2][0]
+            # a hand that just (re)appeared has no velocity yet, rather than the jump from the zeros of an absent hand
+            delta = (last_wrist - prev_wrist) * intervals if self.left_hand_history[-2].any() else 0
+            self.projected_left_hand = self.left_hand_history[-1] + delta
+
+            last_right = self.right_hand_history[-1][0]
+            prev_right = self.right_hand_history[-2][0]
+            delta = (last_right - prev_right) * intervals if self.right_hand_history[-2].any() else 0
+            self.projected_right_hand = self.right_hand_history[-1] + delta
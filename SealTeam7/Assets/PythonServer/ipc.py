@@ -0,0 +1,688 @@
+import mmap
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import STATS_SIZE, Stats
+
+
+# Configuration
+COLOUR_IMAGE_FULL_WIDTH = 1920
+COLOUR_IMAGE_FULL_HEIGHT = 1080
+COLOUR_IMAGE_NUM_CHANNELS = 3  # RGB, as the landmarker gets it
+COLOUR_IMAGE_FILE_NAME = "colour_image"
+HAND_LANDMARKS_SHAPE = (2, 21, 3)  # left/right hand, 21 landmarks, 3 coordinates per landmark
+HAND_LANDMARKS_HEADER_SIZE = 64
+HAND_LANDMARKS_SIZE = HAND_LANDMARKS_HEADER_SIZE + 21 * 3 * 2 * 4  # header, then 21 landmarks, 3 coordinates per landmark, 2 hands, 4 bytes per float
+HAND_LANDMARKS_FILE_NAME = "hand_landmarks"
+GESTURES_FILE_NAME = "gestures"
+GESTURES_SIZE = 64
+OBJECT_DETECTIONS_FILE_NAME = "object_detections"
+OBJECT_DETECTIONS_HEADER_SIZE = 64
+MAX_OBJECT_DETECTIONS = 16
+STATS_FILE_NAME = "server_stats"  # layout in metrics.py
+READY_EVENT_NAME = "SealTeam7ColourImageReady"
+DONE_EVENT_NAME = "SealTeam7HandLandmarksDone"
+
+# Colour image layout. The colour_image segment starts with a 64 byte ring header, set up by the server:
+#   uint32 num_slots
+#   uint32 flags                  RING_FLAG_* bits, set by the server
+#   uint64 latest_seq             sequence number of the most recently published frame
+#   uint64 slot_seqs[6]           sequence number of the frame in each slot, 0 while it is being written
+# followed by num_slots slots of SLOT_SIZE bytes. Each slot starts with a 64 byte frame header that describes the
+# frame in it, written by the producer before it publishes the frame:
+#   uint32 width, height          size of the frame in pixels, at most COLOUR_IMAGE_FULL_WIDTH x COLOUR_IMAGE_FULL_HEIGHT
+#   uint32 stride                 bytes from the start of one row to the next, at least width * channels
+#   uint32 pixel_format           PIXEL_FORMAT_*
+#   int64  capture_timestamp      when the frame was captured, in perf counter nanoseconds (see the hand landmarks
+#                                 header), or 0 if the producer doesn't know, in which case the server uses the time it
+#                                 read the frame
+# and then the rows of the frame, in up to FRAME_CAPACITY bytes (a full size BGRA frame). The server adapts to the
+# size and pixel format of every frame, so a producer can send a lower resolution or its sensor's own pixel layout
+# and save the copy and conversion.
+#
+# With more than one slot the slots form a ring. Sequence numbers start at 1. The producer writes frame n into slot
+# n % num_slots and may have at most num_slots frames in flight, i.e. it must receive a done event for frame n before
+# writing frame n + num_slots. In latest-frame mode (RING_FLAG_LATEST_FRAME) the producer never waits: it keeps
+# overwriting the oldest slot and the server always processes the most recently published frame, dropping any it did
+# not get to in time. The server checks the slot sequence number again after copying the frame to detect a slot that
+# was overwritten meanwhile. With one slot (as Unity uses it) the sequence numbers are not used: every ready event is
+# a new frame in slot 0.
+MAX_FRAME_SLOTS = 6
+RING_FLAG_LATEST_FRAME = 1
+RING_HEADER_SIZE = 64
+RING_LATEST_SEQ_OFFSET = 8
+RING_SLOT_SEQS_OFFSET = 16
+PIXEL_FORMAT_RGB = 1
+PIXEL_FORMAT_BGR = 2  # OpenCV's order, e.g. webcams
+PIXEL_FORMAT_BGRA = 3  # the Kinect's order
+PIXEL_FORMATS = {'rgb': PIXEL_FORMAT_RGB, 'bgr': PIXEL_FORMAT_BGR, 'bgra': PIXEL_FORMAT_BGRA}
+PIXEL_FORMAT_CHANNELS = {PIXEL_FORMAT_RGB: 3, PIXEL_FORMAT_BGR: 3, PIXEL_FORMAT_BGRA: 4}
+FRAME_HEADER_SIZE = 64
+FRAME_HEADER_DTYPE = np.dtype({
+    "names": ["width", "height", "stride", "pixel_format", "capture_timestamp"],
+    "formats": ["<u4", "<u4", "<u4", "<u4", "<i8"],
+    "offsets": [0, 4, 8, 12, 16],
+    "itemsize": FRAME_HEADER_SIZE,
+})
+FRAME_CAPACITY = COLOUR_IMAGE_FULL_WIDTH * COLOUR_IMAGE_FULL_HEIGHT * max(PIXEL_FORMAT_CHANNELS.values())
+SLOT_SIZE = FRAME_HEADER_SIZE + FRAME_CAPACITY
+
+# Hand landmarks layout. The segment starts with a 64 byte header, followed by the (2, 21, 3) little-endian float32
+# landmarks of the left and right hand:
+#   uint64 seq                    seqlock counter, odd while the server is writing
+#   uint64 frame_id               sequence number of the frame the landmarks were detected in
+#   int64  capture_timestamp      when the frame was captured, in perf counter nanoseconds (QueryPerformanceCounter on
+#                                 Windows, CLOCK_MONOTONIC on Linux, i.e. the same clock as C#'s Stopwatch)
+#   uint32 hand_flags[2]          HAND_* bits for the left and right hand. HAND_EXTRAPOLATED marks a hand that was not
+#                                 detected in this frame but filled in from its projected position (main.py --gap-fill)
+#   int64  landmarks_timestamp    time the landmarks are for, same clock. Later than capture_timestamp when the server
+#                                 predicts where the hands will be (main.py --predict-ms), otherwise equal to it
+#   float32 hand_confidence[2]    1 for a detected hand, decaying with every frame a hand is filled in, 0 if absent
+# Readers copy the header and landmarks and retry if seq was odd or changed meanwhile (see read_seqlocked), so they
+# can poll for the latest result at any time instead of waiting for the done event.
+HAND_PRESENT = 1
+HAND_EXTRAPOLATED = 2
+HAND_LANDMARKS_HEADER_DTYPE = np.dtype({
+    "names": ["seq", "frame_id", "capture_timestamp", "hand_flags", "landmarks_timestamp", "hand_confidence"],
+    "formats": ["<u8", "<u8", "<i8", ("<u4", 2), "<i8", ("<f4", 2)],
+    "offsets": [0, 8, 16, 24, 32, 40],
+    "itemsize": HAND_LANDMARKS_HEADER_SIZE,
+})
+
+# Gestures layout (main.py --gestures). 64 bytes, seqlocked like the hand landmarks:
+#   uint64 seq                    seqlock counter, odd while the server is writing
+#   uint64 frame_id               sequence number of the frame the gestures were recognised in
+#   int64  capture_timestamp      when the frame was captured, same clock as the hand landmarks header
+#   int32  gesture[2]             GESTURE_MAP id (gestures.py) of the left and right hand, 0 (None) if absent
+#   float32 gesture_confidence[2] score of the reported gesture in this frame, 0 if the hand is absent
+# Without --gestures the segment exists but stays zero, i.e. no gestures.
+GESTURES_DTYPE = np.dtype({
+    "names": ["seq", "frame_id", "capture_timestamp", "gesture", "gesture_confidence"],
+    "formats": ["<u8", "<u8", "<i8", ("<i4", 2), ("<f4", 2)],
+    "offsets": [0, 8, 16, 24, 32],
+    "itemsize": GESTURES_SIZE,
+})
+
+# Object detections layout (main.py --object-detection). A 64 byte header, seqlocked like the hand landmarks:
+#   uint64 seq                    seqlock counter, odd while the server is writing
+#   uint64 frame_id               sequence number of the frame the objects were detected in
+#   int64  capture_timestamp      when the frame was captured, same clock as the hand landmarks header
+#   uint32 count                  number of detections that follow, at most MAX_OBJECT_DETECTIONS
+# followed by MAX_OBJECT_DETECTIONS detections of 48 bytes (OBJECT_DETECTION_DTYPE), best first:
+#   int32  category               index of the category in the model's label map
+#   float32 score                 confidence of the detection
+#   float32 box[4]                x, y, width and height of the bounding box in full-frame pixels
+#   char   category_name[24]      label of the category, NUL padded
+# Objects are only detected in some frames, so frame_id lags behind the hand landmarks. Without --object-detection the
+# segment exists but stays zero, i.e. no detections.
+OBJECT_DETECTIONS_HEADER_DTYPE = np.dtype({
+    "names": ["seq", "frame_id", "capture_timestamp", "count"],
+    "formats": ["<u8", "<u8", "<i8", "<u4"],
+    "offsets": [0, 8, 16, 24],
+    "itemsize": OBJECT_DETECTIONS_HEADER_SIZE,
+})
+OBJECT_DETECTION_DTYPE = np.dtype({
+    "names": ["category", "score", "box", "category_name"],
+    "formats": ["<i4", "<f4", ("<f4", 4), "S24"],
+    "offsets": [0, 4, 8, 24],
+    "itemsize": 48,
+})
+OBJECT_DETECTIONS_SIZE = OBJECT_DETECTIONS_HEADER_SIZE + MAX_OBJECT_DETECTIONS * OBJECT_DETECTION_DTYPE.itemsize
+
+
+def namespaced(name, namespace):
+    """Name of a segment or semaphore of the server for one table. The default namespace "" keeps the plain names, so
+    a single server and Unity work without configuration; with several tables each server gets its own namespace."""
+    return f"{name}_{namespace}" if namespace else name
+
+
+def colour_image_segment_size(frame_slots):
+    """Size in bytes of the colour_image segment for the given number of frame slots"""
+    return RING_HEADER_SIZE + frame_slots * SLOT_SIZE
+
+
+def frame_slots_from_segment_size(size):
+    """Inverse of colour_image_segment_size, used by producers to discover the layout chosen by the server"""
+    return (size - RING_HEADER_SIZE) // SLOT_SIZE
+
+
+@contextmanager
+def seqlock_write(header):
+    """Make the writes inside the block appear atomic to read_seqlocked. header is a structured array view with a
+    "seq" field at the start of the segment."""
+    header["seq"] += 1  # odd: write in progress
+    try:
+        yield
+    finally:
+        header["seq"] += 1  # even: consistent again
+
+
+def read_seqlocked(header, read, timeout=1.0):
+    """Run read() until it completes without the "seq" field of header changing while no write was in progress.
+    Returns the seq value read() saw and its result."""
+    deadline = time.monotonic() + timeout
+    while True:
+        before = int(header["seq"])
+        if before % 2 == 0:
+            result = read()
+            if int(header["seq"]) == before:
+                return before, result
+        if time.monotonic() > deadline:
+            raise TimeoutError("Timed out waiting for a consistent read, is the writer stuck?")
+
+
+class FrameRing:
+    """View of the colour_image segment as one or more frame slots"""
+
+    def __init__(self, buffer, frame_slots):
+        if not 1 <= frame_slots <= MAX_FRAME_SLOTS:
+            raise ValueError(f"Number of frame slots must be between 1 and {MAX_FRAME_SLOTS}, got {frame_slots}")
+        self.frame_slots = frame_slots
+        self.header = np.ndarray((2,), dtype="<u4", buffer=buffer, offset=0)
+        self.slot_seqs = np.ndarray((MAX_FRAME_SLOTS,), dtype="<u8", buffer=buffer, offset=RING_SLOT_SEQS_OFFSET)
+        self.__latest_seq = np.ndarray((1,), dtype="<u8", buffer=buffer, offset=RING_LATEST_SEQ_OFFSET)
+        self.frame_headers = [np.ndarray((), dtype=FRAME_HEADER_DTYPE, buffer=buffer,
+                                         offset=RING_HEADER_SIZE + i * SLOT_SIZE)
+                              for i in range(frame_slots)]
+        self.frame_data = [np.ndarray((FRAME_CAPACITY,), dtype=np.uint8, buffer=buffer,
+                                      offset=RING_HEADER_SIZE + i * SLOT_SIZE + FRAME_HEADER_SIZE)
+                           for i in range(frame_slots)]
+
+    def frame(self, slot, header):
+        """View of the frame in a slot as described by header, a copy of its frame header. Raises ValueError if the
+        header doesn't describe a frame that fits in the slot."""
+        width, height, stride = int(header["width"]), int(header["height"]), int(header["stride"])
+        channels = PIXEL_FORMAT_CHANNELS.get(int(header["pixel_format"]))
+        if channels is None:
+            raise ValueError(f"Unknown pixel format {int(header['pixel_format'])}")
+        if not (0 < width <= COLOUR_IMAGE_FULL_WIDTH and 0 < height <= COLOUR_IMAGE_FULL_HEIGHT):
+            raise ValueError(f"Frame size {width}x{height} is not within "
+                             f"{COLOUR_IMAGE_FULL_WIDTH}x{COLOUR_IMAGE_FULL_HEIGHT}")
+        if stride < width * channels or stride * (height - 1) + width * channels > FRAME_CAPACITY:
+            raise ValueError(f"Stride {stride} does not fit a {width}x{height} frame with {channels} channels")
+        return np.ndarray((height, width, channels), dtype=np.uint8, buffer=self.frame_data[slot],
+                          strides=(stride, channels, 1))
+
+    @property
+    def is_ring(self):
+        return self.frame_slots > 1
+
+    @property
+    def latest_frame_mode(self):
+        return self.is_ring and bool(self.header[1] & RING_FLAG_LATEST_FRAME)
+
+    @property
+    def latest_seq(self):
+        return int(self.__latest_seq[0])
+
+    @latest_seq.setter
+    def latest_seq(self, seq):
+        self.__latest_seq[0] = seq
+
+    def slot(self, seq):
+        return seq % self.frame_slots
+
+    def release(self):
+        """Drop the views so that the underlying buffer can be closed"""
+        self.frame_headers = []
+        self.frame_data = []
+        self.header = None
+        self.slot_seqs = None
+        self.__latest_seq = None
+
+
+class IPC:
+    def __init__(self, platform, frame_slots=1, latest_frame=False, namespace=""):
+        if latest_frame and frame_slots < 2:
+            raise ValueError("Latest-frame mode needs at least 2 frame slots")
+        self.platform = platform
+        self.namespace = namespace
+        self.frame_slots = frame_slots
+        self.latest_frame = latest_frame
+        self.frames_dropped = 0
+        self.__dropped_lock = threading.Lock()  # frames are dropped from MediaPipe's thread in live_stream mode too
+        self.shutdown_requested = False
+        self.colour_image_buffer = None
+        self.hand_landmarks_buffer = None
+        self.hand_landmarks = None
+        """Little-endian float32 view of the landmarks in hand_landmarks_buffer with shape HAND_LANDMARKS_SHAPE"""
+        self.hand_landmarks_header = None
+        self.gestures_buffer = None
+        self.gestures = None
+        """View of gestures_buffer with dtype GESTURES_DTYPE"""
+        self.object_detections_buffer = None
+        self.object_detections_header = None
+        self.object_detections = None
+        """View of the MAX_OBJECT_DETECTIONS detections in object_detections_buffer with dtype OBJECT_DETECTION_DTYPE"""
+        self.stats_buffer = None
+        self.stats = None
+        """Counters and latency histograms of the server, see metrics.py"""
+        self.ring = None
+        self.__last_seq = 0
+
+    def _init_views(self):
+        self.hand_landmarks_header = np.ndarray((), dtype=HAND_LANDMARKS_HEADER_DTYPE, buffer=self.hand_landmarks_buffer)
+        self.hand_landmarks = np.ndarray(HAND_LANDMARKS_SHAPE, dtype="<f4", buffer=self.hand_landmarks_buffer,
+                                         offset=HAND_LANDMARKS_HEADER_SIZE)
+        self.gestures = np.ndarray((), dtype=GESTURES_DTYPE, buffer=self.gestures_buffer)
+        self.object_detections_header = np.ndarray((), dtype=OBJECT_DETECTIONS_HEADER_DTYPE,
+                                                   buffer=self.object_detections_buffer)
+        self.object_detections = np.ndarray((MAX_OBJECT_DETECTIONS,), dtype=OBJECT_DETECTION_DTYPE,
+                                            buffer=self.object_detections_buffer, offset=OBJECT_DETECTIONS_HEADER_SIZE)
+        self.stats = Stats(self.stats_buffer, time.perf_counter_ns())
+        self.ring = FrameRing(self.colour_image_buffer, self.frame_slots)
+        self.ring.header[0] = self.frame_slots
+        self.ring.header[1] = RING_FLAG_LATEST_FRAME if self.latest_frame else 0
+        if self.ring.is_ring:
+            self.__last_seq = self.ring.latest_seq
+
+    def request_shutdown(self):
+        """Make wait_ready return straight away, now and from now on. Safe to call from a signal handler."""
+        self.shutdown_requested = True
+
+    def wait_ready(self, timeout=None):
+        """Block until the producer has written a frame, shutdown is requested or the timeout (in seconds, None for no
+        timeout) expires. Returns True if there is a frame to read."""
+        return not self.shutdown_requested
+
+    def read_frame(self):
+        """Return the sequence number of the next frame to process, a view of it and a copy of its frame header, or
+        None if no new frame was published since the last one (a ready post without a frame). Raises ValueError if the
+        frame header is invalid. Must be called after wait_ready."""
+        if not self.ring.is_ring:
+            self.__last_seq += 1
+            header = self.ring.frame_headers[0].copy()
+            return self.__last_seq, self.ring.frame(0, header), header
+
+        if self.latest_frame:
+            # Skip straight to the newest frame
+            seq = self.ring.latest_seq
+        else:
+            seq = self.__last_seq + 1
+            if self.ring.slot_seqs[self.ring.slot(seq)] != seq:
+                # Producer skipped ahead -> resynchronise on the most recent frame
+                seq = self.ring.latest_seq
+        if seq <= self.__last_seq:
+            return None  # already processed, don't hand out its slot again
+        if self.latest_frame:
+            self.count_dropped(seq - self.__last_seq - 1)
+        self.__last_seq = seq
+        slot = self.ring.slot(seq)
+        header = self.ring.frame_headers[slot].copy()
+        return seq, self.ring.frame(slot, header), header
+
+    def frame_valid(self, seq):
+        """Check that the slot of frame seq was not overwritten while it was being read. Only latest-frame mode lets
+        the producer overwrite slots that are being processed; a torn frame counts as dropped."""
+        if not self.latest_frame or self.ring.slot_seqs[self.ring.slot(seq)] == seq:
+            return True
+        self.count_dropped()
+        return False
+
+    def count_dropped(self, frames=1):
+        """Count frames that were skipped or will never get landmarks. Safe to call from any thread."""
+        with self.__dropped_lock:
+            self.frames_dropped += frames
+            self.stats.set("frames_dropped", self.frames_dropped)
+
+    def write_hand_landmarks(self, frame_id, capture_timestamp, left, right, landmarks_timestamp=None,
+                             extrapolated=(False, False), confidences=None):
+        """Publish the landmarks of a frame, None for a hand that wasn't found. landmarks_timestamp is the time the
+        landmarks are predicted for, if not the capture time. extrapolated marks hands that were filled in rather than
+        detected and confidences defaults to 1 for every present hand."""
+        header = self.hand_landmarks_header
+        with seqlock_write(header):
+            header["frame_id"] = frame_id
+            header["capture_timestamp"] = capture_timestamp
+            header["landmarks_timestamp"] = capture_timestamp if landmarks_timestamp is None else landmarks_timestamp
+            for i, hand in enumerate((left, right)):
+                if hand is None:
+                    self.hand_landmarks[i].fill(0)
+                    header["hand_flags"][i] = 0
+                    header["hand_confidence"][i] = 0
+                else:
+                    self.hand_landmarks[i] = hand
+                    header["hand_flags"][i] = HAND_PRESENT | (HAND_EXTRAPOLATED if extrapolated[i] else 0)
+                    header["hand_confidence"][i] = 1 if confidences is None else confidences[i]
+
+    def write_gestures(self, frame_id, capture_timestamp, gestures, confidences):
+        """Publish the gesture ids and confidences of the left and right hand of a frame"""
+        with seqlock_write(self.gestures):
+            self.gestures["frame_id"] = frame_id
+            self.gestures["capture_timestamp"] = capture_timestamp
+            self.gestures["gesture"] = gestures
+            self.gestures["gesture_confidence"] = confidences
+
+    def write_object_detections(self, frame_id, capture_timestamp, detections):
+        """Publish the objects detected in a frame, an array of OBJECT_DETECTION_DTYPE with at most
+        MAX_OBJECT_DETECTIONS entries"""
+        header = self.object_detections_header
+        with seqlock_write(header):
+            header["frame_id"] = frame_id
+            header["capture_timestamp"] = capture_timestamp
+            header["count"] = len(detections)
+            self.object_detections[:len(detections)] = detections
+            self.object_detections[len(detections):] = np.zeros((), dtype=OBJECT_DETECTION_DTYPE)
+
+    def set_done(self):
+        pass
+
+    def close(self):
+        self.ring.release()
+        self.hand_landmarks = None
+        self.hand_landmarks_header = None
+        self.gestures = None
+        self.object_detections_header = None
+        self.object_detections = None
+        self.stats.release()
+        self.colour_image_buffer.close()
+        self.hand_landmarks_buffer.close()
+        self.gestures_buffer.close()
+        self.object_detections_buffer.close()
+        self.stats_buffer.close()
+
+
+class WindowsIPC(IPC):
+    def __init__(self, frame_slots=1, latest_frame=False, namespace=""):
+        super().__init__('windows', frame_slots, latest_frame, namespace)
+        import win32event
+        import win32api
+        self.__ready_event = win32event.CreateEvent(None, 0, 0, namespaced(READY_EVENT_NAME, namespace))
+        self.__done_event = win32event.CreateEvent(None, 0, 0, namespaced(DONE_EVENT_NAME, namespace))
+        self.__shutdown_event = win32event.CreateEvent(None, 1, 0, None)  # manual reset, private to this process
+        # Python only runs its SIGINT handler once the main thread is back in the interpreter, which it isn't while
+        # it waits for a frame, so wake the wait straight from the console's Ctrl+C handler (on its own thread).
+        self.__console_control_handler = self.__on_console_control
+        win32api.SetConsoleCtrlHandler(self.__console_control_handler, True)
+        self.colour_image_buffer = mmap.mmap(-1, colour_image_segment_size(frame_slots), access=mmap.ACCESS_WRITE, tagname=namespaced(COLOUR_IMAGE_FILE_NAME, namespace))
+        self.hand_landmarks_buffer = mmap.mmap(-1, HAND_LANDMARKS_SIZE, access=mmap.ACCESS_WRITE, tagname=namespaced(HAND_LANDMARKS_FILE_NAME, namespace))
+        self.gestures_buffer = mmap.mmap(-1, GESTURES_SIZE, access=mmap.ACCESS_WRITE, tagname=namespaced(GESTURES_FILE_NAME, namespace))
+        self.object_detections_buffer = mmap.mmap(-1, OBJECT_DETECTIONS_SIZE, access=mmap.ACCESS_WRITE, tagname=namespaced(OBJECT_DETECTIONS_FILE_NAME, namespace))
+        self.stats_buffer = mmap.mmap(-1, STATS_SIZE, access=mmap.ACCESS_WRITE, tagname=namespaced(STATS_FILE_NAME, namespace))
+        self._init_views()
+
+    def __on_console_control(self, control_type):
+        import win32con
+        if control_type == win32con.CTRL_C_EVENT:
+            self.request_shutdown()
+        return False  # let Python raise KeyboardInterrupt or run its SIGINT handler as usual
+
+    def request_shutdown(self):
+        import win32event
+        super().request_shutdown()
+        win32event.SetEvent(self.__shutdown_event)
+
+    def wait_ready(self, timeout=None):
+        import win32event
+        if self.shutdown_requested:
+            return False
+        milliseconds = win32event.INFINITE if timeout is None else int(timeout * 1000)
+        result = win32event.WaitForMultipleObjects([self.__ready_event, self.__shutdown_event], False, milliseconds)
+        if result == win32event.WAIT_OBJECT_0:
+            return True
+        elif result == win32event.WAIT_OBJECT_0 + 1 or result == win32event.WAIT_TIMEOUT:
+            return False
+        else:
+            # This should never happen
+            raise Exception("WaitForMultipleObjects returned unexpected result: " + str(result))
+
+    def set_done(self):
+        import win32event
+        win32event.SetEvent(self.__done_event)
+
+    def close(self):
+        import win32api
+        win32api.SetConsoleCtrlHandler(self.__console_control_handler, False)
+        super().close()
+
+
+class LinuxIPC(IPC):
+    def __init__(self, frame_slots=1, latest_frame=False, namespace=""):
+        super().__init__('linux', frame_slots, latest_frame, namespace)
+        import posix_ipc
+        colour_image_size = colour_image_segment_size(frame_slots)
+        self.__ready_event = posix_ipc.Semaphore(namespaced(READY_EVENT_NAME, namespace), posix_ipc.O_CREAT, initial_value=0)
+        self.__done_event = posix_ipc.Semaphore(namespaced(DONE_EVENT_NAME, namespace), posix_ipc.O_CREAT, initial_value=0)
+        self.__wake_pending = False
+        self.__colour_image_shm = posix_ipc.SharedMemory(namespaced(COLOUR_IMAGE_FILE_NAME, namespace), posix_ipc.O_CREAT, size=colour_image_size)
+        self.__hand_landmarks_shm = posix_ipc.SharedMemory(namespaced(HAND_LANDMARKS_FILE_NAME, namespace), posix_ipc.O_CREAT, size=HAND_LANDMARKS_SIZE)
+        self.__gestures_shm = posix_ipc.SharedMemory(namespaced(GESTURES_FILE_NAME, namespace), posix_ipc.O_CREAT, size=GESTURES_SIZE)
+        self.__object_detections_shm = posix_ipc.SharedMemory(namespaced(OBJECT_DETECTIONS_FILE_NAME, namespace), posix_ipc.O_CREAT, size=OBJECT_DETECTIONS_SIZE)
+        self.__stats_shm = posix_ipc.SharedMemory(namespaced(STATS_FILE_NAME, namespace), posix_ipc.O_CREAT, size=STATS_SIZE)
+        self.colour_image_buffer = mmap.mmap(self.__colour_image_shm.fd, colour_image_size, access=mmap.ACCESS_WRITE)
+        self.hand_landmarks_buffer = mmap.mmap(self.__hand_landmarks_shm.fd, HAND_LANDMARKS_SIZE, access=mmap.ACCESS_WRITE)
+        self.gestures_buffer = mmap.mmap(self.__gestures_shm.fd, GESTURES_SIZE, access=mmap.ACCESS_WRITE)
+        self.object_detections_buffer = mmap.mmap(self.__object_detections_shm.fd, OBJECT_DETECTIONS_SIZE, access=mmap.ACCESS_WRITE)
+        self.stats_buffer = mmap.mmap(self.__stats_shm.fd, STATS_SIZE, access=mmap.ACCESS_WRITE)
+        self.__colour_image_shm.close_fd()
+        self.__hand_landmarks_shm.close_fd()
+        self.__gestures_shm.close_fd()
+        self.__object_detections_shm.close_fd()
+        self.__stats_shm.close_fd()
+        self._init_views()
+
+    def request_shutdown(self):
+        # Post the ready semaphore to wake up a thread blocked in wait_ready. (A signal interrupts the wait anyway, but
+        # only in the main thread, and with --pipeline it is the capture thread that waits.)
+        if not self.shutdown_requested:
+            super().request_shutdown()
+            self.__wake_pending = True
+            self.__ready_event.release()
+
+    def wait_ready(self, timeout=None):
+        import posix_ipc
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.shutdown_requested:
+                return False
+            try:
+                self.__ready_event.acquire(None if deadline is None else max(0.0, deadline - time.monotonic()))
+                break
+            except posix_ipc.BusyError:
+                return False
+            except posix_ipc.SignalError:
+                continue  # a signal handler ran, which may have requested shutdown
+        if self.shutdown_requested:
+            # This may have been a frame's post rather than the wake-up post, which close takes back either way
+            return False
+
+        if self.latest_frame:
+            # Consume the posts for frames that will be skipped so they don't wake us up again
+            try:
+                while True:
+                    self.__ready_event.acquire(0)
+            except posix_ipc.BusyError:
+                pass
+        return True
+
+    def set_done(self):
+        self.__done_event.release()
+
+    def close(self):
+        import posix_ipc
+        if self.__wake_pending:
+            # Take back the wake-up post, so that the next server doesn't mistake it for a frame. It can't be told
+            # apart from the posts of frames this server won't process any more, so take back all of them.
+            try:
+                while True:
+                    self.__ready_event.acquire(0)
+            except posix_ipc.BusyError:
+                pass
+        self.__ready_event.unlink()
+        self.__done_event.unlink()
+        self.__ready_event.close()
+        self.__done_event.close()
+        super().close()
+        self.__colour_image_shm.unlink()
+        self.__hand_landmarks_shm.unlink()
+        self.__gestures_shm.unlink()
+        self.__object_detections_shm.unlink()
+        self.__stats_shm.unlink()
+
+
+class LinuxProducerIPC:
+    """Producer side of the protocol, used by testing.py. Opens the segments and semaphores created by the server."""
+
+    def __init__(self, namespace=""):
+        import posix_ipc
+        self.__ready_event = posix_ipc.Semaphore(namespaced(READY_EVENT_NAME, namespace), posix_ipc.O_CREAT)
+        self.__done_event = posix_ipc.Semaphore(namespaced(DONE_EVENT_NAME, namespace), posix_ipc.O_CREAT)
+        colour_image_shm = posix_ipc.SharedMemory(namespaced(COLOUR_IMAGE_FILE_NAME, namespace))
+        colour_image_size = colour_image_shm.size
+        self.colour_image_buffer = mmap.mmap(colour_image_shm.fd, colour_image_size, access=mmap.ACCESS_WRITE)
+        colour_image_shm.close_fd()
+        self.ring = FrameRing(self.colour_image_buffer, frame_slots_from_segment_size(colour_image_size))
+        self.__seq = self.ring.latest_seq if self.ring.is_ring else 0
+        self.__in_flight = 0
+        hand_landmarks_shm = posix_ipc.SharedMemory(namespaced(HAND_LANDMARKS_FILE_NAME, namespace), read_only=True)
+        self.hand_landmarks_buffer = mmap.mmap(hand_landmarks_shm.fd, HAND_LANDMARKS_SIZE, access=mmap.ACCESS_READ)
+        hand_landmarks_shm.close_fd()
+        self.hand_landmarks_header = np.ndarray((), dtype=HAND_LANDMARKS_HEADER_DTYPE, buffer=self.hand_landmarks_buffer)
+        self.hand_landmarks = np.ndarray(HAND_LANDMARKS_SHAPE, dtype="<f4", buffer=self.hand_landmarks_buffer,
+                                         offset=HAND_LANDMARKS_HEADER_SIZE)
+        gestures_shm = posix_ipc.SharedMemory(namespaced(GESTURES_FILE_NAME, namespace), read_only=True)
+        self.gestures_buffer = mmap.mmap(gestures_shm.fd, GESTURES_SIZE, access=mmap.ACCESS_READ)
+        gestures_shm.close_fd()
+        self.gestures = np.ndarray((), dtype=GESTURES_DTYPE, buffer=self.gestures_buffer)
+        object_detections_shm = posix_ipc.SharedMemory(namespaced(OBJECT_DETECTIONS_FILE_NAME, namespace), read_only=True)
+        self.object_detections_buffer = mmap.mmap(object_detections_shm.fd, OBJECT_DETECTIONS_SIZE, access=mmap.ACCESS_READ)
+        object_detections_shm.close_fd()
+        self.object_detections_header = np.ndarray((), dtype=OBJECT_DETECTIONS_HEADER_DTYPE,
+                                                   buffer=self.object_detections_buffer)
+        self.object_detections = np.ndarray((MAX_OBJECT_DETECTIONS,), dtype=OBJECT_DETECTION_DTYPE,
+                                            buffer=self.object_detections_buffer, offset=OBJECT_DETECTIONS_HEADER_SIZE)
+
+    @property
+    def frame_slots(self):
+        return self.ring.frame_slots
+
+    @property
+    def latest_frame_mode(self):
+        return self.ring.latest_frame_mode
+
+    def acquire_slot(self):
+        """Block until the slot for the next frame is no longer being processed by the server.
+        Never blocks in latest-frame mode, where the server drops frames instead."""
+        if self.latest_frame_mode:
+            self.poll_done()
+            return
+        while self.__in_flight >= self.ring.frame_slots:
+            self.wait_done()
+
+    def next_frame(self, width=COLOUR_IMAGE_FULL_WIDTH, height=COLOUR_IMAGE_FULL_HEIGHT, pixel_format='rgb'):
+        """Wait for the next free slot and return a writable (height, width, channels) view of it in shared memory, to
+        write the next frame into directly. pixel_format is a key of PIXEL_FORMATS. Call publish_frame once the frame
+        is written."""
+        self.acquire_slot()
+        slot = self.ring.slot(self.__seq + 1)
+        if self.ring.is_ring:
+            self.ring.slot_seqs[slot] = 0  # mark slot as being written
+        header = self.ring.frame_headers[slot]
+        channels = PIXEL_FORMAT_CHANNELS[PIXEL_FORMATS[pixel_format]]
+        header["width"], header["height"], header["stride"] = width, height, width * channels
+        header["pixel_format"] = PIXEL_FORMATS[pixel_format]
+        return self.ring.frame(slot, header)
+
+    def publish_frame(self, capture_timestamp=None):
+        """Signal the server that the frame written into the view returned by next_frame is ready. capture_timestamp
+        is when it was captured in perf counter nanoseconds, by default now."""
+        seq = self.__seq + 1
+        self.ring.frame_headers[self.ring.slot(seq)]["capture_timestamp"] = \
+            time.perf_counter_ns() if capture_timestamp is None else capture_timestamp
+        if self.ring.is_ring:
+            self.ring.slot_seqs[self.ring.slot(seq)] = seq
+            self.ring.latest_seq = seq
+        self.__seq = seq
+
+        self.__in_flight += 1
+        self.__ready_event.release()
+
+    def write_frame(self, data, pixel_format='rgb', capture_timestamp=None):
+        """Copy a frame (a (height, width, channels) array, or the bytes of a full size one) into the next free slot
+        and signal the server"""
+        channels = PIXEL_FORMAT_CHANNELS[PIXEL_FORMATS[pixel_format]]
+        if not isinstance(data, np.ndarray):
+            data = np.frombuffer(data, dtype=np.uint8).reshape(COLOUR_IMAGE_FULL_HEIGHT, COLOUR_IMAGE_FULL_WIDTH, channels)
+        frame = self.next_frame(data.shape[1], data.shape[0], pixel_format)
+        np.copyto(frame, data)
+        del frame  # don't keep the shared memory exported
+        self.publish_frame(capture_timestamp)
+
+    @property
+    def frames_in_flight(self):
+        """Frames written whose done event has not been received yet"""
+        return self.__in_flight
+
+    def wait_done(self, timeout=None):
+        """Wait for the server to finish a frame. Returns False if the timeout (in seconds) expired first."""
+        import posix_ipc
+        try:
+            self.__done_event.acquire(timeout)
+        except posix_ipc.BusyError:
+            return False
+        self.__in_flight -= 1
+        return True
+
+    def poll_done(self):
+        """Consume any done events without blocking and return how many there were"""
+        import posix_ipc
+        count = 0
+        try:
+            while True:
+                self.__done_event.acquire(0)
+                count += 1
+        except posix_ipc.BusyError:
+            pass
+        self.__in_flight = max(0, self.__in_flight - count)
+        return count
+
+    def read_hand_landmarks(self, out):
+        """Copy the most recent hand landmarks into out (shape HAND_LANDMARKS_SHAPE) without waiting for the server.
+        Returns a copy of the header describing them."""
+        def read():
+            np.copyto(out, self.hand_landmarks)
+            return self.hand_landmarks_header.copy()
+        _, header = read_seqlocked(self.hand_landmarks_header, read)
+        return header
+
+    def read_gestures(self):
+        """Return a copy of the most recent gestures (GESTURES_DTYPE) without waiting for the server"""
+        _, gestures = read_seqlocked(self.gestures, self.gestures.copy)
+        return gestures
+
+    def read_object_detections(self):
+        """Return copies of the header and the detections of the most recent object detection without waiting for
+        the server"""
+        def read():
+            header = self.object_detections_header.copy()
+            return header, self.object_detections[:min(int(header["count"]), MAX_OBJECT_DETECTIONS)].copy()
+        _, (header, detections) = read_seqlocked(self.object_detections_header, read)
+        return header, detections
+
+    def close(self):
+        self.ring.release()
+        self.hand_landmarks = None
+        self.hand_landmarks_header = None
+        self.gestures = None
+        self.object_detections_header = None
+        self.object_detections = None
+        self.colour_image_buffer.close()
+        self.hand_landmarks_buffer.close()
+        self.gestures_buffer.close()
+        self.object_detections_buffer.close()
+        self.__ready_event.close()
+        self.__done_event.close()
+
+
+def open_stats(platform, namespace=""):
+    """Map the stats page of a running server read-only, for stats.py and supervisor.py"""
+    if platform == 'windows':
+        return mmap.mmap(-1, STATS_SIZE, access=mmap.ACCESS_READ, tagname=namespaced(STATS_FILE_NAME, namespace))
+    import posix_ipc
+    stats_shm = posix_ipc.SharedMemory(namespaced(STATS_FILE_NAME, namespace), read_only=True)
+    buffer = mmap.mmap(stats_shm.fd, STATS_SIZE, access=mmap.ACCESS_READ)
+    stats_shm.close_fd()
+    return buffer
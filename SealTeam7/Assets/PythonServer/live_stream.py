@@ -0,0 +1,52 @@
+import threading
+
+
+class LiveStream:
+    """Feeds frames to a landmarker in LIVE_STREAM mode and passes each result to on_result(frame, result).
+
+    MediaPipe runs the model on its own thread and calls result_callback when a frame is done, so the caller can read
+    the next frame in the meantime. While the model is busy, MediaPipe only keeps the newest frame waiting and drops
+    the older ones without calling back. Those are passed to on_dropped(frame) once the result of a later frame
+    arrives, so every submitted frame is accounted for, in the order it was submitted. Both callbacks run on
+    MediaPipe's thread."""
+
+    def __init__(self, on_result, on_dropped):
+        self.on_result = on_result
+        self.on_dropped = on_dropped
+        self.__pending = {}  # timestamp_ms -> frame, in submission order
+        self.__last_timestamp_ms = -1
+        self.__changed = threading.Condition()
+
+    @property
+    def frames_in_flight(self):
+        with self.__changed:
+            return len(self.__pending)
+
+    def submit(self, landmarker, image, timestamp_ns, frame):
+        """Start detecting on image. MediaPipe needs strictly increasing millisecond timestamps, so frames less than a
+        millisecond apart are moved to the next free millisecond."""
+        with self.__changed:
+            timestamp_ms = max(timestamp_ns // 1_000_000, self.__last_timestamp_ms + 1)
+            self.__last_timestamp_ms = timestamp_ms
+            self.__pending[timestamp_ms] = frame
+        landmarker.detect_async(image, timestamp_ms)
+
+    def result_callback(self, result, output_image, timestamp_ms):
+        """The result_callback for the landmarker's options"""
+        with self.__changed:
+            done = [(pending_timestamp_ms, frame) for pending_timestamp_ms, frame in self.__pending.items()
+                    if pending_timestamp_ms <= timestamp_ms]
+        for pending_timestamp_ms, frame in done:
+            if pending_timestamp_ms == timestamp_ms:
+                self.on_result(frame, result)
+            else:
+                self.on_dropped(frame)
+        with self.__changed:
+            for pending_timestamp_ms, _ in done:
+                del self.__pending[pending_timestamp_ms]
+            self.__changed.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Wait until the results of all submitted frames have been handled. Returns False on timeout."""
+        with self.__changed:
+            return self.__changed.wait_for(lambda: not self.__pending, timeout)
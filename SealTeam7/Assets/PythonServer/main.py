@@ -2,11 +2,10 @@ print("Initialising server...")
 
 import argparse
 import sys
-import struct
-import mmap
 import time
 import signal
 import os
+import re
 from contextlib import contextmanager
 
 import cv2
@@ -15,363 +14,549 @@ import numpy as np
 from mediapipe.tasks.python import BaseOptions
 from mediapipe.tasks.python.vision import *
 
+from affinity import parse_cpu_list, pin_to_cpus
+from backends import BACKENDS, create_hand_landmarker, create_object_detector, default_backend
+from filters import OneEuroFilter
+from gestures import GestureClassifier
+from hand_tracking import HandTracker
+from ipc import (MAX_FRAME_SLOTS, HAND_LANDMARKS_SHAPE, COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT,
+                 MAX_OBJECT_DETECTIONS, OBJECT_DETECTION_DTYPE, WindowsIPC, LinuxIPC)
+from live_stream import LiveStream
+from metrics import format_report, snapshot
+from object_detection import ObjectDetectionWorker, detections_to_array
+from pipeline import Pipeline
+from recording import Recorder
+from preprocess import INTERPOLATIONS, ColourConverter, Downscaler, parse_resolution
+from roi import DetectionScheduler, RoiSelector, roi_in_image, roi_scale_and_offset
+
 
 # Configuration
-COLOUR_IMAGE_FULL_WIDTH = 1920
-COLOUR_IMAGE_FULL_HEIGHT = 1080
-COLOUR_IMAGE_NUM_CHANNELS = 3
-COLOUR_IMAGE_FULL_SIZE = COLOUR_IMAGE_FULL_WIDTH * COLOUR_IMAGE_FULL_HEIGHT * COLOUR_IMAGE_NUM_CHANNELS
-COLOUR_IMAGE_FILE_NAME = "colour_image"
-HAND_LANDMARKS_SIZE = 21 * 3 * 2 * 4  # 21 landmarks, 3 coordinates per landmark, 2 hands, 4 bytes per float
-HAND_LANDMARKS_FILE_NAME = "hand_landmarks"
-READY_EVENT_NAME = "SealTeam7ColourImageReady"
-DONE_EVENT_NAME = "SealTeam7HandLandmarksDone"
 HAND_LANDMARKING_MODEL_PATH = 'hand_landmarking_model.task'
+OBJECT_DETECTION_MODEL_PATH = 'object_detection_model.tflite'
 VISUALISE_INFERENCE_RESULTS = False
 """Display the video overlaid with hand landmarks and bounding boxes around detected objects"""
 
 
-class IPC:
-    def __init__(self, platform):
-        self.platform = platform
-        self.colour_image_buffer = None
-        self.hand_landmarks_buffer = None
-
-    def wait_ready(self):
-        pass
-    
-    def set_done(self):
-        pass
-
-    def close(self):
-        self.colour_image_buffer.close()
-        self.hand_landmarks_buffer.close()
-
-   
-class WindowsIPC(IPC):
-    def __init__(self):
-        super().__init__('windows')
-        import win32event
-        self.__ready_event = win32event.CreateEvent(None, 0, 0, READY_EVENT_NAME)
-        self.__done_event = win32event.CreateEvent(None, 0, 0, DONE_EVENT_NAME)
-        self.colour_image_buffer = mmap.mmap(-1, 1920 * 1080 * 3, access=mmap.ACCESS_WRITE, tagname=COLOUR_IMAGE_FILE_NAME)
-        self.hand_landmarks_buffer = mmap.mmap(-1, 21 * 3 * 2 * 4, access=mmap.ACCESS_WRITE, tagname=HAND_LANDMARKS_FILE_NAME)
-
-    def wait_ready(self):
-        import win32event
-        while not shutdown_flag:
-            # Wait for new frame with a timeout to check shutdown flag
-            result = win32event.WaitForSingleObject(self.__ready_event, 100)  # 100ms timeout
-            if result == win32event.WAIT_TIMEOUT:
-                continue  # Continue waiting
-            elif result != win32event.WAIT_OBJECT_0:
-                # This should never happen
-                raise Exception("WaitForSingleObject returned unexpected result: " + str(result))
-            else:
-                break  # Done waiting
-                
-    def set_done(self):
-        import win32event
-        win32event.SetEvent(self.__done_event)
-        
-    def close(self):
-        super().close()
-                
-                
-class LinuxIPC(IPC):
-    def __init__(self):
-        super().__init__('linux')
-        import posix_ipc
-        self.__ready_event = posix_ipc.Semaphore(READY_EVENT_NAME, posix_ipc.O_CREAT, initial_value=0)
-        self.__done_event = posix_ipc.Semaphore(DONE_EVENT_NAME, posix_ipc.O_CREAT, initial_value=0)
-        self.__colour_image_shm = posix_ipc.SharedMemory(COLOUR_IMAGE_FILE_NAME, posix_ipc.O_CREAT, size=COLOUR_IMAGE_FULL_SIZE)
-        self.__hand_landmarks_shm = posix_ipc.SharedMemory(HAND_LANDMARKS_FILE_NAME, posix_ipc.O_CREAT, size=HAND_LANDMARKS_SIZE)
-        self.colour_image_buffer = mmap.mmap(self.__colour_image_shm.fd, COLOUR_IMAGE_FULL_SIZE, access=mmap.ACCESS_WRITE)
-        self.hand_landmarks_buffer = mmap.mmap(self.__hand_landmarks_shm.fd, HAND_LANDMARKS_SIZE, access=mmap.ACCESS_WRITE)
-        self.__colour_image_shm.close_fd()
-        self.__hand_landmarks_shm.close_fd()
-
-    def wait_ready(self):
-        import posix_ipc
-        while not shutdown_flag:
-            # Wait for new frame with a timeout to check shutdown flag
-            try:
-                self.__ready_event.acquire(100)  # wait for 100ms at a time
-                break  # Done waiting
-            except posix_ipc.BusyError:
-                continue  # Continue waiting
-                
-    def set_done(self):
-        self.__done_event.release()
-        
-    def close(self):
-        self.__ready_event.close()
-        self.__done_event.close()
-        super().close()
-        self.__colour_image_shm.unlink()
-        self.__hand_landmarks_shm.unlink()
-
-
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Shifting Sands hand landmarking server.')
 parser.add_argument('--platform', choices=['windows', 'linux'], required=True, help='Platform to run the server on ("windows" or "linux").')
+parser.add_argument('--frame-slots', type=int, default=1, choices=range(1, MAX_FRAME_SLOTS + 1), metavar='N',
+                    help=f'Number of colour image slots in shared memory (1-{MAX_FRAME_SLOTS}). With more than one slot the '
+                         'producer can write the next frame while the current one is being processed. Default 1 (no ring).')
+parser.add_argument('--latest-frame', action='store_true',
+                    help='Always process the most recent frame in the ring and drop older ones instead of queuing them. '
+                         'The producer no longer waits for results. Requires --frame-slots 2 or more.')
+parser.add_argument('--running-mode', choices=['video', 'live_stream'], default='video',
+                    help='Run the landmarker synchronously (video) or asynchronously with a result callback '
+                         '(live_stream), in which case the next frame is read while the model runs and frames that '
+                         'arrive while it is busy are dropped. Default video.')
+parser.add_argument('--pipeline', action='store_true',
+                    help='Run capture, inference and post-processing on separate threads so that they overlap across '
+                         'consecutive frames. Only helps when the producer can run ahead, i.e. with --frame-slots 2 or more.')
+parser.add_argument('--pipeline-queue-size', type=int, default=2, metavar='N',
+                    help='Maximum number of frames waiting between two pipeline stages. Default 2.')
+parser.add_argument('--stats', action='store_true',
+                    help='Periodically print the throughput and latency percentiles of each stage. They are always '
+                         'available to stats.py while the server is running.')
+parser.add_argument('--roi', action='store_true',
+                    help='Run the landmarker on a crop around the hands found in the previous frame instead of the full '
+                         'frame, falling back to the full frame when a hand is lost.')
+parser.add_argument('--roi-margin', type=float, default=0.5,
+                    help='Padding around each projected hand, as a fraction of its size. Default 0.5.')
+parser.add_argument('--roi-min-size', type=int, default=384, metavar='PIXELS',
+                    help='Minimum width and height of the crop. Default 384.')
+parser.add_argument('--roi-max-area', type=float, default=0.5,
+                    help='Use the full frame when the crop would cover more than this fraction of it. Default 0.5.')
+parser.add_argument('--input-size', type=parse_resolution, metavar='WIDTHxHEIGHT',
+                    help='Downscale larger frames to this size (e.g. 960x540 or 640x360) before running the '
+                         'landmarker. Landmarks are still reported in '
+                         f'{COLOUR_IMAGE_FULL_WIDTH}x{COLOUR_IMAGE_FULL_HEIGHT} pixel coordinates. Default: the size of '
+                         'the frames.')
+parser.add_argument('--input-interpolation', choices=INTERPOLATIONS, default='linear',
+                    help='OpenCV interpolation used by --input-size. Default linear.')
+parser.add_argument('--record', metavar='PATH',
+                    help='Write every frame received from the producer to PATH, for replay.py to replay later.')
+parser.add_argument('--backend', choices=BACKENDS,
+                    help='Run the landmarker on the GPU, on the CPU, or replace it with a stub that returns scripted '
+                         'landmarks without running a model. Default gpu on Linux, cpu on Windows.')
+parser.add_argument('--stub-latency', type=float, default=0, metavar='MS',
+                    help='Time the stub backend takes per frame, in milliseconds. Default 0.')
+parser.add_argument('--stub-landmarks', metavar='PATH',
+                    help='.npy file of normalised (x, y, z) landmarks of shape (frames, hands, 21, 3) for the stub '
+                         'backend to return in a loop, NaN for an absent hand. Default: two hands moving in circles.')
+parser.add_argument('--namespace', default='', metavar='NAME',
+                    help='Suffix for the names of the shared memory segments and semaphores, so that several servers '
+                         '(one per table) can run on the same machine. Default: none, the names Unity uses.')
+parser.add_argument('--cpus', type=parse_cpu_list, metavar='LIST',
+                    help='Run the server only on these CPUs, e.g. 0-3 or 0,2,4. Default: any.')
+parser.add_argument('--filter', action='store_true',
+                    help='Smooth the landmarks over time with a One Euro filter.')
+parser.add_argument('--filter-min-cutoff', type=float, default=1.0, metavar='HZ',
+                    help='Cutoff frequency of the filter while the hands are still. Lower removes more jitter. '
+                         'Default 1.0.')
+parser.add_argument('--filter-beta', type=float, default=0.05,
+                    help='How much the cutoff frequency rises with speed (Hz per pixel/s). Higher reduces lag. '
+                         'Default 0.05.')
+parser.add_argument('--predict-ms', type=float, default=0, metavar='MS',
+                    help='With --filter, extrapolate the landmarks this far past the capture time, e.g. to when Unity '
+                         'will display them. Default 0.')
+parser.add_argument('--gestures', action='store_true',
+                    help='Classify the gesture of each hand from its landmarks and write it to the gestures segment.')
+parser.add_argument('--gesture-debounce', type=int, default=0, metavar='FRAMES',
+                    help='With --gestures, only report a new gesture once it has been recognised in FRAMES frames in a '
+                         'row. Default 0: straight away.')
+parser.add_argument('--object-detection', action='store_true',
+                    help='Detect objects on a worker thread in some of the frames and write them to the '
+                         'object_detections segment, without delaying the hand landmarks.')
+parser.add_argument('--object-detection-interval', type=int, default=10, metavar='FRAMES',
+                    help='With --object-detection, detect objects in every FRAMES-th frame. Default 10.')
+parser.add_argument('--scene-change-threshold', type=float, default=0, metavar='LEVELS',
+                    help='With --object-detection, also detect objects as soon as a frame differs from the last one '
+                         'they were detected in by more than LEVELS grey levels on average. Default 0: off.')
+parser.add_argument('--min-object-score', type=float, default=0.5,
+                    help='Minimum score of a detected object. Default 0.5.')
+parser.add_argument('--gap-fill', type=int, default=0, metavar='FRAMES',
+                    help='Fill in a hand that is not detected with its projected position for up to FRAMES frames, '
+                         'marked as extrapolated in the output, instead of dropping it straight away. Default 0.')
+parser.add_argument('--gap-fill-decay', type=float, default=0.5,
+                    help='Factor by which the confidence of a filled in hand drops with every frame. Default 0.5.')
+parser.add_argument('--detection-interval', type=int, default=0, metavar='FRAMES',
+                    help='With --roi, also run the landmarker on the full frame at least every FRAMES frames while the '
+                         'hands are still, to pick up hands entering the frame, and more often the faster they move. '
+                         'Default 0: only when a hand is lost.')
+parser.add_argument('--fast-hand-speed', type=float, default=50, metavar='PIXELS',
+                    help='Wrist speed in pixels per frame from which --detection-interval drops to every frame. '
+                         'Default 50.')
+parser.add_argument('--min-detection-confidence', type=float, default=0.05,
+                    help='Minimum confidence for the palm detector to report a hand. Default 0.05.')
+parser.add_argument('--min-presence-confidence', type=float, default=0.5,
+                    help='Minimum confidence that a hand is present in its landmarked region. Default 0.5.')
+parser.add_argument('--min-tracking-confidence', type=float, default=0.5,
+                    help='Below this the full-frame landmarker re-runs palm detection instead of tracking the hands '
+                         'from the previous frame. Default 0.5.')
 args = parser.parse_args()
+if args.latest_frame and args.frame_slots < 2:
+    parser.error('--latest-frame requires --frame-slots 2 or more')
+if args.detection_interval and not args.roi:
+    parser.error('--detection-interval requires --roi')
+if args.running_mode == 'live_stream' and (args.roi or args.pipeline):
+    parser.error('--running-mode live_stream cannot be combined with --roi or --pipeline')
+if args.roi and args.pipeline:
+    # The ROI is chosen from the hand tracker, which the post-processing thread updates at the same time
+    parser.error('--roi cannot be combined with --pipeline')
+if args.predict_ms and not args.filter:
+    parser.error('--predict-ms requires --filter')
+if args.gesture_debounce and not args.gestures:
+    parser.error('--gesture-debounce requires --gestures')
+if args.object_detection_interval < 1:
+    parser.error('--object-detection-interval must be at least 1')
+if args.scene_change_threshold and not args.object_detection:
+    parser.error('--scene-change-threshold requires --object-detection')
+if args.backend is None:
+    args.backend = default_backend(args.platform)
+if not re.fullmatch(r'[A-Za-z0-9_-]*', args.namespace):
+    parser.error('--namespace may only contain letters, digits, "_" and "-"')
+if args.cpus is not None:
+    pin_to_cpus(args.cpus)  # before the landmarker starts its threads, so that they inherit the affinity
 
-ipc = WindowsIPC() if args.platform == 'windows' else LinuxIPC()
+if args.platform == 'windows':
+    ipc = WindowsIPC(args.frame_slots, args.latest_frame, args.namespace)
+else:
+    ipc = LinuxIPC(args.frame_slots, args.latest_frame, args.namespace)
 
 # Global flag for graceful shutdown
 shutdown_flag = False
+pipeline = None
 
 def signal_handler(signum, frame):
     global shutdown_flag
     shutdown_flag = True
+    ipc.request_shutdown()
+    if pipeline is not None:
+        pipeline.stop()
 
 # Register signal handler for SIGINT (Ctrl+C)
 signal.signal(signal.SIGINT, signal_handler)
 
+STATS_REPORT_INTERVAL = 5  # seconds
+LIVE_STREAM_SHUTDOWN_TIMEOUT = 2  # seconds to wait for the last results before closing the shared memory
+
 @contextmanager
 def timer(name):
-    start = time.time()
+    start = time.perf_counter_ns()
     yield
-    end = time.time()
-    # print(f"{name}: {int((end - start)*1000)} ms")
+    end = time.perf_counter_ns()
+    ipc.stats.record(name, end - start)
     
 def get_path(path):
     dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(dir, path)
 
-if args.platform == 'windows':
-    base_options = BaseOptions(model_asset_path=get_path(HAND_LANDMARKING_MODEL_PATH))
-else:
-    base_options = BaseOptions(model_asset_path=get_path(HAND_LANDMARKING_MODEL_PATH), delegate=BaseOptions.Delegate.GPU)
+base_options = BaseOptions(model_asset_path=get_path(HAND_LANDMARKING_MODEL_PATH))  # delegate is set by the backend
+
+live_stream = None
+if args.running_mode == 'live_stream':
+    # Results are written from MediaPipe's thread as they arrive, see on_result
+    live_stream = LiveStream(lambda frame, result: on_result(frame, result), lambda frame: on_dropped(frame))
 
 hand_landmarker_options = HandLandmarkerOptions(
     base_options=base_options,
-    running_mode=RunningMode.VIDEO,
+    running_mode=RunningMode.VIDEO if live_stream is None else RunningMode.LIVE_STREAM,
     num_hands=2,
-    min_hand_detection_confidence=0.05,
-    min_hand_presence_confidence=0.5,
-    min_tracking_confidence=0.5,
+    min_hand_detection_confidence=args.min_detection_confidence,
+    min_hand_presence_confidence=args.min_presence_confidence,
+    min_tracking_confidence=args.min_tracking_confidence,
+    result_callback=None if live_stream is None else live_stream.result_callback,
 )
 
-left_hand_history = []  # Will store numpy arrays of shape (21, 3)
-right_hand_history = []
-projected_left_hand = np.zeros((21, 3))
-projected_right_hand = np.zeros((21, 3))
-
-left_hand_absent_count = 0
-right_hand_absent_count = 0
-
-# Gesture mapping
-GESTURE_MAP = {
-    "None": 0,
-    "Closed_Fist": 1,
-    "Open_Palm": 2,
-    "Pointing_Up": 3,
-    "Thumb_Down": 4,
-    "Thumb_Up": 5,
-    "Victory": 6,
-    "Spock": 7,
-    "Calling": 8,
-    "ILoveYou": 9
-}
-
-def landmarks_to_array(landmarks):
-    """Convert MediaPipe landmarks to numpy array with shape (21, 3)"""
-    if landmarks is None:
+if args.roi:
+    # The crop moves from frame to frame, so run the ROI landmarker in image mode rather than letting it track
+    roi_hand_landmarker_options = HandLandmarkerOptions(
+        base_options=base_options,
+        running_mode=RunningMode.IMAGE,
+        num_hands=2,
+        min_hand_detection_confidence=args.min_detection_confidence,
+        min_hand_presence_confidence=args.min_presence_confidence,
+    )
+    roi_selector = RoiSelector(args.roi_margin, args.roi_min_size, args.roi_max_area)
+    detection_scheduler = DetectionScheduler(args.detection_interval, args.fast_hand_speed)
+
+recorder = None
+if args.record is not None:
+    recorder = Recorder(args.record)
+
+# Frames are downscaled first (if at all), so that there are fewer pixels to convert to RGB
+downscaler = None
+if args.input_size is not None and args.input_size != (COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT):
+    downscaler = Downscaler(*args.input_size, args.input_interpolation)
+colour_converter = ColourConverter()
+
+hand_tracker = HandTracker(args.gap_fill, args.gap_fill_decay)
+
+landmark_filter = None
+if args.filter:
+    landmark_filter = OneEuroFilter(args.filter_min_cutoff, args.filter_beta)
+    predicted_landmarks = np.zeros(HAND_LANDMARKS_SHAPE, dtype=np.float32)
+
+gesture_classifier = None
+if args.gestures:
+    gesture_classifier = GestureClassifier(args.gesture_debounce)
+
+object_detector_options = ObjectDetectorOptions(
+    base_options=BaseOptions(model_asset_path=get_path(OBJECT_DETECTION_MODEL_PATH)),
+    running_mode=RunningMode.IMAGE,
+    max_results=MAX_OBJECT_DETECTIONS,
+    score_threshold=args.min_object_score,
+)
+object_detections = np.zeros(MAX_OBJECT_DETECTIONS, dtype=OBJECT_DETECTION_DTYPE)
+object_detection = None
+
+class Frame:
+    """A frame travelling through the capture, inference and post-processing stages"""
+
+    def __init__(self, seq, capture_timestamp, mp_image):
+        self.seq = seq
+        self.capture_timestamp = capture_timestamp
+        self.mp_image = mp_image
+        self.hand_landmarker_result = None
+        self.roi = None
+        """(x, y, width, height) of the crop the landmarker ran on, None for the full frame"""
+        self.submit_timestamp = None
+        """perf counter nanoseconds when the frame was passed to the landmarker in the live_stream running mode"""
+
+
+def read_frame():
+    """Wait for the next frame and copy it into an mp.Image. Returns None if there is no frame to process."""
+    with timer("Waiting for frame"):
+        ready = ipc.wait_ready()
+    if not ready or shutdown_flag:
         return None
-    arr = np.array([[landmark.x * COLOUR_IMAGE_FULL_WIDTH,
-                     -landmark.z * COLOUR_IMAGE_FULL_WIDTH,
-                     landmark.y * COLOUR_IMAGE_FULL_HEIGHT] for landmark in landmarks])
-    return arr
-
-with HandLandmarker.create_from_options(hand_landmarker_options) as hand_landmarker:
-    print("Ready.")
-
-    try:
-        while not shutdown_flag:
-            ipc.wait_ready()
-
-            # Read the frame
-            with timer("Reading frame"):
-                ipc.colour_image_buffer.seek(0)
-                colour_image_data = np.frombuffer(ipc.colour_image_buffer, dtype=np.uint8).reshape(
-                    (COLOUR_IMAGE_FULL_HEIGHT, COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_NUM_CHANNELS))
-
-            # Perform hand landmarking
-            with timer("Creating mp image"):
-                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=colour_image_data)
-            with timer("Running hand landmarker model"):
-                hand_landmarker_result = hand_landmarker.detect_for_video(mp_image, int(time.monotonic() * 1000))
-
-            # determine handedness and scale to pixel coordinates
-            with timer("Processing results"):
-                using_left_projected_hand = False
-                using_right_projected_hand = False
-
-                if len(hand_landmarker_result.hand_landmarks) == 0:
-                    left = None
-                    right = None
-                    left_hand_absent_count += 1
-                    right_hand_absent_count += 1
-
-                    # # Fill in missing hands with projected positions if absent for <= 2 frames
-                    # if left_hand_absent_count <= 2:
-                    #     left = projected_left_hand
-                    #     using_left_projected_hand = True
-                    # if right_hand_absent_count <= 2:
-                    #     right = projected_right_hand
-                    #     using_right_projected_hand = True
-                        
-                elif len(hand_landmarker_result.hand_landmarks) <= 1:
-                    left = None
-                    right = None
-                    for i, handedness in enumerate(hand_landmarker_result.handedness):
-                        if handedness[0].category_name == "Left":
-                            left = landmarks_to_array(hand_landmarker_result.hand_landmarks[i])
-                            right_hand_absent_count += 1
-                            left_hand_absent_count = 0
-                        else:
-                            right = landmarks_to_array(hand_landmarker_result.hand_landmarks[i])
-                            left_hand_absent_count += 1
-                            right_hand_absent_count = 0
-
-                    # # Fill in missing hands with projected positions if absent for <= 2 frames
-                    # if left is None and left_hand_absent_count <= 2:
-                    #     left = projected_left_hand
-                    #     using_left_projected_hand = True
-                    # if right is None and right_hand_absent_count <= 2:
-                    #     right = projected_right_hand
-                    #     using_right_projected_hand = True
-
-                elif len(hand_landmarker_result.hand_landmarks) == 2:
-                    left_hand_absent_count = 0
-                    right_hand_absent_count = 0
-                    
-                    if hand_landmarker_result.handedness[0][0].category_name == hand_landmarker_result.handedness[1][0].category_name:
-                        # both hands have same handedness -> determine handedness manually
-                        left = None
-                        right = None
-                        for i, hand_landmarks in enumerate(hand_landmarker_result.hand_landmarks):
-                            landmarks = landmarks_to_array(hand_landmarks)
-                            real_wrist = landmarks[0]
-                            projected_left_wrist = projected_left_hand[0]
-                            projected_right_wrist = projected_right_hand[0]
-                            if (np.linalg.norm(real_wrist - projected_left_wrist) < np.linalg.norm(real_wrist - projected_right_wrist) and \
-                                    left is None) or right is not None:
-                                left = landmarks
-                            else:
-                                right = landmarks
 
-                    else:
-                        # hands have different handedness -> use mediapipe's handedness
-                        left = None
-                        right = None
-                        for i, handedness in enumerate(hand_landmarker_result.handedness):
-                            if handedness[0].category_name == "Left":
-                                left = landmarks_to_array(hand_landmarker_result.hand_landmarks[i])
-                            else:
-                                right = landmarks_to_array(hand_landmarker_result.hand_landmarks[i])
-
-                else:
-                    print("Warning: More than 2 hands detected.")
-                    left = None
-                    right = None
-                    for i, handedness in enumerate(hand_landmarker_result.handedness):
-                        if handedness[0].category_name == "Left":
-                            left = landmarks_to_array(hand_landmarker_result.hand_landmarks[i])
-                        else:
-                            right = landmarks_to_array(hand_landmarker_result.hand_landmarks[i])
-
-            if VISUALISE_INFERENCE_RESULTS:
-                with timer("Visualising results"):
-                    scale = 1
-                    vis_frame = cv2.cvtColor(colour_image_data, cv2.COLOR_RGB2BGR)
-                    for landmarks, colour in ((left, (0, 255, 0)), (right, (0, 0, 255))):
-                        if landmarks is not None:
-                            # If using projected hand, draw it in magenta
-                            if (landmarks == projected_left_hand).all():
-                                colour = (255, 0, 255)
-                            elif (landmarks == projected_right_hand).all():
-                                colour = (255, 0, 255)
-
-                            # Draw current connections
-                            for connection in HandLandmarksConnections.HAND_CONNECTIONS:
-                                cv2.line(vis_frame, 
-                                       (int(landmarks[connection.start, 0]),
-                                        int(landmarks[connection.start, 2])),
-                                       (int(landmarks[connection.end, 0]),
-                                        int(landmarks[connection.end, 2])),
-                                       colour, 1)
-
-                            # Draw current landmarks
-                            for landmark in landmarks:
-                                cv2.circle(vis_frame, 
-                                         (int(landmark[0]), int(landmark[2])), 
-                                         3, colour, -1)
-
-                    # Draw previous wrist points
-                    for landmarks in left_hand_history:
-                        cv2.circle(vis_frame, (int(landmarks[0, 0]), int(landmarks[0, 2])), 3, (255, 0, 0), -1)
-                    for landmarks in right_hand_history:
-                        cv2.circle(vis_frame, (int(landmarks[0, 0]), int(landmarks[0, 2])), 3, (255, 0, 0), -1)
-
-                    # Draw projected wrist points
-                    cv2.circle(vis_frame, (int(projected_left_hand[0, 0]), int(projected_left_hand[0, 2])), 3, (255, 0, 255), -1)
-                    cv2.circle(vis_frame, (int(projected_right_hand[0, 0]), int(projected_right_hand[0, 2])), 3, (255, 0, 255), -1)
-
-                    # Handle window
-                    cv2.imshow("Inference visualisation", vis_frame)
-                    key = cv2.waitKey(1)
-                    if key == 27:
-                        cv2.destroyWindow("Inference visualisation")
-                        VISUALISE_INFERENCE_RESULTS = False
-
-            # Keep track of previous results
-            if len(left_hand_history) >= 2:
-                left_hand_history.pop(0)
-                right_hand_history.pop(0)
-            left_hand_history.append(left if left is not None else np.zeros((21, 3)))
-            right_hand_history.append(right if right is not None else np.zeros((21, 3)))
-            
-            # Calculate projection to fill in gaps where model doesn't find hands
-            if len(left_hand_history) == 1:
-                # use previous location of hands
-                projected_left_hand = left_hand_history[-1]
-                projected_right_hand = right_hand_history[-1]
+    # Read the frame as its header describes it
+    with timer("Reading frame"):
+        try:
+            result = ipc.read_frame()
+        except ValueError as e:
+            print(f"Warning: skipping frame with an invalid header: {e}")
+            ipc.count_dropped()
+            ipc.set_done()
+            return None
+        if result is None:
+            return None  # woken without a new frame, nothing to tell the producer
+        frame_seq, colour_image_data, frame_header = result
+        capture_timestamp = int(frame_header["capture_timestamp"]) or time.perf_counter_ns()
+        pixel_format = int(frame_header["pixel_format"])
+
+    if recorder is not None:
+        with timer("Recording frame"):
+            if not recorder.write(capture_timestamp, colour_image_data, pixel_format) \
+                    and recorder.frames_skipped == 1:
+                print("Warning: not recording frames whose size or pixel format differs from the first one")
+
+    if downscaler is not None:
+        with timer("Downscaling frame"):
+            colour_image_data = downscaler(colour_image_data)  # the mp.Image copies it before the buffer is reused
+
+    with timer("Converting frame to RGB"):
+        colour_image_data = colour_converter(colour_image_data, pixel_format)
+
+    with timer("Creating mp image"):
+        colour_image_data = np.ascontiguousarray(colour_image_data)  # only copies RGB frames with row padding
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=colour_image_data)
+    del colour_image_data  # don't keep the shared memory exported, the mp.Image holds a copy
+    if not ipc.frame_valid(frame_seq):
+        if recorder is not None:
+            recorder.discard_last()
+        return None  # producer overwrote the slot while we were copying it
+    if object_detection is not None:
+        object_detection.submit(frame_seq, capture_timestamp, mp_image)  # shares the mp.Image, doesn't wait
+    return Frame(frame_seq, capture_timestamp, mp_image)
+
+def detect_hands_in_roi(frame):
+    """Run the landmarker on a crop around the projected hands. Returns False if the full frame should be used."""
+    tracked_hands = hand_tracker.tracked_hands()
+    roi = roi_selector.select(tracked_hands)
+    if roi is None:
+        return False
+
+    with timer("Running hand landmarker model on ROI"):
+        (x, y, width, height), roi = roi_in_image(roi, frame.mp_image.width, frame.mp_image.height)
+        crop = np.ascontiguousarray(frame.mp_image.numpy_view()[y:y + height, x:x + width])
+        result = roi_hand_landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=crop))
+    if len(result.hand_landmarks) < len(tracked_hands):
+        return False  # lost a hand -> look for it in the full frame
+
+    frame.hand_landmarker_result = result
+    frame.roi = roi
+    return True
+
+last_video_timestamp_ms = -1
+
+def video_timestamp_ms(frame):
+    """Timestamp of the frame for the landmarker in VIDEO mode: its capture time, so that its tracking sees how far
+    apart the frames really were, moved to the next free millisecond as MediaPipe needs strictly increasing ones"""
+    global last_video_timestamp_ms
+    last_video_timestamp_ms = max(frame.capture_timestamp // 1_000_000, last_video_timestamp_ms + 1)
+    return last_video_timestamp_ms
+
+def detect_hands(frame):
+    # Perform hand landmarking, on a ROI around the tracked hands unless a full-frame detection is due
+    if args.roi:
+        hand_tracker.project(frame.capture_timestamp)
+        full_frame = detection_scheduler.full_frame_due(hand_tracker.speed()) or not detect_hands_in_roi(frame)
+        detection_scheduler.record(full_frame)
+        if not full_frame:
+            return frame
+    with timer("Running hand landmarker model"):
+        frame.hand_landmarker_result = hand_landmarker.detect_for_video(frame.mp_image, video_timestamp_ms(frame))
+    return frame
+
+def submit_frame(frame):
+    """Start detecting hands in the frame in the live_stream running mode. on_result or on_dropped is called later."""
+    with timer("Submitting frame to hand landmarker"):
+        frame.submit_timestamp = time.perf_counter_ns()
+        live_stream.submit(hand_landmarker, frame.mp_image, frame.capture_timestamp, frame)
+
+def on_result(frame, result):
+    ipc.stats.record("Hand landmarker submit to result", time.perf_counter_ns() - frame.submit_timestamp)
+    frame.hand_landmarker_result = result
+    process_results(frame)
+
+def on_dropped(frame):
+    """The landmarker skipped the frame because it was busy. Tell the producer anyway so it doesn't wait for it."""
+    ipc.count_dropped()
+    if not shutdown_flag:
+        ipc.set_done()
+
+def detect_objects(image):
+    with timer("Running object detector"):
+        return object_detector.detect(image)
+
+def on_objects_detected(frame_seq, capture_timestamp, image, result):
+    """Write the objects the worker detected in a frame, called on its thread"""
+    ipc.write_object_detections(frame_seq, capture_timestamp,
+                                detections_to_array(result, image.width, image.height, object_detections))
+    capture_to_result = time.perf_counter_ns() - capture_timestamp
+    if capture_to_result >= 0:
+        ipc.stats.record("Capture to object detections", capture_to_result)
+
+def visualise_results(colour_image_data, left, right):
+    global VISUALISE_INFERENCE_RESULTS
+    scale = 1
+    vis_frame = cv2.cvtColor(colour_image_data, cv2.COLOR_RGB2BGR)
+    if vis_frame.shape[1] != COLOUR_IMAGE_FULL_WIDTH:
+        vis_frame = cv2.resize(vis_frame, (COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT))  # landmarks are in full-frame pixels
+    for landmarks, colour in ((left, (0, 255, 0)), (right, (0, 0, 255))):
+        if landmarks is not None:
+            # If using projected hand, draw it in magenta
+            if (landmarks == hand_tracker.projected_left_hand).all():
+                colour = (255, 0, 255)
+            elif (landmarks == hand_tracker.projected_right_hand).all():
+                colour = (255, 0, 255)
+
+            # Draw current connections
+            for connection in HandLandmarksConnections.HAND_CONNECTIONS:
+                cv2.line(vis_frame, 
+                       (int(landmarks[connection.start, 0]),
+                        int(landmarks[connection.start, 2])),
+                       (int(landmarks[connection.end, 0]),
+                        int(landmarks[connection.end, 2])),
+                       colour, 1)
+
+            # Draw current landmarks
+            for landmark in landmarks:
+                cv2.circle(vis_frame, 
+                         (int(landmark[0]), int(landmark[2])), 
+                         3, colour, -1)
+
+    # Draw previous wrist points
+    for landmarks in hand_tracker.left_hand_history:
+        cv2.circle(vis_frame, (int(landmarks[0, 0]), int(landmarks[0, 2])), 3, (255, 0, 0), -1)
+    for landmarks in hand_tracker.right_hand_history:
+        cv2.circle(vis_frame, (int(landmarks[0, 0]), int(landmarks[0, 2])), 3, (255, 0, 0), -1)
+
+    # Draw projected wrist points
+    projected_left_hand = hand_tracker.projected_left_hand
+    projected_right_hand = hand_tracker.projected_right_hand
+    cv2.circle(vis_frame, (int(projected_left_hand[0, 0]), int(projected_left_hand[0, 2])), 3, (255, 0, 255), -1)
+    cv2.circle(vis_frame, (int(projected_right_hand[0, 0]), int(projected_right_hand[0, 2])), 3, (255, 0, 255), -1)
+
+    # Handle window
+    cv2.imshow("Inference visualisation", vis_frame)
+    key = cv2.waitKey(1)
+    if key == 27:
+        cv2.destroyWindow("Inference visualisation")
+        VISUALISE_INFERENCE_RESULTS = False
+
+def process_results(frame):
+    """Assign handedness, update the hand projections and write the results for the consumer"""
+    # determine handedness and scale to pixel coordinates
+    with timer("Processing results"):
+        hand_tracker.project(frame.capture_timestamp)
+        if frame.roi is None:
+            left, right = hand_tracker.assign_hands(frame.hand_landmarker_result)
+        else:
+            left, right = hand_tracker.assign_hands(frame.hand_landmarker_result, *roi_scale_and_offset(frame.roi))
+
+    if VISUALISE_INFERENCE_RESULTS:
+        with timer("Visualising results"):
+            visualise_results(frame.mp_image.numpy_view(), left, right)
+
+    # Keep track of previous results and calculate projection to fill in gaps where model doesn't find hands
+    hand_tracker.update(left, right, frame.capture_timestamp)
+    extrapolated = (hand_tracker.left_hand_extrapolated, hand_tracker.right_hand_extrapolated)
+    confidences = hand_tracker.confidences(left, right)
+    hands_detected = (left is not None and not extrapolated[0]) + (right is not None and not extrapolated[1])
+
+    # Classify the gestures from the landmarks as detected, before they are smoothed or predicted
+    if gesture_classifier is not None:
+        with timer("Classifying gestures"):
+            gestures, gesture_confidences = gesture_classifier.classify((left, right))
+
+    # Smooth the landmarks and predict where they will be
+    landmarks_timestamp = None
+    if landmark_filter is not None:
+        with timer("Filtering landmarks"):
+            landmarks = landmark_filter.update(frame.capture_timestamp, (left, right))
+            if args.predict_ms > 0:
+                landmarks = landmark_filter.predict(args.predict_ms / 1000, predicted_landmarks)
+                landmarks_timestamp = frame.capture_timestamp + int(args.predict_ms * 1e6)
+            left = landmarks[0] if left is not None else None
+            right = landmarks[1] if right is not None else None
+
+    # Write the hand landmarks and gestures
+    with timer("Writing results"):
+        ipc.write_hand_landmarks(frame.seq, frame.capture_timestamp, left, right, landmarks_timestamp,
+                                 extrapolated, confidences)
+        if gesture_classifier is not None:
+            ipc.write_gestures(frame.seq, frame.capture_timestamp, gestures, gesture_confidences)
+    capture_to_result = time.perf_counter_ns() - frame.capture_timestamp
+    if capture_to_result >= 0:  # a producer on another clock can't be compared
+        ipc.stats.record("Capture to result", capture_to_result)
+
+    if not shutdown_flag:
+        ipc.set_done()
+    ipc.stats.add("frames_processed")
+    ipc.stats.add("hands_detected", hands_detected)
+    ipc.stats.add("identity_swaps", hand_tracker.identity_swapped)
+
+last_report = snapshot(ipc.stats_buffer)
+last_report_time = time.monotonic()
+
+def report_stats():
+    """Print the per-stage throughput and latency and the frame counts since the last report"""
+    global last_report, last_report_time
+    now = time.monotonic()
+    report = snapshot(ipc.stats_buffer)
+    lines = format_report(report, last_report, now - last_report_time)
+    if args.stats:
+        print("\n".join(lines))
+    elif args.latest_frame:
+        print(lines[-1])
+    last_report = report
+    last_report_time = now
+
+stub_script = np.load(args.stub_landmarks) if args.stub_landmarks is not None else None
+
+def create_landmarker(options):
+    return create_hand_landmarker(args.backend, options, args.stub_latency / 1000, stub_script)
+
+roi_hand_landmarker = create_landmarker(roi_hand_landmarker_options) if args.roi else None
+object_detector = None
+if args.object_detection:
+    object_detector = create_object_detector(args.backend, object_detector_options, args.stub_latency / 1000)
+    object_detection = ObjectDetectionWorker(detect_objects, on_objects_detected, args.object_detection_interval,
+                                             args.scene_change_threshold)
+
+try:
+    with create_landmarker(hand_landmarker_options) as hand_landmarker:
+        print("Ready.")
+
+        try:
+            if args.pipeline:
+                pipeline = Pipeline([("capture", read_frame),
+                                     ("inference", detect_hands),
+                                     ("post-processing", process_results)],
+                                    queue_size=args.pipeline_queue_size,
+                                    on_error=lambda error: ipc.request_shutdown())  # wakes up the capture stage
+                pipeline.start()
+                while not shutdown_flag and not pipeline.wait(STATS_REPORT_INTERVAL):
+                    report_stats()
+                pipeline.stop()
+                pipeline.join()
             else:
-                # assume constant velocity and rigid hand
-                last_wrist = left_hand_history[-1][0]
-                prev_wrist = left_hand_history[-2][0]
-                delta = last_wrist - prev_wrist
-                projected_left_hand = left_hand_history[-1] + delta
-
-                last_right = right_hand_history[-1][0]
-                prev_right = right_hand_history[-2][0]
-                delta = last_right - prev_right
-                projected_right_hand = right_hand_history[-1] + delta
-
-            # Write the hand landmarks and gestures
-            with timer("Writing results"):
-                # Write hand landmarks
-                ipc.hand_landmarks_buffer.seek(0)
-                for i, hand in enumerate((left, right)):
-                    if hand is None:
-                        zeros = np.zeros((21, 3))
-                        for j in range(21):
-                            struct.pack_into("<fff", ipc.hand_landmarks_buffer, i*21*3*4 + j*3*4, 
-                                           zeros[j, 0], zeros[j, 1], zeros[j, 2])
+                while not shutdown_flag:
+                    frame = read_frame()
+                    if frame is None:
+                        pass
+                    elif live_stream is not None:
+                        submit_frame(frame)
                     else:
-                        for j in range(21):
-                            struct.pack_into("<fff", ipc.hand_landmarks_buffer, i*21*3*4 + j*3*4,
-                                           hand[j, 0], hand[j, 1], hand[j, 2])
-
-            if not shutdown_flag:
-                ipc.set_done()
-
-    finally:
-        # Clean up
-        cv2.destroyAllWindows()
-        if "mp_image" in vars(): del mp_image
-        if "colour_image_data" in vars(): del colour_image_data
-        ipc.close()
\ No newline at end of file
+                        process_results(detect_hands(frame))
+
+                    if time.monotonic() - last_report_time >= STATS_REPORT_INTERVAL:
+                        report_stats()
+
+        finally:
+            if live_stream is not None and not live_stream.wait_idle(LIVE_STREAM_SHUTDOWN_TIMEOUT):
+                print(f"Warning: {live_stream.frames_in_flight} frame(s) still in the hand landmarker")
+finally:
+    # The hand landmarker is closed by now, which stops its result callbacks in the live_stream running mode, so they
+    # can't write to the shared memory once it is closed
+    if args.stats or args.latest_frame:
+        print("In total: " + format_report(snapshot(ipc.stats_buffer))[-1])
+
+    # Clean up, the object detection worker first as it writes to the shared memory
+    if object_detection is not None:
+        object_detection.close()
+        object_detector.close()
+        print(f"Detected objects in {object_detection.frames_detected} frames")
+    cv2.destroyAllWindows()
+    if recorder is not None:
+        recorder.close()
+        print(f"Recorded {recorder.frames_recorded} frames to {args.record}" +
+              (f", skipped {recorder.frames_skipped}" if recorder.frames_skipped else ""))
+    if roi_hand_landmarker is not None:
+        roi_hand_landmarker.close()
+    if "frame" in vars(): del frame
+    ipc.close()
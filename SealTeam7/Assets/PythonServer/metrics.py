@@ -0,0 +1,176 @@
+import threading
+
+import numpy as np
+
+
+# Stats page layout. The server keeps its counters and latency histograms directly in a shared memory segment, so
+# recording a measurement is a few in-place increments and reading them (stats.py, or main.py --stats) costs the
+# server nothing. Within the server the updates take a lock, since stages on several threads (--pipeline, the
+# live_stream callback, --object-detection) record into the same page; readers take none and only need approximate
+# values.
+#   uint32 version                STATS_VERSION
+#   uint32 num_histograms         number of histograms in use
+#   int64  start_timestamp        perf counter nanoseconds when the server started
+#   uint64 frames_processed       frames whose landmarks were written
+#   uint64 frames_dropped         frames skipped or torn in latest-frame mode
+#   uint64 hands_detected         hands found in all processed frames
+#   uint64 identity_swaps         frames where tracking overrode MediaPipe's handedness
+# followed by MAX_HISTOGRAMS histograms (HISTOGRAM_DTYPE), one per timed stage in the order they first ran.
+#
+# Histograms are log-linear like HdrHistogram: durations are recorded in microseconds, exactly up to 2^HISTOGRAM_SUB_
+# BUCKET_BITS us and with a relative error below 2^-(HISTOGRAM_SUB_BUCKET_BITS - 1) above that, up to about an hour.
+STATS_VERSION = 1
+STATS_HEADER_SIZE = 64
+STATS_COUNTERS = ("frames_processed", "frames_dropped", "hands_detected", "identity_swaps")
+STATS_HEADER_DTYPE = np.dtype({
+    "names": ["version", "num_histograms", "start_timestamp", *STATS_COUNTERS],
+    "formats": ["<u4", "<u4", "<i8", "<u8", "<u8", "<u8", "<u8"],
+    "offsets": [0, 4, 8, 16, 24, 32, 40],
+    "itemsize": STATS_HEADER_SIZE,
+})
+HISTOGRAM_SUB_BUCKET_BITS = 7
+HISTOGRAM_MAX_EXPONENT = 25
+HISTOGRAM_MAX_VALUE = (1 << (HISTOGRAM_MAX_EXPONENT + HISTOGRAM_SUB_BUCKET_BITS)) - 1  # us
+NUM_HISTOGRAM_BUCKETS = (HISTOGRAM_MAX_EXPONENT + 2) << (HISTOGRAM_SUB_BUCKET_BITS - 1)
+HISTOGRAM_DTYPE = np.dtype([
+    ("name", "S64"),
+    ("count", "<u8"),
+    ("total_ns", "<u8"),
+    ("max_ns", "<u8"),
+    ("buckets", "<u8", (NUM_HISTOGRAM_BUCKETS,)),
+])
+MAX_HISTOGRAMS = 24
+STATS_SIZE = STATS_HEADER_SIZE + MAX_HISTOGRAMS * HISTOGRAM_DTYPE.itemsize
+STATS_PERCENTILES = (50, 95, 99)
+
+_HALF_SUB_BUCKET_COUNT = 1 << (HISTOGRAM_SUB_BUCKET_BITS - 1)
+_COUNTER_WORDS = {counter: STATS_HEADER_DTYPE.fields[counter][1] // 8 for counter in STATS_COUNTERS}
+_COUNT_WORD, _TOTAL_WORD, _MAX_WORD, _BUCKETS_WORD = (HISTOGRAM_DTYPE.fields[field][1] // 8
+                                                      for field in ("count", "total_ns", "max_ns", "buckets"))
+
+
+def bucket_index(value):
+    """Bucket of a duration in microseconds"""
+    value = min(value, HISTOGRAM_MAX_VALUE)
+    exponent = max(0, value.bit_length() - HISTOGRAM_SUB_BUCKET_BITS)
+    return (exponent << (HISTOGRAM_SUB_BUCKET_BITS - 1)) + (value >> exponent)
+
+def bucket_upper_bounds():
+    """Largest duration in microseconds that falls into each bucket"""
+    index = np.arange(NUM_HISTOGRAM_BUCKETS)
+    exponent = np.maximum(0, index // _HALF_SUB_BUCKET_COUNT - 1)
+    return ((index - exponent * _HALF_SUB_BUCKET_COUNT + 1) << exponent) - 1
+
+_BUCKET_UPPER_BOUNDS = bucket_upper_bounds()
+
+def percentiles(buckets, percents=STATS_PERCENTILES):
+    """Durations in microseconds below which the given percentages of the recorded durations fall"""
+    cumulative = np.cumsum(buckets)
+    if cumulative[-1] == 0:
+        return [0] * len(percents)
+    ranks = [max(1, int(np.ceil(percent / 100 * cumulative[-1]))) for percent in percents]
+    return list(_BUCKET_UPPER_BOUNDS[np.searchsorted(cumulative, ranks)])
+
+
+class Stats:
+    """Writer of the stats page in buffer"""
+
+    def __init__(self, buffer, start_timestamp):
+        self.header = np.ndarray((), dtype=STATS_HEADER_DTYPE, buffer=buffer)
+        self.histograms = np.ndarray((MAX_HISTOGRAMS,), dtype=HISTOGRAM_DTYPE, buffer=buffer, offset=STATS_HEADER_SIZE)
+        self.header.fill(0)
+        self.histograms.fill(0)
+        self.header["version"] = STATS_VERSION
+        self.header["start_timestamp"] = start_timestamp
+        self.__indices = {}
+        self.__lock = threading.Lock()  # += on the words is a read-modify-write that another thread can interleave
+        # Going through a memoryview of uint64s is several times faster than updating numpy scalars
+        self.__words = memoryview(buffer).cast("B").cast("Q")
+
+    def record(self, name, duration_ns):
+        """Add a duration to the histogram of the named stage, starting a new histogram the first time"""
+        index = self.__indices.get(name)
+        if index is None:
+            index = self.__add_histogram(name)
+            if index is None:
+                return
+        words = self.__words
+        base = (STATS_HEADER_SIZE + index * HISTOGRAM_DTYPE.itemsize) // 8
+        bucket = base + _BUCKETS_WORD + bucket_index(duration_ns // 1000)
+        with self.__lock:
+            words[base + _COUNT_WORD] += 1
+            words[base + _TOTAL_WORD] += duration_ns
+            if duration_ns > words[base + _MAX_WORD]:
+                words[base + _MAX_WORD] = duration_ns
+            words[bucket] += 1
+
+    def __add_histogram(self, name):
+        with self.__lock:
+            if name in self.__indices:
+                return self.__indices[name]
+            num_histograms = int(self.header["num_histograms"])
+            if num_histograms == MAX_HISTOGRAMS:
+                print(f"Warning: no histogram left for \"{name}\", increase MAX_HISTOGRAMS")
+                self.__indices[name] = None
+                return None
+            self.histograms[num_histograms]["name"] = name.encode()[:HISTOGRAM_DTYPE["name"].itemsize]
+            self.header["num_histograms"] = num_histograms + 1
+            self.__indices[name] = num_histograms
+            return num_histograms
+
+    def add(self, counter, count=1):
+        with self.__lock:
+            self.__words[_COUNTER_WORDS[counter]] += count
+
+    def set(self, counter, value):
+        with self.__lock:
+            self.__words[_COUNTER_WORDS[counter]] = value
+
+    def release(self):
+        """Drop the views so that the underlying buffer can be closed"""
+        self.header = None
+        self.histograms = None
+        self.__words.release()
+
+
+def snapshot(buffer):
+    """Copy the header and histograms in use out of a stats page"""
+    header = np.ndarray((), dtype=STATS_HEADER_DTYPE, buffer=buffer).copy()
+    if header["version"] != STATS_VERSION:
+        raise ValueError(f"Stats page has version {header['version']}, expected {STATS_VERSION}")
+    num_histograms = min(int(header["num_histograms"]), MAX_HISTOGRAMS)
+    histograms = np.ndarray((num_histograms,), dtype=HISTOGRAM_DTYPE, buffer=buffer, offset=STATS_HEADER_SIZE).copy()
+    return header, histograms
+
+def format_report(current, previous=None, elapsed=None):
+    """Summarise a snapshot, or the difference between two snapshots of the same server taken elapsed seconds apart.
+    The max is always since the server started, since it can't be taken apart."""
+    header, histograms = current
+    lines = []
+    for i, histogram in enumerate(histograms):
+        name = histogram["name"].decode()
+        count, total_ns, buckets = int(histogram["count"]), int(histogram["total_ns"]), histogram["buckets"]
+        if previous is not None and i < len(previous[1]):
+            count -= int(previous[1][i]["count"])
+            total_ns -= int(previous[1][i]["total_ns"])
+            buckets = buckets - previous[1][i]["buckets"]
+        if count == 0:
+            lines.append(f"{name}: idle")
+            continue
+        line = f"{name}: {count} frames, {total_ns / count / 1e6:.1f} ms/frame"
+        if elapsed is not None:
+            line = f"{name}: {count / elapsed:.1f} frames/s, {total_ns / count / 1e6:.1f} ms/frame, " \
+                   f"{total_ns / 1e9 / elapsed:.0%} busy"
+        max_us = int(histogram["max_ns"]) // 1000
+        p50, p95, p99 = (min(p, max_us) for p in percentiles(buckets))  # bucket bounds can lie above the max
+        line += f", p50 {p50 / 1000:.1f} ms, p95 {p95 / 1000:.1f} ms, p99 {p99 / 1000:.1f} ms, " \
+                f"max {int(histogram['max_ns']) / 1e6:.1f} ms"
+        lines.append(line)
+
+    counters = {counter: int(header[counter]) for counter in STATS_COUNTERS}
+    if previous is not None:
+        counters = {counter: value - int(previous[0][counter]) for counter, value in counters.items()}
+    lines.append(f"Processed {counters['frames_processed']} frames, dropped {counters['frames_dropped']} stale "
+                 f"frames, detected {counters['hands_detected']} hands, overrode handedness in "
+                 f"{counters['identity_swaps']} frames")
+    return lines
@@ -0,0 +1,103 @@
+import threading
+
+import cv2
+import numpy as np
+
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT
+
+
+SCENE_THUMBNAIL_SIZE = (32, 18)
+"""Size frames are shrunk to before comparing them for a scene change, so that the comparison takes microseconds and
+ignores noise and small movements such as the hands"""
+
+
+def detections_to_array(result, image_width, image_height, out):
+    """Copy the best detections of a DetectionResult into out (an array of OBJECT_DETECTION_DTYPE), with the boxes
+    scaled from the pixels of the image the detector ran on to full-frame pixels. Returns the part of out in use."""
+    scale = np.array([COLOUR_IMAGE_FULL_WIDTH / image_width, COLOUR_IMAGE_FULL_HEIGHT / image_height] * 2)
+    detections = sorted(result.detections, key=lambda detection: detection.categories[0].score, reverse=True)
+    detections = detections[:len(out)]
+    for i, detection in enumerate(detections):
+        category = detection.categories[0]
+        box = detection.bounding_box
+        out[i]["category"] = category.index
+        out[i]["score"] = category.score
+        out[i]["box"] = scale * (box.origin_x, box.origin_y, box.width, box.height)
+        out[i]["category_name"] = (category.category_name or "").encode()[:out.dtype["category_name"].itemsize]
+    return out[:len(detections)]
+
+
+class ObjectDetectionWorker:
+    """Runs an object detector on some of the frames the hand path reads, on a thread of its own.
+
+    submit(seq, capture_timestamp, image) is called with the mp.Image of every frame. The worker keeps a reference to
+    it rather than a copy, since an mp.Image can't be changed, so the detector sees exactly the frame the landmarker
+    got without another read from shared memory or colour conversion. A frame is detected in if `interval` frames have
+    been submitted since the last detection, or with a scene_change_threshold, as soon as the frame differs from the
+    last detected one by more than that many grey levels on average. Frames that arrive while the detector is busy
+    replace each other, so the worker never queues up and submit never waits for it. MediaPipe releases the GIL while
+    its model runs, so the detector only competes with the hand path for cores.
+
+    detect(image) runs the detector and on_result(seq, capture_timestamp, image, result) is called with its result,
+    both on the worker thread. An exception stops the worker (see error) but not the caller."""
+
+    def __init__(self, detect, on_result, interval=10, scene_change_threshold=0):
+        self.detect = detect
+        self.on_result = on_result
+        self.interval = interval
+        self.scene_change_threshold = scene_change_threshold
+        self.frames_detected = 0
+        self.error = None
+        self.__frames_submitted = 0
+        self.__next_due = 1  # detect in the first frame
+        self.__pending = None
+        self.__closed = False
+        self.__reference = None  # thumbnail of the last detected frame
+        self.__changed = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, name="object detection", daemon=True)
+        self.__thread.start()
+
+    def submit(self, seq, capture_timestamp, image):
+        with self.__changed:
+            self.__frames_submitted += 1
+            if self.__closed or (self.scene_change_threshold <= 0 and self.__frames_submitted < self.__next_due):
+                return  # nothing to check until the next detection is due
+            self.__pending = (self.__frames_submitted, seq, capture_timestamp, image)
+            self.__changed.notify()
+
+    def __run(self):
+        try:
+            while True:
+                with self.__changed:
+                    self.__changed.wait_for(lambda: self.__pending is not None or self.__closed)
+                    if self.__closed:
+                        return
+                    frame_number, seq, capture_timestamp, image = self.__pending
+                    self.__pending = None
+                    due = frame_number >= self.__next_due
+
+                thumbnail = None
+                if self.scene_change_threshold > 0:
+                    thumbnail = cv2.resize(image.numpy_view(), SCENE_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+                    due = due or self.__reference is None or \
+                        cv2.norm(thumbnail, self.__reference, cv2.NORM_L1) / thumbnail.size > self.scene_change_threshold
+                if not due:
+                    continue
+
+                with self.__changed:
+                    self.__next_due = frame_number + self.interval
+                self.__reference = thumbnail
+                self.on_result(seq, capture_timestamp, image, self.detect(image))
+                self.frames_detected += 1
+        except Exception as e:
+            print(f"Warning: object detection stopped: {type(e).__name__}: {e}")
+            self.error = e
+            with self.__changed:
+                self.__closed = True
+
+    def close(self):
+        """Stop the worker once it has finished the frame it is detecting in"""
+        with self.__changed:
+            self.__closed = True
+            self.__changed.notify()
+        self.__thread.join()
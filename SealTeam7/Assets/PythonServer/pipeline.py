@@ -0,0 +1,77 @@
+import queue
+import threading
+
+
+class Pipeline:
+    """Runs a chain of stages on worker threads connected by bounded queues.
+
+    Stages are (name, function) pairs. The first function is called without arguments and produces items; every other
+    function is called with the item returned by the previous stage. Returning None drops the item. Each stage has a
+    single thread and the queues are FIFO, so items pass through every stage in the order they were produced. When a
+    queue is full the stage before it blocks, which limits how many frames can be in flight.
+
+    If a stage raises, the pipeline stops and on_error(exception) is called on that stage's thread. A stage that can
+    block outside the pipeline's queues, like the capture stage waiting for a frame, must be woken up by on_error,
+    otherwise join never returns."""
+
+    def __init__(self, stages, queue_size=2, on_error=None):
+        self.__stages = stages
+        self.__on_error = on_error
+        self.__queues = [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+        self.__stop = threading.Event()
+        self.__threads = []
+        self.error = None
+
+    def start(self):
+        for i, (name, function) in enumerate(self.__stages):
+            thread = threading.Thread(target=self.__run_stage, args=(i, function), name=name, daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    @property
+    def running(self):
+        return not self.__stop.is_set()
+
+    def wait(self, timeout):
+        """Wait until the pipeline stops or the timeout expires. Returns True if it stopped."""
+        return self.__stop.wait(timeout)
+
+    def stop(self):
+        self.__stop.set()
+
+    def join(self):
+        """Wait for all stage threads to exit and re-raise the first error raised by a stage, if any"""
+        for thread in self.__threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __run_stage(self, index, function):
+        in_queue = self.__queues[index - 1] if index > 0 else None
+        out_queue = self.__queues[index] if index < len(self.__queues) else None
+        try:
+            while not self.__stop.is_set():
+                if in_queue is None:
+                    item = function()
+                else:
+                    try:
+                        item = in_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    item = function(item)
+
+                if item is None or out_queue is None:
+                    continue
+                while not self.__stop.is_set():
+                    try:
+                        out_queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except BaseException as e:
+            first = self.error is None
+            if first:
+                self.error = e
+            self.__stop.set()
+            if first and self.__on_error is not None:
+                self.__on_error(e)
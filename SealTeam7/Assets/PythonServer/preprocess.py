@@ -0,0 +1,70 @@
+import argparse
+
+import cv2
+
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT, PIXEL_FORMAT_BGR, PIXEL_FORMAT_BGRA
+
+
+INTERPOLATIONS = {
+    'nearest': cv2.INTER_NEAREST,
+    'linear': cv2.INTER_LINEAR,
+    'area': cv2.INTER_AREA,
+}
+"""OpenCV interpolation modes selectable from the command line. linear is fast at any ratio; area is slightly more
+accurate but only fast for integer ratios such as 960x540."""
+
+
+COLOUR_CONVERSIONS = {
+    PIXEL_FORMAT_BGR: cv2.COLOR_BGR2RGB,
+    PIXEL_FORMAT_BGRA: cv2.COLOR_BGRA2RGB,
+}
+"""OpenCV conversions to RGB from the pixel formats that need one"""
+
+
+def parse_resolution(value):
+    """argparse type for a WIDTHxHEIGHT resolution no larger than the full frame"""
+    try:
+        width, height = (int(n) for n in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected WIDTHxHEIGHT, e.g. 960x540, got "{value}"')
+    if not (0 < width <= COLOUR_IMAGE_FULL_WIDTH and 0 < height <= COLOUR_IMAGE_FULL_HEIGHT):
+        raise argparse.ArgumentTypeError(f'{width}x{height} is not within '
+                                         f'{COLOUR_IMAGE_FULL_WIDTH}x{COLOUR_IMAGE_FULL_HEIGHT}')
+    return width, height
+
+
+class Downscaler:
+    """Resizes frames larger than the landmarker's input size down to it, into a buffer that is reused as long as the
+    frames keep their number of channels. Frames that are already small enough are returned as they are.
+
+    MediaPipe resizes its input to the model's resolution anyway, so handing it a smaller image saves the copy into
+    the mp.Image and its own resize of the full frame. Landmarks are normalised to the image, so they map back to
+    full-frame pixels with the usual LANDMARK_SCALE. The returned array is overwritten by the next call."""
+
+    def __init__(self, width, height, interpolation='linear'):
+        self.width = width
+        self.height = height
+        self.interpolation = INTERPOLATIONS[interpolation]
+        self.buffer = None
+
+    def __call__(self, image):
+        if image.shape[1] <= self.width and image.shape[0] <= self.height:
+            return image
+        self.buffer = cv2.resize(image, (self.width, self.height), dst=self.buffer, interpolation=self.interpolation)
+        return self.buffer
+
+
+class ColourConverter:
+    """Converts frames to the RGB the landmarker expects according to their pixel format (see PIXEL_FORMATS in
+    ipc.py), in one pass into a buffer that is reused as long as the frame size doesn't change. RGB frames are
+    returned as they are. The returned array is overwritten by the next call."""
+
+    def __init__(self):
+        self.buffer = None
+
+    def __call__(self, image, pixel_format):
+        conversion = COLOUR_CONVERSIONS.get(pixel_format)
+        if conversion is None:
+            return image
+        self.buffer = cv2.cvtColor(image, conversion, dst=self.buffer)
+        return self.buffer
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from ipc import PIXEL_FORMATS, PIXEL_FORMAT_CHANNELS, PIXEL_FORMAT_RGB, PIXEL_FORMAT_BGRA
+
+
+# Recording layout. A 64 byte header followed by one fixed-size record per frame, so a recording can be memory mapped
+# and replayed without decoding:
+#   char[8] magic                 RECORDING_MAGIC
+#   uint32 version                RECORDING_VERSION
+#   uint32 width, height, channels
+#   uint32 pixel_format           PIXEL_FORMAT_* (see ipc.py), since version 2. Version 1 recordings are RGB with 3
+#                                 channels and BGRA with 4.
+# Each record is an int64 timestamp (perf counter ns of when the frame was captured) followed by the frame as it was
+# in shared memory, without row padding (height x width x channels uint8). All frames have the size and pixel format
+# of the first one.
+RECORDING_MAGIC = b"ST7FRAME"
+RECORDING_VERSION = 2
+RECORDING_HEADER_DTYPE = np.dtype({
+    'names': ['magic', 'version', 'width', 'height', 'channels', 'pixel_format'],
+    'formats': ['S8', '<u4', '<u4', '<u4', '<u4', '<u4'],
+    'offsets': [0, 8, 12, 16, 20, 24],
+    'itemsize': 64,
+})
+
+
+def record_dtype(width, height, channels):
+    return np.dtype([('timestamp', '<i8'), ('frame', 'u1', (height, width, channels))])
+
+
+class Recorder:
+    """Appends frames as they arrive from the producer to a recording file. The recording takes the size and pixel
+    format of the first frame, later frames that differ from it are skipped."""
+
+    def __init__(self, path):
+        self.layout = None
+        """(height, width, channels, pixel_format) of the recorded frames, None until the first frame"""
+        self.record_size = None
+        self.frames_recorded = 0
+        self.frames_skipped = 0
+        self.__file = open(path, 'wb')
+        self.__last_written = False
+
+    def write(self, timestamp, frame, pixel_format):
+        """Append a frame (a (height, width, channels) uint8 array, e.g. a shared memory view) in the given
+        PIXEL_FORMAT_*. Returns False if it was skipped because its layout differs from the first frame."""
+        layout = (*frame.shape, pixel_format)
+        if self.layout is None:
+            self.__write_header(layout)
+        self.__last_written = layout == self.layout
+        if not self.__last_written:
+            self.frames_skipped += 1
+            return False
+        self.__file.write(np.int64(timestamp).tobytes())
+        self.__file.write(np.ascontiguousarray(frame))  # only copies frames with row padding
+        self.frames_recorded += 1
+        return True
+
+    def discard_last(self):
+        """Remove the last frame again, e.g. because the producer overwrote it while it was being written"""
+        if not self.__last_written:
+            return
+        self.__file.seek(-self.record_size, os.SEEK_CUR)
+        self.__file.truncate()
+        self.frames_recorded -= 1
+        self.__last_written = False
+
+    def __write_header(self, layout):
+        height, width, channels, pixel_format = layout
+        self.layout = layout
+        self.record_size = record_dtype(width, height, channels).itemsize
+        header = np.zeros((), dtype=RECORDING_HEADER_DTYPE)
+        header['magic'] = RECORDING_MAGIC
+        header['version'] = RECORDING_VERSION
+        header['width'], header['height'], header['channels'] = width, height, channels
+        header['pixel_format'] = pixel_format
+        self.__file.write(header.tobytes())
+
+    def close(self):
+        self.__file.close()
+
+
+def read_recording_header(path):
+    header = np.fromfile(path, dtype=RECORDING_HEADER_DTYPE, count=1)
+    if len(header) == 0 or header[0]['magic'] != RECORDING_MAGIC:
+        raise ValueError(f"{path} is not a frame recording")
+    header = header[0]
+    if not 1 <= header['version'] <= RECORDING_VERSION:
+        raise ValueError(f"{path} has recording version {header['version']}, expected at most {RECORDING_VERSION}")
+    return header
+
+
+def recording_pixel_format(path):
+    """Pixel format of the frames in a recording, a key of PIXEL_FORMATS"""
+    header = read_recording_header(path)
+    if header['version'] == 1:
+        pixel_format = PIXEL_FORMAT_BGRA if header['channels'] == 4 else PIXEL_FORMAT_RGB
+    else:
+        pixel_format = int(header['pixel_format'])
+    if PIXEL_FORMAT_CHANNELS.get(pixel_format) != header['channels']:
+        raise ValueError(f"{path} has {header['channels']} channels in pixel format {pixel_format}")
+    return next(name for name, value in PIXEL_FORMATS.items() if value == pixel_format)
+
+
+def read_recording(path):
+    """Memory map a recording. Returns a read-only record array with fields timestamp and frame.
+    A partially written last frame, e.g. from a server that was killed, is ignored."""
+    header = read_recording_header(path)
+    dtype = record_dtype(int(header['width']), int(header['height']), int(header['channels']))
+    num_frames = (os.path.getsize(path) - RECORDING_HEADER_DTYPE.itemsize) // dtype.itemsize
+    if num_frames == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=RECORDING_HEADER_DTYPE.itemsize, shape=(num_frames,))
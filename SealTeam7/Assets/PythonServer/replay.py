@@ -0,0 +1,81 @@
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+
+from ipc import LinuxProducerIPC
+from recording import read_recording, recording_pixel_format
+
+
+# Replays a recording made with main.py --record through the same shared memory and semaphores as testing.py, so the
+# server can be measured on a headless machine without a webcam or Kinect.
+parser = argparse.ArgumentParser(description='Replay recorded frames to the hand landmarking server.')
+parser.add_argument('recording', help='File written by main.py --record.')
+parser.add_argument('--max-rate', action='store_true',
+                    help='Send frames as fast as the server accepts them instead of at the recorded frame rate.')
+parser.add_argument('--loops', type=int, default=1, metavar='N', help='Replay the recording N times. Default 1.')
+parser.add_argument('--namespace', default='', metavar='NAME', help='Namespace the server was started with.')
+args = parser.parse_args()
+
+frames = read_recording(args.recording)
+if len(frames) == 0:
+    raise SystemExit(f"{args.recording} contains no frames")
+pixel_format = recording_pixel_format(args.recording)
+height, width, _ = frames.dtype['frame'].shape
+
+ipc = LinuxProducerIPC(args.namespace)
+print(f"Connected to server ({ipc.frame_slots} frame slot(s)), replaying {len(frames)} {width}x{height} "
+      f"{pixel_format} frames {'as fast as possible' if args.max_rate else 'at the recorded rate'}")
+
+# Round trip latency from writing a frame to receiving its done event. Done events arrive in the order the frames were
+# written, except in latest-frame mode where dropped frames never get one, so latency is only measured outside it.
+write_times = deque()
+latencies = []
+
+def collect_done_frames():
+    now = time.perf_counter()
+    while len(write_times) > ipc.frames_in_flight:
+        latencies.append(now - write_times.popleft())
+
+def wait_until(deadline):
+    """Sleep until the deadline, receiving done events in the meantime so that their latency is accurate"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if ipc.latest_frame_mode or ipc.frames_in_flight == 0:
+            time.sleep(remaining)
+        elif ipc.wait_done(remaining):
+            collect_done_frames()
+
+frames_sent = 0
+start_time = time.perf_counter()
+try:
+    for _ in range(args.loops):
+        loop_start_time = time.perf_counter()
+        first_timestamp = frames[0]['timestamp']
+        for record in frames:
+            if not args.max_rate:
+                wait_until(loop_start_time + (record['timestamp'] - first_timestamp) / 1e9)
+
+            ipc.acquire_slot()
+            collect_done_frames()
+            if not ipc.latest_frame_mode:
+                write_times.append(time.perf_counter())
+            ipc.write_frame(record['frame'], pixel_format)
+            frames_sent += 1
+
+    # Wait for the frames still in flight
+    if not ipc.latest_frame_mode:
+        while ipc.frames_in_flight > 0 and ipc.wait_done(1.0):
+            collect_done_frames()
+
+finally:
+    elapsed = time.perf_counter() - start_time
+    print(f"Sent {frames_sent} frames in {elapsed:.1f} s ({frames_sent / elapsed:.1f} frames/s)")
+    if latencies:
+        latencies_ms = np.array(latencies) * 1000
+        print(f"Round trip latency: {np.mean(latencies_ms):.1f} ms mean, {np.percentile(latencies_ms, 50):.1f} ms p50, "
+              f"{np.percentile(latencies_ms, 95):.1f} ms p95, {np.max(latencies_ms):.1f} ms max")
+    ipc.close()
@@ -0,0 +1,95 @@
+import numpy as np
+
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT
+
+
+class RoiSelector:
+    """Chooses a region of interest around the hands the tracker expects to see in the next frame.
+
+    The region is the bounding box of the projected landmarks (x and y, i.e. columns 0 and 2) of every hand found in
+    the previous frame, grown by margin times the size of each hand, at least min_size pixels wide and high and clamped
+    to the frame. No region is returned when no hand is being tracked or when the region would cover more than
+    max_area of the frame, since cropping would then save little."""
+
+    def __init__(self, margin=0.5, min_size=384, max_area=0.5,
+                 frame_width=COLOUR_IMAGE_FULL_WIDTH, frame_height=COLOUR_IMAGE_FULL_HEIGHT):
+        self.margin = margin
+        self.min_size = min_size
+        self.max_area = max_area
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+
+    def select(self, tracked_hands):
+        """Return (x, y, width, height) in full-frame pixels for the projected hands, or None for the full frame"""
+        if len(tracked_hands) == 0:
+            return None
+
+        x_min, y_min = self.frame_width, self.frame_height
+        x_max, y_max = 0, 0
+        for hand in tracked_hands:
+            hand_x_min, hand_x_max = hand[:, 0].min(), hand[:, 0].max()
+            hand_y_min, hand_y_max = hand[:, 2].min(), hand[:, 2].max()
+            pad = self.margin * max(hand_x_max - hand_x_min, hand_y_max - hand_y_min)
+            x_min = min(x_min, hand_x_min - pad)
+            x_max = max(x_max, hand_x_max + pad)
+            y_min = min(y_min, hand_y_min - pad)
+            y_max = max(y_max, hand_y_max + pad)
+
+        # Grow to the minimum size around the centre, then clamp to the frame
+        width = max(x_max - x_min, self.min_size)
+        height = max(y_max - y_min, self.min_size)
+        x = int(np.clip((x_min + x_max - width) / 2, 0, self.frame_width - 1))
+        y = int(np.clip((y_min + y_max - height) / 2, 0, self.frame_height - 1))
+        width = int(min(width, self.frame_width - x))
+        height = int(min(height, self.frame_height - y))
+
+        if width * height > self.max_area * self.frame_width * self.frame_height:
+            return None
+        return x, y, width, height
+
+
+def roi_scale_and_offset(roi):
+    """Scale and offset that map the normalised (x, z, y) landmarks of a crop to full-frame pixel coordinates"""
+    x, y, width, height = roi
+    scale = np.array([width, -width, height], dtype=np.float32)
+    offset = np.array([x, 0, y], dtype=np.float32)
+    return scale, offset
+
+def roi_in_image(roi, image_width, image_height,
+                 frame_width=COLOUR_IMAGE_FULL_WIDTH, frame_height=COLOUR_IMAGE_FULL_HEIGHT):
+    """Convert a full-frame ROI to whole pixels of an image of a different size, e.g. a downscaled frame.
+
+    Returns the crop in image pixels and the same crop in (fractional) full-frame pixels, which is what
+    roi_scale_and_offset needs to map the landmarks back."""
+    scale_x = image_width / frame_width
+    scale_y = image_height / frame_height
+    x, y, width, height = roi
+    image_x, image_y = int(x * scale_x), int(y * scale_y)
+    image_width = max(1, min(round(width * scale_x), image_width - image_x))
+    image_height = max(1, min(round(height * scale_y), image_height - image_y))
+    image_roi = (image_x, image_y, image_width, image_height)
+    frame_roi = (image_x / scale_x, image_y / scale_y, image_width / scale_x, image_height / scale_y)
+    return image_roi, frame_roi
+
+
+class DetectionScheduler:
+    """Decides when to run the landmarker on the full frame rather than on a ROI around the tracked hands.
+
+    A full frame is needed whenever tracking is lost (handled by the caller) and periodically, to find hands that enter
+    the frame outside the ROI. The period is max_interval frames while the hands are still and shrinks linearly with
+    the speed of the fastest hand down to every frame at fast_speed pixels per frame, since a fast hand is more likely
+    to leave its ROI. max_interval 0 disables the periodic detection."""
+
+    def __init__(self, max_interval=0, fast_speed=50):
+        self.max_interval = max_interval
+        self.fast_speed = fast_speed
+        self.frames_since_full_frame = 0
+
+    def interval(self, speed):
+        return max(1, round(self.max_interval * (1 - min(speed / self.fast_speed, 1))))
+
+    def full_frame_due(self, speed):
+        return self.max_interval > 0 and self.frames_since_full_frame + 1 >= self.interval(speed)
+
+    def record(self, full_frame):
+        self.frames_since_full_frame = 0 if full_frame else self.frames_since_full_frame + 1
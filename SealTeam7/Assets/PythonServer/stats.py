@@ -0,0 +1,34 @@
+import argparse
+import time
+
+from ipc import open_stats
+from metrics import format_report, snapshot
+
+
+# Watches a running server through its stats page, without slowing it down or needing it to be started with --stats
+parser = argparse.ArgumentParser(description='Print the stage latencies and frame counts of a running hand landmarking '
+                                             'server.')
+parser.add_argument('--platform', choices=['windows', 'linux'], required=True, help='Platform the server runs on.')
+parser.add_argument('--interval', type=float, default=5, metavar='SECONDS',
+                    help='Print the stats over the last SECONDS every SECONDS. Default 5.')
+parser.add_argument('--once', action='store_true', help='Print the stats since the server started and exit.')
+parser.add_argument('--namespace', default='', metavar='NAME', help='Namespace the server was started with.')
+args = parser.parse_args()
+
+buffer = open_stats(args.platform, args.namespace)
+try:
+    if args.once:
+        print("\n".join(format_report(snapshot(buffer))))
+    else:
+        previous = snapshot(buffer)
+        previous_time = time.monotonic()
+        while True:
+            time.sleep(args.interval)
+            current = snapshot(buffer)
+            now = time.monotonic()
+            print("\n".join(format_report(current, previous, now - previous_time)) + "\n")
+            previous, previous_time = current, now
+except KeyboardInterrupt:
+    pass
+finally:
+    buffer.close()
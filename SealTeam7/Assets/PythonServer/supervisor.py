@@ -0,0 +1,144 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from affinity import available_cpus, format_cpu_list
+from ipc import open_stats
+from metrics import format_report, snapshot
+
+
+# Runs one server (main.py) per table, each with its own namespace for the shared memory segments and semaphores and
+# pinned to its own CPUs. Each table's producer (Unity or testing.py/replay.py with --namespace) talks to its own
+# server, so frames are routed by table. Servers that crash are restarted, and the stats of every table are printed
+# periodically.
+WORKER_RESTART_DELAY = 1  # seconds
+WORKER_SHUTDOWN_TIMEOUT = 10  # seconds
+
+parser = argparse.ArgumentParser(
+    description='Run a hand landmarking server for each of several tables.',
+    epilog='Arguments after "--" are passed to every server, e.g. -- --frame-slots 3 --latest-frame')
+parser.add_argument('--platform', choices=['windows', 'linux'], required=True, help='Platform to run the servers on.')
+parser.add_argument('--tables', nargs='+', required=True, metavar='NAME',
+                    help='One namespace per table. The producer of each table must use the same namespace.')
+parser.add_argument('--cpus-per-table', type=int, metavar='N',
+                    help='Number of CPUs to pin each server to. Default: the available CPUs split evenly.')
+parser.add_argument('--stats-interval', type=float, default=5, metavar='SECONDS',
+                    help='Print the stats of every table every SECONDS, 0 to disable. Default 5.')
+parser.add_argument('server_args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+args = parser.parse_args()
+server_args = args.server_args[1:] if args.server_args[:1] == ['--'] else args.server_args
+if len(set(args.tables)) != len(args.tables):
+    parser.error('table names must be unique')
+
+# Give each table its own block of CPUs
+cpus = available_cpus()
+cpus_per_table = args.cpus_per_table or max(1, len(cpus) // len(args.tables))
+if cpus_per_table * len(args.tables) > len(cpus):
+    print(f"Warning: {len(args.tables)} tables with {cpus_per_table} CPUs each need more than the {len(cpus)} "
+          f"available CPUs, some tables will share CPUs")
+table_cpus = {}
+for i, table in enumerate(args.tables):
+    table_cpus[table] = [cpus[(i * cpus_per_table + j) % len(cpus)] for j in range(cpus_per_table)]
+
+main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+
+class Worker:
+    """The server process of one table"""
+
+    def __init__(self, table):
+        self.table = table
+        self.process = None
+        self.restarts = 0
+        self.stats_buffer = None
+        self.last_report = None
+        self.last_report_time = None
+
+    def start(self):
+        command = [sys.executable, main_path, '--platform', args.platform, '--namespace', self.table,
+                   '--cpus', format_cpu_list(table_cpus[self.table]), *server_args]
+        print(f"[{self.table}] Starting server on CPUs {format_cpu_list(table_cpus[self.table])}")
+        self.process = subprocess.Popen(command)
+        self.close_stats()
+
+    def stop(self):
+        """Ask the server to shut down like Ctrl+C would"""
+        if self.process.poll() is None:
+            if args.platform == 'windows':
+                self.process.terminate()
+            else:
+                self.process.send_signal(signal.SIGINT)
+
+    def report_stats(self):
+        if self.stats_buffer is None:
+            self.open_stats()
+            return
+        now = time.monotonic()
+        report = snapshot(self.stats_buffer)
+        for line in format_report(report, self.last_report, now - self.last_report_time):
+            print(f"[{self.table}] {line}")
+        self.last_report, self.last_report_time = report, now
+
+    def open_stats(self):
+        """Map the server's stats page once it has created it"""
+        try:
+            self.stats_buffer = open_stats(args.platform, self.table)
+            self.last_report = snapshot(self.stats_buffer)
+            self.last_report_time = time.monotonic()
+        except Exception as e:  # not created yet (posix_ipc.ExistentialError) or not initialised yet (ValueError)
+            self.close_stats()
+            print(f"[{self.table}] Stats not available yet: {e}")
+
+    def close_stats(self):
+        self.last_report = None
+        if self.stats_buffer is not None:
+            self.stats_buffer.close()
+            self.stats_buffer = None
+
+
+workers = [Worker(table) for table in args.tables]
+shutdown_flag = False
+
+def signal_handler(signum, frame):
+    global shutdown_flag
+    shutdown_flag = True
+
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+try:
+    for worker in workers:
+        worker.start()
+    last_report_time = time.monotonic()
+    while not shutdown_flag:
+        time.sleep(0.1)
+        for worker in workers:
+            exit_code = worker.process.poll()
+            if exit_code is not None and not shutdown_flag:
+                worker.restarts += 1
+                print(f"[{worker.table}] Server exited with code {exit_code}, restarting "
+                      f"(restart {worker.restarts})")
+                time.sleep(WORKER_RESTART_DELAY)
+                worker.start()
+
+        if args.stats_interval > 0 and time.monotonic() - last_report_time >= args.stats_interval:
+            for worker in workers:
+                worker.report_stats()
+            last_report_time = time.monotonic()
+
+finally:
+    print("Stopping servers...")
+    for worker in workers:
+        worker.close_stats()
+        worker.stop()
+    deadline = time.monotonic() + WORKER_SHUTDOWN_TIMEOUT
+    for worker in workers:
+        try:
+            worker.process.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            print(f"[{worker.table}] Server did not shut down in time, killing it")
+            worker.process.kill()
+            worker.process.wait()
@@ -1,19 +1,10 @@
-﻿import cv2
+﻿import argparse
+import cv2
 import numpy as np
-import mmap
-import struct
 import time
 from contextlib import contextmanager
-import posix_ipc
 
-# Configuration from main.py
-COLOUR_IMAGE_FULL_WIDTH = 1920
-COLOUR_IMAGE_FULL_HEIGHT = 1080
-COLOUR_IMAGE_NUM_CHANNELS = 3
-COLOUR_IMAGE_FULL_SIZE = COLOUR_IMAGE_FULL_WIDTH * COLOUR_IMAGE_FULL_HEIGHT * COLOUR_IMAGE_NUM_CHANNELS
-COLOUR_IMAGE_FILE_NAME = "colour_image"
-READY_EVENT_NAME = "/SealTeam7ColourImageReady"
-DONE_EVENT_NAME = "/SealTeam7HandLandmarksDone"
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT, LinuxProducerIPC
 
 @contextmanager
 def timer(name):
@@ -22,49 +13,68 @@ def timer(name):
     end = time.time()
     print(f"{name}: {int((end - start)*1000)} ms")
 
-# Create/open semaphores for synchronization
-ready_event = posix_ipc.Semaphore(READY_EVENT_NAME, posix_ipc.O_CREAT)
-done_event = posix_ipc.Semaphore(DONE_EVENT_NAME, posix_ipc.O_CREAT)
+parser = argparse.ArgumentParser(description='Send webcam or video frames to the hand landmarking server.')
+parser.add_argument('--namespace', default='', metavar='NAME', help='Namespace the server was started with.')
+parser.add_argument('--source', default='0',
+                    help='Camera index or video file to read frames from. Default 0 (the first webcam).')
+parser.add_argument('--loop', action='store_true', help='Start a video file again from the beginning when it ends.')
+parser.add_argument('--max-rate', action='store_true',
+                    help='Send the frames of a video file as fast as the server accepts them instead of at its frame '
+                         'rate.')
+args = parser.parse_args()
 
-# Initialize shared memory
-colour_image_buffer = mmap.mmap(-1, COLOUR_IMAGE_FULL_SIZE, tagname=COLOUR_IMAGE_FILE_NAME)
+# Open the shared memory and semaphores created by the server. With a frame ring (main.py --frame-slots N) up to N
+# frames can be in flight, otherwise every frame waits for the server to finish the previous one.
+ipc = LinuxProducerIPC(args.namespace)
+print(f"Connected to server ({ipc.frame_slots} frame slot(s))")
 
-# Initialize webcam
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, COLOUR_IMAGE_FULL_WIDTH)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, COLOUR_IMAGE_FULL_HEIGHT)
+# Initialize webcam or video file
+is_camera = args.source.isdigit()
+cap = cv2.VideoCapture(int(args.source) if is_camera else args.source)
+if not cap.isOpened():
+    raise SystemExit(f"Could not open {args.source}")
+if is_camera:
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, COLOUR_IMAGE_FULL_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, COLOUR_IMAGE_FULL_HEIGHT)
+frame_interval = 0 if is_camera or args.max_rate else 1 / (cap.get(cv2.CAP_PROP_FPS) or 30)
+
+# Frames are written as OpenCV captures them, BGR at the capture size, and the frame header tells the server so. The
+# capture buffer is reused as long as the capture size doesn't change.
+frame = None
+next_frame_time = time.perf_counter()
 
 try:
     while True:
-        # Capture frame from webcam
-        ret, frame = cap.read()
+        # Capture frame from webcam or file
+        ret, frame = cap.read(frame)
         if not ret:
-            print("Failed to capture frame")
+            if is_camera:
+                print("Failed to capture frame")
+                continue
+            if not args.loop:
+                break
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
             continue
-            
-        # Convert BGR to RGB since Unity expects RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Resize if needed
-        if frame_rgb.shape != (COLOUR_IMAGE_FULL_HEIGHT, COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_NUM_CHANNELS):
-            frame_rgb = cv2.resize(frame_rgb, (COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT))
-        
-        # Write frame to shared memory
+
+        if frame_interval:
+            next_frame_time += frame_interval
+            time.sleep(max(0.0, next_frame_time - time.perf_counter()))
+        capture_timestamp = time.perf_counter_ns()  # when the frame would have been captured, for a video file
+
+        # Wait until the server has finished with the slot we are about to overwrite, then copy the frame into it, or
+        # a downscaled copy if the camera delivers more than a slot holds, and signal that the frame is ready
         with timer("Writing frame"):
-            colour_image_buffer.seek(0)
-            colour_image_buffer.write(frame_rgb.tobytes())
-            
-        # Signal that new frame is ready
-        ready_event.release()
-        
-        # Wait for processing to complete
-        done_event.acquire()
+            height, width = frame.shape[:2]
+            scale = min(1, COLOUR_IMAGE_FULL_WIDTH / width, COLOUR_IMAGE_FULL_HEIGHT / height)
+            slot = ipc.next_frame(int(width * scale), int(height * scale), 'bgr')
+            if scale == 1:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot, interpolation=cv2.INTER_AREA)
+            del slot  # don't keep the shared memory exported
+            ipc.publish_frame(capture_timestamp)
 
 finally:
     # Cleanup
     cap.release()
-    colour_image_buffer.close()
-    ready_event.close()
-    done_event.close()
-    ready_event.unlink()
-    done_event.unlink()
\ No newline at end of file
+    ipc.close()
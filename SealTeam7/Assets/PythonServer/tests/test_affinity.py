@@ -0,0 +1,26 @@
+import argparse
+import unittest
+
+from affinity import format_cpu_list, parse_cpu_list
+
+
+class CpuListTest(unittest.TestCase):
+    def test_ranges_and_single_cpus(self):
+        self.assertEqual(parse_cpu_list("0-3,6"), [0, 1, 2, 3, 6])
+        self.assertEqual(parse_cpu_list("5"), [5])
+
+    def test_duplicates_are_removed_and_sorted(self):
+        self.assertEqual(parse_cpu_list("4,2-3,3"), [2, 3, 4])
+
+    def test_invalid_lists_are_rejected(self):
+        for value in ("", "a", "1-b", "3-1"):
+            with self.subTest(value):
+                with self.assertRaises(argparse.ArgumentTypeError):
+                    parse_cpu_list(value)
+
+    def test_format_round_trips(self):
+        self.assertEqual(parse_cpu_list(format_cpu_list([0, 1, 2, 3, 6])), [0, 1, 2, 3, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from filters import OneEuroFilter
+
+
+FRAME_NS = 33_333_333
+
+
+def hand(value):
+    return np.full((21, 3), value, dtype=np.float32)
+
+
+class OneEuroFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.filter = OneEuroFilter(min_cutoff=1.0, beta=0.01)
+
+    def test_constant_signal_passes_through_unchanged(self):
+        for i in range(30):
+            value = self.filter.update(i * FRAME_NS, (hand(100), None))
+        np.testing.assert_allclose(value[0], 100)
+        np.testing.assert_allclose(self.filter.velocity[0], 0)
+        self.assertEqual(list(self.filter.present), [True, False])
+
+    def test_step_response_lags_then_settles_on_the_step(self):
+        self.filter.update(0, (hand(0), None))
+        first = self.filter.update(FRAME_NS, (hand(100), None))[0, 0, 0]
+        self.assertGreater(first, 0)
+        self.assertLess(first, 100)
+        previous = first
+        for i in range(2, 60):
+            value = self.filter.update(i * FRAME_NS, (hand(100), None))[0, 0, 0]
+            self.assertGreaterEqual(value, previous)
+            self.assertLessEqual(value, 100)
+            previous = value
+        self.assertAlmostEqual(previous, 100, places=3)
+
+    def test_prediction_extrapolates_along_the_velocity(self):
+        for i in range(60):
+            self.filter.update(i * FRAME_NS, (hand(i * 10), None))  # 10 pixels per frame, 300 pixels/s
+        self.assertAlmostEqual(float(self.filter.velocity[0, 0, 0]), 300, delta=5)
+        predicted = self.filter.predict(0.1, np.zeros_like(self.filter.value))
+        np.testing.assert_allclose(predicted[0] - self.filter.value[0], self.filter.velocity[0] * 0.1, rtol=1e-5)
+
+    def test_sample_with_a_duplicate_timestamp_is_skipped(self):
+        self.filter.update(0, (hand(0), None))
+        self.filter.update(FRAME_NS, (hand(10), None))
+        value = self.filter.value.copy()
+        velocity = self.filter.velocity.copy()
+
+        self.filter.update(FRAME_NS, (hand(50), None))
+        np.testing.assert_array_equal(self.filter.value, value)
+        np.testing.assert_array_equal(self.filter.velocity, velocity)
+
+        # The next frame carries on from the last accepted sample rather than the skipped one
+        reference = OneEuroFilter(min_cutoff=1.0, beta=0.01)
+        reference.update(0, (hand(0), None))
+        reference.update(FRAME_NS, (hand(10), None))
+        np.testing.assert_allclose(self.filter.update(2 * FRAME_NS, (hand(20), None)),
+                                   reference.update(2 * FRAME_NS, (hand(20), None)))
+
+    def test_older_timestamp_does_not_restart_the_hand(self):
+        self.filter.update(0, (hand(0), None))
+        self.filter.update(FRAME_NS, (hand(10), None))
+        value = self.filter.value.copy()
+        self.filter.update(FRAME_NS // 2, (hand(50), None))
+        np.testing.assert_array_equal(self.filter.value, value)
+        self.assertNotEqual(self.filter.velocity[0, 0, 0], 0)
+
+    def test_hand_that_comes_back_restarts_from_its_raw_position(self):
+        for i in range(10):
+            self.filter.update(i * FRAME_NS, (hand(i * 10), hand(5)))
+        self.filter.update(10 * FRAME_NS, (None, hand(5)))
+        self.assertEqual(list(self.filter.present), [False, True])
+
+        value = self.filter.update(11 * FRAME_NS, (hand(500), hand(5)))
+        np.testing.assert_array_equal(value[0], hand(500))
+        np.testing.assert_array_equal(self.filter.velocity[0], 0)
+        np.testing.assert_allclose(value[1], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from gestures import GESTURE_FINGERS, GESTURE_MAP, GestureClassifier
+
+
+FINGER_X = [-30, 0, 30, 60]
+"""x of the index, middle, ring and pinky finger of an upright hand with its wrist at the origin"""
+
+
+def hand(fingers, thumb_down=False, spock=False):
+    """Landmarks in pixel coordinates (x, -z, y) of an upright hand with the given fingers (thumb, index, middle, ring,
+    pinky) extended"""
+    landmarks = np.zeros((21, 3), dtype=np.float32)
+    # Thumb: CMC, MCP, IP and tip, with the tip out to the side or tucked in front of the palm
+    landmarks[1:4] = [(-40, 0, -20), (-60, 0, -40), (-80, 0, -50)]
+    if fingers[0]:
+        landmarks[4] = (-160, 0, 40) if thumb_down else (-160, 0, -60)
+    else:
+        landmarks[4] = (-20, 0, -70)
+    tip_x = [-40, -20, 50, 70] if spock else FINGER_X
+    for finger, (x, extended) in enumerate(zip(FINGER_X, fingers[1:])):
+        mcp = 5 + 4 * finger
+        landmarks[mcp:mcp + 3] = [(x, 0, -80), (x, 0, -120), (x, 0, -160)]  # MCP, PIP, DIP
+        landmarks[mcp + 3] = (tip_x[finger], 0, -200) if extended else (x, 0, -90)
+    return landmarks
+
+
+FIST = hand(GESTURE_FINGERS["Closed_Fist"])
+PALM = hand(GESTURE_FINGERS["Open_Palm"])
+
+
+class GestureClassifierTest(unittest.TestCase):
+    def test_every_gesture_is_recognised(self):
+        cases = {name: hand(fingers) for name, fingers in GESTURE_FINGERS.items()}
+        cases["Thumb_Down"] = hand(GESTURE_FINGERS["Thumb_Up"], thumb_down=True)
+        cases["Spock"] = hand(GESTURE_FINGERS["Open_Palm"], spock=True)
+        classifier = GestureClassifier()
+        for name, landmarks in cases.items():
+            with self.subTest(name):
+                gestures, confidences = classifier.classify((landmarks, None))
+                self.assertEqual(gestures[0], GESTURE_MAP[name])
+                self.assertAlmostEqual(float(confidences[0]), 1)
+
+    def test_absent_hand_has_no_gesture(self):
+        gestures, confidences = GestureClassifier().classify((FIST, None))
+        self.assertEqual(gestures[1], GESTURE_MAP["None"])
+        self.assertEqual(confidences[1], 0)
+
+    def test_hand_shape_that_is_no_gesture(self):
+        gestures, _ = GestureClassifier().classify((hand((0, 1, 0, 1, 1)), None))
+        self.assertEqual(gestures[0], GESTURE_MAP["None"])
+
+    def test_debounce_holds_the_previous_gesture(self):
+        classifier = GestureClassifier(debounce_frames=3)
+        reported = [int(classifier.classify((landmarks, None))[0][0])
+                    for landmarks in [FIST] * 3 + [PALM, PALM, FIST, PALM, PALM, PALM]]
+        fist, palm, none = GESTURE_MAP["Closed_Fist"], GESTURE_MAP["Open_Palm"], GESTURE_MAP["None"]
+        self.assertEqual(reported, [none, none, fist, fist, fist, fist, fist, fist, palm])
+
+    def test_debounced_hand_that_disappears_is_reported_straight_away(self):
+        classifier = GestureClassifier(debounce_frames=3)
+        for _ in range(3):
+            classifier.classify((FIST, None))
+        gestures, confidences = classifier.classify((None, None))
+        self.assertEqual(gestures[0], GESTURE_MAP["None"])
+        self.assertEqual(confidences[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
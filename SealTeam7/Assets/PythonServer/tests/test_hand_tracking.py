@@ -0,0 +1,164 @@
+import unittest
+from types import SimpleNamespace
+
+from hand_tracking import MAX_PROJECTION_INTERVALS, HandTracker
+from ipc import COLOUR_IMAGE_FULL_WIDTH, COLOUR_IMAGE_FULL_HEIGHT
+
+
+FRAME_NS = 33_333_333
+
+
+def landmarks(x, y):
+    """21 landmarks of a hand whose wrist is at pixel (x, y), as MediaPipe returns them"""
+    return [SimpleNamespace(x=(x + i) / COLOUR_IMAGE_FULL_WIDTH, y=(y + i) / COLOUR_IMAGE_FULL_HEIGHT, z=0.0)
+            for i in range(21)]
+
+
+def result(*hands):
+    """HandLandmarkerResult with a (label, x, y) per hand"""
+    return SimpleNamespace(hand_landmarks=[landmarks(x, y) for _, x, y in hands],
+                           handedness=[[SimpleNamespace(category_name=label)] for label, _, _ in hands])
+
+
+def track(tracker, frame, *hands):
+    """Run a frame through the tracker like main.py does and return its hands and confidences"""
+    tracker.project(frame * FRAME_NS)
+    left, right = tracker.assign_hands(result(*hands))
+    confidences = tracker.confidences(left, right)
+    left = None if left is None else left.copy()
+    right = None if right is None else right.copy()
+    tracker.update(left, right, frame * FRAME_NS)
+    return left, right, confidences
+
+
+class GapFillTest(unittest.TestCase):
+    def test_missing_hand_is_filled_in_from_its_projection_with_decaying_confidence(self):
+        tracker = HandTracker(gap_fill_frames=2, gap_fill_decay=0.5)
+        track(tracker, 0, ("Left", 100, 500))
+        track(tracker, 1, ("Left", 110, 500))
+
+        left, right, confidences = track(tracker, 2)
+        self.assertTrue(tracker.left_hand_extrapolated)
+        self.assertIsNone(right)
+        self.assertEqual(confidences, [0.5, 0.0])
+        self.assertAlmostEqual(left[0, 0], 120, places=3)  # carried on at 10 pixels per frame
+
+        left, _, confidences = track(tracker, 3)
+        self.assertEqual(confidences, [0.25, 0.0])
+        self.assertAlmostEqual(left[0, 0], 130, places=3)
+
+        left, _, confidences = track(tracker, 4)
+        self.assertIsNone(left)
+        self.assertFalse(tracker.left_hand_extrapolated)
+        self.assertEqual(confidences, [0.0, 0.0])
+
+    def test_detected_hand_has_full_confidence_again(self):
+        tracker = HandTracker(gap_fill_frames=2)
+        track(tracker, 0, ("Left", 100, 500))
+        track(tracker, 1)
+        left, _, confidences = track(tracker, 2, ("Left", 105, 500))
+        self.assertFalse(tracker.left_hand_extrapolated)
+        self.assertEqual(confidences, [1.0, 0.0])
+        self.assertAlmostEqual(left[0, 0], 105, places=3)
+
+    def test_no_gap_fill_by_default(self):
+        tracker = HandTracker()
+        track(tracker, 0, ("Right", 1500, 500))
+        _, right, confidences = track(tracker, 1)
+        self.assertIsNone(right)
+        self.assertEqual(confidences, [0.0, 0.0])
+
+    def test_hand_that_was_never_seen_is_not_filled_in(self):
+        tracker = HandTracker(gap_fill_frames=2)
+        track(tracker, 0, ("Left", 100, 500))
+        _, right, _ = track(tracker, 1, ("Left", 100, 500))
+        self.assertIsNone(right)
+        self.assertFalse(tracker.right_hand_extrapolated)
+
+
+class HandednessAssignmentTest(unittest.TestCase):
+    def setUp(self):
+        self.tracker = HandTracker()
+
+    def test_untracked_hands_follow_their_labels(self):
+        left, right, _ = track(self.tracker, 0, ("Right", 1500, 500), ("Left", 100, 500))
+        self.assertAlmostEqual(left[0, 0], 100, places=3)
+        self.assertAlmostEqual(right[0, 0], 1500, places=3)
+        self.assertFalse(self.tracker.identity_swapped)
+
+    def test_two_hands_with_the_same_label_are_assigned_to_different_tracks(self):
+        left, right, _ = track(self.tracker, 0, ("Left", 100, 500), ("Left", 1500, 500))
+        self.assertIsNotNone(left)
+        self.assertIsNotNone(right)
+        self.assertNotEqual(left[0, 0], right[0, 0])
+
+    def test_tracking_overrides_swapped_labels_far_from_the_projections(self):
+        track(self.tracker, 0, ("Left", 100, 500), ("Right", 1500, 500))
+        left, right, _ = track(self.tracker, 1, ("Right", 105, 500), ("Left", 1495, 500))
+        self.assertAlmostEqual(left[0, 0], 105, places=3)
+        self.assertAlmostEqual(right[0, 0], 1495, places=3)
+        self.assertTrue(self.tracker.identity_swapped)
+
+    def test_labels_win_when_the_projections_are_closer_than_the_penalty(self):
+        track(self.tracker, 0, ("Left", 500, 500), ("Right", 560, 500))
+        left, right, _ = track(self.tracker, 1, ("Right", 505, 500), ("Left", 555, 500))
+        self.assertAlmostEqual(left[0, 0], 555, places=3)
+        self.assertAlmostEqual(right[0, 0], 505, places=3)
+        self.assertFalse(self.tracker.identity_swapped)
+
+    def test_single_hand_goes_to_the_nearest_track_against_its_label(self):
+        track(self.tracker, 0, ("Left", 100, 500), ("Right", 1500, 500))
+        left, right, _ = track(self.tracker, 1, ("Right", 105, 500))
+        self.assertAlmostEqual(left[0, 0], 105, places=3)
+        self.assertIsNone(right)
+        self.assertTrue(self.tracker.identity_swapped)
+
+    def test_single_hand_follows_its_label_when_the_other_track_is_free(self):
+        track(self.tracker, 0, ("Left", 100, 500))
+        left, right, _ = track(self.tracker, 1, ("Right", 105, 500))
+        self.assertIsNone(left)
+        self.assertAlmostEqual(right[0, 0], 105, places=3)
+
+
+
+class SpeedTest(unittest.TestCase):
+    def test_speed_is_the_projected_wrist_movement_of_the_fastest_tracked_hand(self):
+        tracker = HandTracker()
+        track(tracker, 0, ("Left", 100, 500), ("Right", 1500, 500))
+        track(tracker, 1, ("Left", 103, 504), ("Right", 1510, 500))
+        self.assertAlmostEqual(tracker.speed(), 10, places=3)
+
+    def test_lost_hand_does_not_count(self):
+        tracker = HandTracker()
+        track(tracker, 0, ("Left", 100, 500), ("Right", 1500, 500))
+        track(tracker, 1, ("Left", 103, 504), ("Right", 1510, 500))
+        track(tracker, 2, ("Left", 106, 508))
+        self.assertAlmostEqual(tracker.speed(), 5, places=3)
+
+
+class ProjectionTest(unittest.TestCase):
+    def setUp(self):
+        self.tracker = HandTracker()
+        track(self.tracker, 0, ("Left", 100, 500))
+        track(self.tracker, 1, ("Left", 110, 500))
+
+    def test_hand_is_projected_one_frame_interval_ahead(self):
+        self.assertAlmostEqual(self.tracker.projected_left_hand[0, 0], 120, places=3)
+
+    def test_projection_follows_the_capture_time_of_the_next_frame(self):
+        self.tracker.project(3 * FRAME_NS)  # a frame was dropped
+        self.assertAlmostEqual(self.tracker.projected_left_hand[0, 0], 130, places=3)
+        self.tracker.project(FRAME_NS + FRAME_NS // 2)
+        self.assertAlmostEqual(self.tracker.projected_left_hand[0, 0], 115, places=3)
+
+    def test_projection_is_limited_after_a_pause(self):
+        self.tracker.project(1000 * FRAME_NS)
+        self.assertAlmostEqual(self.tracker.projected_left_hand[0, 0], 110 + 10 * MAX_PROJECTION_INTERVALS, places=3)
+
+    def test_frame_captured_before_the_last_one_is_not_projected_backwards(self):
+        self.tracker.project(0)
+        self.assertAlmostEqual(self.tracker.projected_left_hand[0, 0], 110, places=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
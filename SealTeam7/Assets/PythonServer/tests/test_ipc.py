@@ -0,0 +1,289 @@
+import importlib.util
+import mmap
+import os
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+from ipc import (IPC, LinuxIPC, LinuxProducerIPC, READY_EVENT_NAME, HAND_LANDMARKS_SIZE, GESTURES_SIZE,
+                 OBJECT_DETECTIONS_SIZE, PIXEL_FORMATS, PIXEL_FORMAT_CHANNELS, HAND_PRESENT, HAND_EXTRAPOLATED,
+                 OBJECT_DETECTION_DTYPE, colour_image_segment_size, namespaced, read_seqlocked, seqlock_write)
+from metrics import STATS_SIZE, snapshot
+
+
+def create_ipc(frame_slots=1, latest_frame=False):
+    """Server side IPC on anonymous memory instead of named segments, with no semaphores"""
+    ipc = IPC('test', frame_slots, latest_frame)
+    ipc.colour_image_buffer = mmap.mmap(-1, colour_image_segment_size(frame_slots))
+    ipc.hand_landmarks_buffer = mmap.mmap(-1, HAND_LANDMARKS_SIZE)
+    ipc.gestures_buffer = mmap.mmap(-1, GESTURES_SIZE)
+    ipc.object_detections_buffer = mmap.mmap(-1, OBJECT_DETECTIONS_SIZE)
+    ipc.stats_buffer = mmap.mmap(-1, STATS_SIZE)
+    ipc._init_views()
+    return ipc
+
+
+def publish(ipc, seq, width=4, height=2, pixel_format='bgr'):
+    """Write frame seq into its slot like LinuxProducerIPC does, filled with its sequence number"""
+    ring = ipc.ring
+    slot = ring.slot(seq)
+    if ring.is_ring:
+        ring.slot_seqs[slot] = 0
+    header = ring.frame_headers[slot]
+    channels = PIXEL_FORMAT_CHANNELS[PIXEL_FORMATS[pixel_format]]
+    header["width"], header["height"], header["stride"] = width, height, width * channels
+    header["pixel_format"] = PIXEL_FORMATS[pixel_format]
+    header["capture_timestamp"] = seq * 1000
+    ring.frame(slot, header)[:] = seq
+    if ring.is_ring:
+        ring.slot_seqs[slot] = seq
+        ring.latest_seq = seq
+
+
+class FrameRingTest(unittest.TestCase):
+    def test_single_slot_returns_every_ready_post_as_a_new_frame(self):
+        ipc = create_ipc()
+        for seq in (1, 2, 3):
+            publish(ipc, seq)
+            read_seq, frame, header = ipc.read_frame()
+            self.assertEqual(read_seq, seq)
+            self.assertTrue((frame == seq).all())
+            self.assertEqual(header["capture_timestamp"], seq * 1000)
+            del frame
+        ipc.close()
+
+    def test_queued_frames_are_read_in_order(self):
+        ipc = create_ipc(frame_slots=3)
+        for seq in (1, 2, 3):
+            publish(ipc, seq)
+        self.assertEqual([ipc.read_frame()[0] for _ in range(3)], [1, 2, 3])
+        self.assertEqual(ipc.frames_dropped, 0)
+        ipc.close()
+
+    def test_latest_frame_skips_to_the_newest_frame_and_counts_the_rest_as_dropped(self):
+        ipc = create_ipc(frame_slots=3, latest_frame=True)
+        for seq in (1, 2, 3, 4):
+            publish(ipc, seq)
+        seq, frame, _ = ipc.read_frame()
+        self.assertEqual(seq, 4)
+        self.assertTrue((frame == 4).all())
+        self.assertEqual(ipc.frames_dropped, 3)
+        del frame
+        ipc.close()
+
+    def test_latest_frame_does_not_return_a_frame_twice(self):
+        ipc = create_ipc(frame_slots=3, latest_frame=True)
+        publish(ipc, 1)
+        publish(ipc, 2)
+        self.assertEqual(ipc.read_frame()[0], 2)
+        self.assertIsNone(ipc.read_frame())  # e.g. a leftover ready post
+        self.assertEqual(ipc.frames_dropped, 1)
+        publish(ipc, 3)
+        self.assertEqual(ipc.read_frame()[0], 3)
+        ipc.close()
+
+    def test_queued_mode_does_not_return_a_frame_twice(self):
+        ipc = create_ipc(frame_slots=3)
+        publish(ipc, 1)
+        self.assertEqual(ipc.read_frame()[0], 1)
+        self.assertIsNone(ipc.read_frame())
+        ipc.close()
+
+    def test_queued_mode_resynchronises_when_the_producer_skips_ahead(self):
+        ipc = create_ipc(frame_slots=3)
+        publish(ipc, 1)
+        self.assertEqual(ipc.read_frame()[0], 1)
+        for seq in (5, 6):
+            publish(ipc, seq)
+        self.assertEqual(ipc.read_frame()[0], 6)
+        ipc.close()
+
+    def test_frame_overwritten_while_being_read_is_invalid(self):
+        ipc = create_ipc(frame_slots=2, latest_frame=True)
+        publish(ipc, 1)
+        seq, frame, _ = ipc.read_frame()
+        del frame
+        publish(ipc, 2)
+        publish(ipc, 3)  # same slot as frame 1
+        self.assertFalse(ipc.frame_valid(seq))
+        self.assertEqual(ipc.frames_dropped, 1)
+        ipc.close()
+
+    def test_frames_dropped_from_several_threads_are_all_counted(self):
+        ipc = create_ipc(frame_slots=2, latest_frame=True)
+
+        def drop():
+            for _ in range(1000):
+                ipc.count_dropped()
+
+        threads = [threading.Thread(target=drop) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(ipc.frames_dropped, 4000)
+        self.assertEqual(int(snapshot(ipc.stats_buffer)[0]["frames_dropped"]), 4000)
+        ipc.close()
+
+    def test_invalid_frame_header_raises(self):
+        ipc = create_ipc()
+        publish(ipc, 1)
+        ipc.ring.frame_headers[0]["width"] = 4000
+        with self.assertRaises(ValueError):
+            ipc.read_frame()
+        ipc.close()
+
+
+class NamespaceTest(unittest.TestCase):
+    def test_default_namespace_keeps_the_plain_names(self):
+        self.assertEqual(namespaced("colour_image", ""), "colour_image")
+
+    def test_namespace_is_appended(self):
+        self.assertEqual(namespaced("colour_image", "table2"), "colour_image_table2")
+
+
+class SeqlockTest(unittest.TestCase):
+    def setUp(self):
+        self.ipc = create_ipc()
+
+    def tearDown(self):
+        self.ipc.close()
+
+    def read_hand_landmarks(self):
+        ipc = self.ipc
+        return read_seqlocked(ipc.hand_landmarks_header,
+                              lambda: (ipc.hand_landmarks_header.copy(), ipc.hand_landmarks.copy()))
+
+    def test_hand_landmarks_are_written_under_an_even_seq(self):
+        left = np.full((21, 3), 1, dtype=np.float32)
+        self.ipc.write_hand_landmarks(7, 7000, left, None)
+        self.ipc.write_hand_landmarks(8, 8000, left, left * 2, 8500, (False, True), (1, 0.5))
+        seq, (header, landmarks) = self.read_hand_landmarks()
+        self.assertEqual(seq, 4)
+        self.assertEqual(header["frame_id"], 8)
+        self.assertEqual(header["capture_timestamp"], 8000)
+        self.assertEqual(header["landmarks_timestamp"], 8500)
+        self.assertEqual(list(header["hand_flags"]), [HAND_PRESENT, HAND_PRESENT | HAND_EXTRAPOLATED])
+        self.assertEqual(list(header["hand_confidence"]), [1, 0.5])
+        self.assertTrue((landmarks[1] == 2).all())
+
+        self.ipc.write_hand_landmarks(9, 9000, None, None)
+        _, (header, landmarks) = self.read_hand_landmarks()
+        self.assertEqual(list(header["hand_flags"]), [0, 0])
+        self.assertFalse(landmarks.any())
+
+    def test_read_is_retried_when_a_write_happens_meanwhile(self):
+        header = self.ipc.hand_landmarks_header
+        reads = []
+
+        def read():
+            reads.append(int(header["frame_id"]))
+            if len(reads) == 1:
+                with seqlock_write(header):
+                    header["frame_id"] = 2
+            return int(header["frame_id"])
+
+        self.assertEqual(read_seqlocked(header, read), (2, 2))
+        self.assertEqual(reads, [0, 2])
+
+    def test_read_times_out_while_a_write_is_in_progress(self):
+        header = self.ipc.hand_landmarks_header
+        header["seq"] = 1
+        with self.assertRaises(TimeoutError):
+            read_seqlocked(header, header.copy, timeout=0.01)
+
+    def test_concurrent_reads_never_see_a_torn_write(self):
+        stop = threading.Event()
+
+        def write():
+            frame_id = 0
+            while not stop.is_set():
+                frame_id += 1
+                hand = np.full((21, 3), frame_id, dtype=np.float32)
+                self.ipc.write_hand_landmarks(frame_id, frame_id, hand, hand)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(2000):
+                _, (header, landmarks) = self.read_hand_landmarks()
+                self.assertTrue((landmarks == header["frame_id"]).all())
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_gestures_round_trip(self):
+        self.ipc.write_gestures(3, 3000, [1, 5], [0.5, 0.75])
+        _, gestures = read_seqlocked(self.ipc.gestures, self.ipc.gestures.copy)
+        self.assertEqual(gestures["seq"], 2)
+        self.assertEqual(gestures["frame_id"], 3)
+        self.assertEqual(list(gestures["gesture"]), [1, 5])
+        self.assertEqual(list(gestures["gesture_confidence"]), [0.5, 0.75])
+
+    def test_object_detections_clear_the_unused_entries(self):
+        detections = np.zeros(2, dtype=OBJECT_DETECTION_DTYPE)
+        detections["category"] = [1, 2]
+        detections["category_name"] = [b"bunker", b"spawner"]
+        self.ipc.write_object_detections(4, 4000, detections)
+        self.ipc.write_object_detections(5, 5000, detections[1:])
+        header = self.ipc.object_detections_header
+        self.assertEqual(header["seq"], 4)
+        self.assertEqual(header["count"], 1)
+        self.assertEqual(self.ipc.object_detections[0]["category_name"], b"spawner")
+        self.assertFalse(self.ipc.object_detections[1:].tobytes().strip(b"\0"))
+
+
+@unittest.skipUnless(sys.platform.startswith('linux') and importlib.util.find_spec('posix_ipc'), "needs POSIX IPC")
+class LinuxShutdownTest(unittest.TestCase):
+    NAMESPACE = f"test{os.getpid()}"
+
+    def setUp(self):
+        import posix_ipc
+        self.ipc = LinuxIPC(namespace=self.NAMESPACE)
+        self.ready = posix_ipc.Semaphore(namespaced(READY_EVENT_NAME, self.NAMESPACE))
+
+    def tearDown(self):
+        self.ready.close()
+
+    def test_no_ready_post_is_left_behind_when_a_frame_post_is_taken_at_shutdown(self):
+        self.ready.release()  # a frame arrives...
+        self.ipc.request_shutdown()  # ...just before shutdown posts the wake-up
+        self.assertFalse(self.ipc.wait_ready())  # takes the frame's post
+        self.ipc.close()
+        self.assertEqual(self.ready.value, 0)
+
+    def test_no_ready_post_is_left_behind_when_nobody_waited(self):
+        self.ipc.request_shutdown()
+        self.ipc.close()
+        self.assertEqual(self.ready.value, 0)
+
+
+@unittest.skipUnless(sys.platform.startswith('linux') and importlib.util.find_spec('posix_ipc'), "needs POSIX IPC")
+class LinuxProducerTest(unittest.TestCase):
+    NAMESPACE = f"test_producer{os.getpid()}"
+
+    def setUp(self):
+        self.ipc = LinuxIPC(namespace=self.NAMESPACE)
+
+    def tearDown(self):
+        self.ipc.close()
+
+    def test_handshake_completes_for_a_producer_opened_after_another_one_closed(self):
+        for run in range(2):  # e.g. two replays against the same server
+            producer = LinuxProducerIPC(self.NAMESPACE)
+            try:
+                producer.write_frame(np.full((2, 4, 3), run, dtype=np.uint8), 'bgr')
+                self.assertTrue(self.ipc.wait_ready(1.0))
+                _, frame, _ = self.ipc.read_frame()
+                self.assertTrue((frame == run).all())
+                del frame
+                self.ipc.set_done()
+                self.assertTrue(producer.wait_done(1.0))
+            finally:
+                producer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import threading
+import unittest
+
+from metrics import MAX_HISTOGRAMS, STATS_SIZE, Stats, bucket_index, bucket_upper_bounds, format_report, percentiles, \
+    snapshot
+
+
+class HistogramTest(unittest.TestCase):
+    def test_every_duration_falls_into_a_bucket_whose_upper_bound_is_not_below_it(self):
+        upper_bounds = bucket_upper_bounds()
+        for value in [0, 1, 127, 128, 129, 1000, 12345, 10 ** 6, 10 ** 9]:
+            index = bucket_index(value)
+            self.assertGreaterEqual(upper_bounds[index], value)
+            if index > 0:
+                self.assertLess(upper_bounds[index - 1], value)
+
+    def test_percentiles(self):
+        buckets = [0] * len(bucket_upper_bounds())
+        for value in range(1, 101):
+            buckets[bucket_index(value)] += 1
+        self.assertEqual(percentiles(buckets, (50, 95, 99)), [50, 95, 99])
+
+
+class StatsTest(unittest.TestCase):
+    def setUp(self):
+        self.buffer = bytearray(STATS_SIZE)
+        self.stats = Stats(self.buffer, 0)
+
+    def tearDown(self):
+        self.stats.release()
+
+    def test_records_and_counters_show_up_in_a_snapshot(self):
+        self.stats.record("Stage", 2_000_000)
+        self.stats.record("Stage", 4_000_000)
+        self.stats.add("frames_processed", 2)
+        self.stats.set("frames_dropped", 5)
+        header, histograms = snapshot(self.buffer)
+        self.assertEqual(int(header["frames_processed"]), 2)
+        self.assertEqual(int(header["frames_dropped"]), 5)
+        self.assertEqual(histograms[0]["name"], b"Stage")
+        self.assertEqual(int(histograms[0]["count"]), 2)
+        self.assertEqual(int(histograms[0]["total_ns"]), 6_000_000)
+        self.assertEqual(int(histograms[0]["max_ns"]), 4_000_000)
+        self.assertTrue(format_report(snapshot(self.buffer))[0].startswith("Stage: 2 frames, 3.0 ms/frame"))
+
+    def test_percentiles_are_reported_no_higher_than_the_max(self):
+        self.stats.record("Stage", 1_000_000_000)
+        self.assertIn("p99 1000.0 ms, max 1000.0 ms", format_report(snapshot(self.buffer))[0])
+
+    def test_stages_beyond_the_last_histogram_are_ignored(self):
+        for i in range(MAX_HISTOGRAMS + 2):
+            self.stats.record(f"Stage {i}", 1000)
+        self.assertEqual(len(snapshot(self.buffer)[1]), MAX_HISTOGRAMS)
+
+    def test_updates_from_several_threads_are_not_lost(self):
+        def work(name):
+            for _ in range(20000):
+                self.stats.add("frames_processed")
+                self.stats.record("Shared", 1000)
+                self.stats.record(name, 1000)
+
+        threads = [threading.Thread(target=work, args=(f"Thread {i}",)) for i in range(4)]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads often enough to interleave the updates
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        header, histograms = snapshot(self.buffer)
+        self.assertEqual(int(header["frames_processed"]), 80000)
+        counts = {histogram["name"].decode(): int(histogram["count"]) for histogram in histograms}
+        self.assertEqual(counts, {"Shared": 80000, **{f"Thread {i}": 20000 for i in range(4)}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from pipeline import Pipeline
+
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 30  # seconds
+
+
+class PipelineTest(unittest.TestCase):
+    def test_items_pass_through_every_stage_in_order(self):
+        produced = iter(range(1, 101))
+        results = []
+        done = threading.Event()
+
+        def collect(item):
+            results.append(item)
+            if item == 200:
+                done.set()
+
+        pipeline = Pipeline([("produce", lambda: next(produced, None)), ("double", lambda item: 2 * item),
+                             ("collect", collect)])
+        pipeline.start()
+        self.assertTrue(done.wait(TIMEOUT))
+        pipeline.stop()
+        pipeline.join()
+        self.assertEqual(results, [2 * i for i in range(1, 101)])
+
+    def test_error_in_a_stage_stops_the_pipeline_and_is_raised_by_join(self):
+        produced = iter(range(1, 1000))
+
+        def fail_on_fifth(item):
+            if item == 5:
+                raise RuntimeError("fifth item")
+            return item
+
+        pipeline = Pipeline([("produce", lambda: next(produced, None)), ("process", fail_on_fifth)])
+        pipeline.start()
+        self.assertTrue(pipeline.wait(TIMEOUT))
+        self.assertFalse(pipeline.running)
+        with self.assertRaises(RuntimeError):
+            pipeline.join()
+
+
+    def test_failing_stage_wakes_a_blocked_stage_and_join_raises(self):
+        wake = threading.Event()
+        count = 0
+
+        def capture():
+            nonlocal count
+            count += 1
+            if count > 5:
+                wake.wait()  # like wait_ready with no producer
+                return None
+            return count
+
+        def fail_on_fifth(item):
+            if item == 5:
+                raise RuntimeError("fifth item")
+            return item
+
+        pipeline = Pipeline([("capture", capture), ("process", fail_on_fifth)], on_error=lambda error: wake.set())
+        pipeline.start()
+        self.assertTrue(pipeline.wait(TIMEOUT))
+        joined = threading.Thread(target=lambda: self.assertRaises(RuntimeError, pipeline.join))
+        joined.start()
+        joined.join(TIMEOUT)
+        self.assertFalse(joined.is_alive())
+        self.assertTrue(wake.is_set())
+
+
+@unittest.skipUnless(sys.platform.startswith('linux') and importlib.util.find_spec('posix_ipc')
+                     and importlib.util.find_spec('mediapipe'), "needs posix_ipc and mediapipe on Linux")
+class FailingStageServerTest(unittest.TestCase):
+    def test_failing_stage_ends_the_server(self):
+        from ipc import LinuxProducerIPC
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Landmarks with 20 instead of 21 points per hand make post-processing raise on the first frame
+            script = os.path.join(directory, "bad_landmarks.npy")
+            np.save(script, np.full((1, 2, 20, 3), 0.5))
+            namespace = f"test_pipeline_{os.getpid()}"
+            server = subprocess.Popen([sys.executable, "-u", "main.py", "--platform", "linux", "--backend", "stub",
+                                       "--stub-landmarks", script, "--pipeline", "--frame-slots", "3",
+                                       "--namespace", namespace],
+                                      cwd=SERVER_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            try:
+                for line in server.stdout:
+                    if line.startswith("Ready."):
+                        break
+                producer = LinuxProducerIPC(namespace)
+                try:
+                    # A single frame, so that the capture stage is left waiting for the next one
+                    producer.write_frame(np.zeros((36, 64, 3), dtype=np.uint8), 'bgr')
+                    output = server.communicate(timeout=TIMEOUT)[0]
+                finally:
+                    producer.close()
+            finally:
+                if server.poll() is None:
+                    server.kill()
+                    server.wait()
+        self.assertNotEqual(server.returncode, 0)
+        self.assertIn("in process_results", output)  # the traceback of the failing stage
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+import numpy as np
+
+from roi import DetectionScheduler, RoiSelector, roi_scale_and_offset
+
+
+def hand(x, y, size=100):
+    """Landmarks (x, -z, y) spread over a size x size square with its top left corner at pixel (x, y)"""
+    landmarks = np.zeros((21, 3), dtype=np.float32)
+    landmarks[:, 0] = np.linspace(x, x + size, 21)
+    landmarks[:, 2] = np.linspace(y, y + size, 21)
+    return landmarks
+
+
+class RoiSelectorTest(unittest.TestCase):
+    def setUp(self):
+        self.selector = RoiSelector(margin=0.5, min_size=384, max_area=0.5)
+
+    def test_no_tracked_hands_means_the_full_frame(self):
+        self.assertIsNone(self.selector.select([]))
+
+    def test_region_is_centred_on_the_hand_and_at_least_min_size(self):
+        x, y, width, height = self.selector.select([hand(900, 500)])
+        self.assertEqual((width, height), (384, 384))
+        self.assertAlmostEqual(x + width / 2, 950, delta=1)
+        self.assertAlmostEqual(y + height / 2, 550, delta=1)
+
+    def test_region_covers_both_hands_with_their_margin(self):
+        x, y, width, height = self.selector.select([hand(500, 400, 200), hand(1000, 500, 200)])
+        self.assertLessEqual(x, 500 - 100)
+        self.assertLessEqual(y, 400 - 100)
+        self.assertGreaterEqual(x + width, 1200 + 100)
+        self.assertGreaterEqual(y + height, 700 + 100)
+
+    def test_region_is_clamped_to_the_frame(self):
+        x, y, width, height = self.selector.select([hand(10, 10)])
+        self.assertEqual((x, y), (0, 0))
+        x, y, width, height = self.selector.select([hand(1850, 1000, 60)])
+        self.assertLessEqual(x + width, 1920)
+        self.assertLessEqual(y + height, 1080)
+
+    def test_region_covering_too_much_of_the_frame_means_the_full_frame(self):
+        self.assertIsNone(self.selector.select([hand(100, 100, 200), hand(1600, 800, 200)]))
+
+
+class RoiScaleAndOffsetTest(unittest.TestCase):
+    def test_maps_the_corners_of_the_crop_to_full_frame_pixels(self):
+        scale, offset = roi_scale_and_offset((100, 200, 400, 300))
+        np.testing.assert_allclose(np.array([0, 0, 0]) * scale + offset, [100, 0, 200])
+        np.testing.assert_allclose(np.array([1, 0.5, 1]) * scale + offset, [500, -200, 500])
+
+
+class DetectionSchedulerTest(unittest.TestCase):
+    def run_frames(self, scheduler, speed, frames):
+        """Indices of the frames that run on the full frame"""
+        full_frames = []
+        for i in range(frames):
+            full_frame = scheduler.full_frame_due(speed)
+            scheduler.record(full_frame)
+            if full_frame:
+                full_frames.append(i)
+        return full_frames
+
+    def test_no_periodic_detection_by_default(self):
+        self.assertEqual(self.run_frames(DetectionScheduler(), 0, 100), [])
+
+    def test_still_hands_get_a_full_frame_every_max_interval_frames(self):
+        self.assertEqual(self.run_frames(DetectionScheduler(10), 0, 30), [9, 19, 29])
+
+    def test_interval_shrinks_with_the_speed_of_the_hands(self):
+        scheduler = DetectionScheduler(10, fast_speed=50)
+        self.assertEqual(scheduler.interval(25), 5)
+        self.assertEqual(scheduler.interval(50), 1)
+        self.assertEqual(scheduler.interval(500), 1)
+        self.assertEqual(self.run_frames(scheduler, 50, 3), [0, 1, 2])
+
+    def test_full_frame_for_another_reason_restarts_the_interval(self):
+        scheduler = DetectionScheduler(10)
+        self.run_frames(scheduler, 0, 5)
+        scheduler.record(True)  # e.g. a hand was lost
+        self.assertEqual(self.run_frames(scheduler, 0, 10), [9])
+
+
+if __name__ == '__main__':
+    unittest.main()
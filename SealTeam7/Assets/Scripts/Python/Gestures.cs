@@ -1,9 +1,21 @@
+using System.Runtime.InteropServices;
+
 namespace Python
 {
+    /// <summary>
+    /// The gestures memory mapped file (see ipc.py), written by the server with --gestures. The server increments Seq
+    /// before and after writing, so it is odd while a write is in progress.
+    /// </summary>
+    [StructLayout(LayoutKind.Sequential, Pack = 1)]
     public struct Gestures
     {
+        public ulong Seq;
+        public ulong FrameId;
+        public long CaptureTimestamp;  // Nanoseconds on the same clock as Stopwatch.GetTimestamp()
         public int Left;
         public int Right;
+        public float LeftConfidence;  // Score of the gesture in this frame, 0 if the hand is absent
+        public float RightConfidence;
 
         // Gestures:
         // None (0)
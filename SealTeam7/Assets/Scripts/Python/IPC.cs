@@ -7,20 +7,259 @@ using UnityEngine;
 
 namespace Python
 {
+    /// <summary>
+    /// Header at the start of the hand_landmarks memory mapped file (see ipc.py). The server increments Seq before and
+    /// after writing, so it is odd while a write is in progress.
+    /// </summary>
+    [StructLayout(LayoutKind.Sequential, Pack = 1)]
+    public struct HandLandmarksHeader
+    {
+        public ulong Seq;
+        public ulong FrameId;
+        public long CaptureTimestamp;  // Nanoseconds on the same clock as Stopwatch.GetTimestamp()
+        public uint LeftHandFlags;
+        public uint RightHandFlags;
+        public long LandmarksTimestamp;  // Time the landmarks are predicted for, CaptureTimestamp if not predicted
+        public float LeftHandConfidence;  // 1 if detected, lower the longer the hand has been filled in, 0 if absent
+        public float RightHandConfidence;
+    }
+
+    /// <summary>
+    /// Header at the start of each colour image slot (see ipc.py), describing the frame that follows it. The server
+    /// adapts to every frame, so any size up to IPC.ColourImageMaxWidth x IPC.ColourImageMaxHeight can be sent.
+    /// </summary>
+    [StructLayout(LayoutKind.Sequential, Pack = 1)]
+    public struct ColourFrameHeader
+    {
+        public uint Width;
+        public uint Height;
+        public uint Stride;  // Bytes from the start of one row to the next
+        public uint PixelFormat;  // IPC.PixelFormat*
+        public long CaptureTimestamp;  // Nanoseconds on the same clock as Stopwatch.GetTimestamp(), 0 if unknown
+    }
+
+    /// <summary>
+    /// Header at the start of the object_detections memory mapped file (see ipc.py), written by the server with
+    /// --object-detection. Objects are only detected in some frames, so FrameId lags behind the hand landmarks.
+    /// </summary>
+    [StructLayout(LayoutKind.Sequential, Pack = 1)]
+    public struct ObjectDetectionsHeader
+    {
+        public ulong Seq;
+        public ulong FrameId;
+        public long CaptureTimestamp;  // Nanoseconds on the same clock as Stopwatch.GetTimestamp()
+        public uint Count;  // Number of detections that follow, at most IPC.MaxObjectDetections
+    }
+
+    /// <summary>One object detected by the server, the box in pixels of the full 1920x1080 frame</summary>
+    [StructLayout(LayoutKind.Sequential, Pack = 1)]
+    public unsafe struct ObjectDetection
+    {
+        public int Category;  // Index in the model's label map
+        public float Score;
+        public float X;
+        public float Y;
+        public float Width;
+        public float Height;
+        public fixed byte CategoryNameBytes[24];  // NUL padded
+
+        public string CategoryName
+        {
+            get
+            {
+                fixed (byte* name = CategoryNameBytes)
+                {
+                    var length = 0;
+                    while (length < 24 && name[length] != 0) length++;
+                    return System.Text.Encoding.ASCII.GetString(name, length);
+                }
+            }
+        }
+    }
+
     public abstract unsafe class IPC : IDisposable
     {
+        public const uint HandPresent = 1;
+        public const uint HandExtrapolated = 2;  // Not detected in this frame, filled in from its projected position
+
+        public const uint PixelFormatRgb = 1;
+        public const uint PixelFormatBgr = 2;
+        public const uint PixelFormatBgra = 3;  // The Kinect's own layout
+        public const int ColourImageMaxWidth = 1920;
+        public const int ColourImageMaxHeight = 1080;
+        public const int ColourFrameCapacity = ColourImageMaxWidth * ColourImageMaxHeight * 4;
+        public const int MaxObjectDetections = 16;
+
+        // colour_image holds a ring header and one slot: a ColourFrameHeader followed by the frame (see ipc.py)
+        protected const int ColourImageRingHeaderSize = 64;
+        protected const int ColourFrameHeaderSize = 64;
+        protected const int ColourImageSize = ColourImageRingHeaderSize + ColourFrameHeaderSize + ColourFrameCapacity;
+
         protected const string ColourImageFileName = "colour_image";
         protected const string HandLandmarksFileName = "hand_landmarks";
-        // protected const string GesturesFileName = "gestures";
+        protected const string GesturesFileName = "gestures";
+        protected const string ObjectDetectionsFileName = "object_detections";
         protected const string ReadyEventName = "SealTeam7ColourImageReady";
         protected const string DoneEventName = "SealTeam7HandLandmarksDone";
+        protected const int HandLandmarksHeaderSize = 64;
+        protected const int HandLandmarksSize = HandLandmarksHeaderSize + 2 * 21 * 3 * sizeof(float);
+        protected const int GesturesSize = 64;
+        protected const int ObjectDetectionsHeaderSize = 64;
+        protected const int ObjectDetectionsSize = ObjectDetectionsHeaderSize + MaxObjectDetections * 48;
+
+        /// <summary>
+        /// Name of a memory mapped file or event of the server for one table (see namespaced in ipc.py). The default
+        /// namespace "" is used when there is a single table.
+        /// </summary>
+        protected static string Namespaced(string name, string tableNamespace)
+        {
+            return string.IsNullOrEmpty(tableNamespace) ? name : name + "_" + tableNamespace;
+        }
 
         public abstract byte* AcquireColourImagePtr();
         public abstract void ReleaseColourImagePtr();
-        public abstract void ReadHandLandmarksArray(int start, Vector3[] handLandmarks);
+        protected abstract byte* AcquireHandLandmarksPtr();
+        protected abstract void ReleaseHandLandmarksPtr();
+        protected abstract byte* AcquireGesturesPtr();
+        protected abstract void ReleaseGesturesPtr();
+        protected abstract byte* AcquireObjectDetectionsPtr();
+        protected abstract void ReleaseObjectDetectionsPtr();
         public abstract void SetReady();
         public abstract void WaitDone();
         public abstract void Dispose();
+
+        /// <summary>
+        /// Write the header of the next frame and return a pointer to where its rows go, stride bytes apart. Call
+        /// ReleaseColourImagePtr once they are written.
+        /// </summary>
+        public byte* AcquireColourFramePtr(int width, int height, int stride, uint pixelFormat, long captureTimestamp)
+        {
+            var ptr = AcquireColourImagePtr();
+            var header = (ColourFrameHeader*)(ptr + ColourImageRingHeaderSize);
+            header->Width = (uint)width;
+            header->Height = (uint)height;
+            header->Stride = (uint)stride;
+            header->PixelFormat = pixelFormat;
+            header->CaptureTimestamp = captureTimestamp;
+            return ptr + ColourImageRingHeaderSize + ColourFrameHeaderSize;
+        }
+
+        /// <summary>Convert Stopwatch ticks to the nanoseconds used for timestamps in shared memory</summary>
+        public static long TicksToNanoseconds(long ticks)
+        {
+            var frequency = System.Diagnostics.Stopwatch.Frequency;
+            return ticks / frequency * 1_000_000_000 + ticks % frequency * 1_000_000_000 / frequency;
+        }
+
+        /// <summary>
+        /// Copy the most recent hand landmarks into left and right (21 landmarks each) without waiting for the done
+        /// event, retrying if the server is writing at the same time. Returns false if nothing has been written yet.
+        /// </summary>
+        public bool ReadHandLandmarks(Vector3[] left, Vector3[] right, out HandLandmarksHeader header)
+        {
+            var ptr = AcquireHandLandmarksPtr();
+            try
+            {
+                var seqPtr = (ulong*)ptr;
+                var landmarksPtr = (Vector3*)(ptr + HandLandmarksHeaderSize);
+                var spinWait = new SpinWait();
+                while (true)
+                {
+                    var before = Volatile.Read(ref *seqPtr);
+                    if ((before & 1) == 0)
+                    {
+                        header = *(HandLandmarksHeader*)ptr;
+                        fixed (Vector3* leftPtr = left, rightPtr = right)
+                        {
+                            Buffer.MemoryCopy(landmarksPtr, leftPtr, 21 * sizeof(Vector3), 21 * sizeof(Vector3));
+                            Buffer.MemoryCopy(landmarksPtr + 21, rightPtr, 21 * sizeof(Vector3), 21 * sizeof(Vector3));
+                        }
+                        Thread.MemoryBarrier();
+                        if (Volatile.Read(ref *seqPtr) == before)
+                        {
+                            return before != 0;
+                        }
+                    }
+                    spinWait.SpinOnce();
+                }
+            }
+            finally
+            {
+                ReleaseHandLandmarksPtr();
+            }
+        }
+
+        /// <summary>
+        /// Copy the most recent gestures without waiting for the done event, retrying if the server is writing at the
+        /// same time. Returns false if nothing has been written yet, e.g. because the server runs without --gestures.
+        /// </summary>
+        public bool ReadGestures(out Gestures gestures)
+        {
+            var ptr = AcquireGesturesPtr();
+            try
+            {
+                var seqPtr = (ulong*)ptr;
+                var spinWait = new SpinWait();
+                while (true)
+                {
+                    var before = Volatile.Read(ref *seqPtr);
+                    if ((before & 1) == 0)
+                    {
+                        gestures = *(Gestures*)ptr;
+                        Thread.MemoryBarrier();
+                        if (Volatile.Read(ref *seqPtr) == before)
+                        {
+                            return before != 0;
+                        }
+                    }
+                    spinWait.SpinOnce();
+                }
+            }
+            finally
+            {
+                ReleaseGesturesPtr();
+            }
+        }
+
+        /// <summary>
+        /// Copy the most recently detected objects into detections (MaxObjectDetections long), retrying if the server
+        /// is writing at the same time. header.Count says how many are valid. Returns false if nothing has been
+        /// written yet, e.g. because the server runs without --object-detection.
+        /// </summary>
+        public bool ReadObjectDetections(ObjectDetection[] detections, out ObjectDetectionsHeader header)
+        {
+            var ptr = AcquireObjectDetectionsPtr();
+            try
+            {
+                var seqPtr = (ulong*)ptr;
+                var detectionsPtr = (ObjectDetection*)(ptr + ObjectDetectionsHeaderSize);
+                var spinWait = new SpinWait();
+                while (true)
+                {
+                    var before = Volatile.Read(ref *seqPtr);
+                    if ((before & 1) == 0)
+                    {
+                        header = *(ObjectDetectionsHeader*)ptr;
+                        header.Count = Math.Min(header.Count, MaxObjectDetections);
+                        fixed (ObjectDetection* outPtr = detections)
+                        {
+                            Buffer.MemoryCopy(detectionsPtr, outPtr, detections.Length * sizeof(ObjectDetection),
+                                header.Count * sizeof(ObjectDetection));
+                        }
+                        Thread.MemoryBarrier();
+                        if (Volatile.Read(ref *seqPtr) == before)
+                        {
+                            return before != 0;
+                        }
+                    }
+                    spinWait.SpinOnce();
+                }
+            }
+            finally
+            {
+                ReleaseObjectDetectionsPtr();
+            }
+        }
     }
 
 
@@ -28,29 +267,35 @@ namespace Python
     {
         private readonly MemoryMappedFile _colourImageMemory;
         private readonly MemoryMappedFile _handLandmarksMemory;
-        // private readonly MemoryMappedFile _gesturesMemory;
+        private readonly MemoryMappedFile _gesturesMemory;
+        private readonly MemoryMappedFile _objectDetectionsMemory;
         private readonly MemoryMappedViewAccessor _colourImageViewAccessor;
         private readonly SafeMemoryMappedViewHandle _colourImageViewHandle;
         private readonly MemoryMappedViewAccessor _handLandmarksViewAccessor;
         private readonly SafeMemoryMappedViewHandle _handLandmarksViewHandle;
-        // private readonly MemoryMappedViewAccessor _gesturesViewAccessor;
-        // private readonly SafeMemoryMappedViewHandle _gesturesViewHandle;
+        private readonly MemoryMappedViewAccessor _gesturesViewAccessor;
+        private readonly SafeMemoryMappedViewHandle _gesturesViewHandle;
+        private readonly MemoryMappedViewAccessor _objectDetectionsViewAccessor;
+        private readonly SafeMemoryMappedViewHandle _objectDetectionsViewHandle;
         private readonly EventWaitHandle _readyEvent;
         private readonly EventWaitHandle _doneEvent;
         
-        public WindowsIPC()
+        public WindowsIPC(string tableNamespace = "")
         {
-            _colourImageMemory = MemoryMappedFile.OpenExisting(ColourImageFileName, MemoryMappedFileRights.Write);
-            _handLandmarksMemory = MemoryMappedFile.OpenExisting(HandLandmarksFileName, MemoryMappedFileRights.Read);
-            // _gesturesMemory = MemoryMappedFile.OpenExisting(GesturesFileName, MemoryMappedFileRights.Read);
+            _colourImageMemory = MemoryMappedFile.OpenExisting(Namespaced(ColourImageFileName, tableNamespace), MemoryMappedFileRights.Write);
+            _handLandmarksMemory = MemoryMappedFile.OpenExisting(Namespaced(HandLandmarksFileName, tableNamespace), MemoryMappedFileRights.Read);
+            _gesturesMemory = MemoryMappedFile.OpenExisting(Namespaced(GesturesFileName, tableNamespace), MemoryMappedFileRights.Read);
+            _objectDetectionsMemory = MemoryMappedFile.OpenExisting(Namespaced(ObjectDetectionsFileName, tableNamespace), MemoryMappedFileRights.Read);
             _colourImageViewAccessor = _colourImageMemory.CreateViewAccessor(0, 0, MemoryMappedFileAccess.Write);
             _colourImageViewHandle = _colourImageViewAccessor.SafeMemoryMappedViewHandle;
             _handLandmarksViewAccessor = _handLandmarksMemory.CreateViewAccessor(0, 0, MemoryMappedFileAccess.Read);
             _handLandmarksViewHandle = _handLandmarksViewAccessor.SafeMemoryMappedViewHandle;
-            // _gesturesViewAccessor = _gesturesMemory.CreateViewAccessor(0, 0, MemoryMappedFileAccess.Read);
-            // _gesturesViewHandle = _gesturesViewAccessor.SafeMemoryMappedViewHandle;
-            _readyEvent = new EventWaitHandle(false, EventResetMode.AutoReset, ReadyEventName);
-            _doneEvent = new EventWaitHandle(false, EventResetMode.AutoReset, DoneEventName);
+            _gesturesViewAccessor = _gesturesMemory.CreateViewAccessor(0, 0, MemoryMappedFileAccess.Read);
+            _gesturesViewHandle = _gesturesViewAccessor.SafeMemoryMappedViewHandle;
+            _objectDetectionsViewAccessor = _objectDetectionsMemory.CreateViewAccessor(0, 0, MemoryMappedFileAccess.Read);
+            _objectDetectionsViewHandle = _objectDetectionsViewAccessor.SafeMemoryMappedViewHandle;
+            _readyEvent = new EventWaitHandle(false, EventResetMode.AutoReset, Namespaced(ReadyEventName, tableNamespace));
+            _doneEvent = new EventWaitHandle(false, EventResetMode.AutoReset, Namespaced(DoneEventName, tableNamespace));
         }
 
         public override byte* AcquireColourImagePtr()
@@ -65,9 +310,40 @@ namespace Python
             _colourImageViewHandle.ReleasePointer();
         }
         
-        public override void ReadHandLandmarksArray(int start, Vector3[] handLandmarks)
+        protected override byte* AcquireHandLandmarksPtr()
+        {
+            byte* ptr = null;
+            _handLandmarksViewHandle.AcquirePointer(ref ptr);
+            return ptr;
+        }
+
+        protected override void ReleaseHandLandmarksPtr()
         {
-            _handLandmarksViewAccessor.ReadArray(start, handLandmarks, 0, 21);
+            _handLandmarksViewHandle.ReleasePointer();
+        }
+
+        protected override byte* AcquireGesturesPtr()
+        {
+            byte* ptr = null;
+            _gesturesViewHandle.AcquirePointer(ref ptr);
+            return ptr;
+        }
+
+        protected override void ReleaseGesturesPtr()
+        {
+            _gesturesViewHandle.ReleasePointer();
+        }
+
+        protected override byte* AcquireObjectDetectionsPtr()
+        {
+            byte* ptr = null;
+            _objectDetectionsViewHandle.AcquirePointer(ref ptr);
+            return ptr;
+        }
+
+        protected override void ReleaseObjectDetectionsPtr()
+        {
+            _objectDetectionsViewHandle.ReleasePointer();
         }
         
         public override void SetReady()
@@ -86,11 +362,14 @@ namespace Python
             _colourImageViewAccessor.Dispose();
             _handLandmarksViewHandle.Dispose();
             _handLandmarksViewAccessor.Dispose();
-            // _gesturesViewHandle.Dispose();
-            // _gesturesViewAccessor.Dispose();
+            _gesturesViewHandle.Dispose();
+            _gesturesViewAccessor.Dispose();
+            _objectDetectionsViewHandle.Dispose();
+            _objectDetectionsViewAccessor.Dispose();
             _colourImageMemory.Dispose();
             _handLandmarksMemory.Dispose();
-            // _gesturesMemory.Dispose();
+            _gesturesMemory.Dispose();
+            _objectDetectionsMemory.Dispose();
             _readyEvent.Dispose();
             _doneEvent.Dispose();
         }
@@ -109,25 +388,33 @@ namespace Python
 
         private int colourImageShmFd;
         private int handLandmarksShmFd;
+        private int gesturesShmFd;
+        private int objectDetectionsShmFd;
         private byte* _colourImagePtr;
         private byte* _handLandmarksPtr;
+        private byte* _gesturesPtr;
+        private byte* _objectDetectionsPtr;
         
         private readonly void* _readySem;
         private readonly void* _doneSem;
 
-        public LinuxIPC()
+        public LinuxIPC(string tableNamespace = "")
         {
             // Open shared memory segments
-            colourImageShmFd = shm_open("/" + ColourImageFileName, O_RDWR, 0644);  // read/write
-            handLandmarksShmFd = shm_open("/" + HandLandmarksFileName, O_RDWR, 0644); // read only
+            colourImageShmFd = shm_open("/" + Namespaced(ColourImageFileName, tableNamespace), O_RDWR, 0644);  // read/write
+            handLandmarksShmFd = shm_open("/" + Namespaced(HandLandmarksFileName, tableNamespace), O_RDWR, 0644); // read only
+            gesturesShmFd = shm_open("/" + Namespaced(GesturesFileName, tableNamespace), O_RDWR, 0644); // read only
+            objectDetectionsShmFd = shm_open("/" + Namespaced(ObjectDetectionsFileName, tableNamespace), O_RDWR, 0644); // read only
             
             // Attach shared memory segments
-            _colourImagePtr = (byte*)mmap(null, 1920*1080*3, PROT_READ | PROT_WRITE, MAP_SHARED, colourImageShmFd, 0);
-            _handLandmarksPtr = (byte*)mmap(null, 21*3*2*4, PROT_READ | PROT_WRITE, MAP_SHARED, handLandmarksShmFd, 0);
+            _colourImagePtr = (byte*)mmap(null, ColourImageSize, PROT_READ | PROT_WRITE, MAP_SHARED, colourImageShmFd, 0);
+            _handLandmarksPtr = (byte*)mmap(null, HandLandmarksSize, PROT_READ | PROT_WRITE, MAP_SHARED, handLandmarksShmFd, 0);
+            _gesturesPtr = (byte*)mmap(null, GesturesSize, PROT_READ | PROT_WRITE, MAP_SHARED, gesturesShmFd, 0);
+            _objectDetectionsPtr = (byte*)mmap(null, ObjectDetectionsSize, PROT_READ | PROT_WRITE, MAP_SHARED, objectDetectionsShmFd, 0);
             
             // Open semaphores
-            _readySem = sem_open("/" + ReadyEventName, 0x0000);
-            _doneSem = sem_open("/" + DoneEventName, 0x0000);
+            _readySem = sem_open("/" + Namespaced(ReadyEventName, tableNamespace), 0x0000);
+            _doneSem = sem_open("/" + Namespaced(DoneEventName, tableNamespace), 0x0000);
         }
 
         public override byte* AcquireColourImagePtr()
@@ -140,12 +427,34 @@ namespace Python
             // No need to release pointer as it's managed by the class
         }
 
-        public override void ReadHandLandmarksArray(int start, Vector3[] handLandmarks)
+        protected override byte* AcquireHandLandmarksPtr()
         {
-            fixed (Vector3* destPtr = handLandmarks)
-            {
-                Buffer.MemoryCopy(_handLandmarksPtr + start, destPtr, handLandmarks.Length * sizeof(Vector3), handLandmarks.Length * sizeof(Vector3));
-            }
+            return _handLandmarksPtr;
+        }
+
+        protected override void ReleaseHandLandmarksPtr()
+        {
+            // No need to release pointer as it's managed by the class
+        }
+
+        protected override byte* AcquireGesturesPtr()
+        {
+            return _gesturesPtr;
+        }
+
+        protected override void ReleaseGesturesPtr()
+        {
+            // No need to release pointer as it's managed by the class
+        }
+
+        protected override byte* AcquireObjectDetectionsPtr()
+        {
+            return _objectDetectionsPtr;
+        }
+
+        protected override void ReleaseObjectDetectionsPtr()
+        {
+            // No need to release pointer as it's managed by the class
         }
 
         public override void SetReady()
@@ -161,10 +470,14 @@ namespace Python
         public override void Dispose()
         {
             // Detach shared memory segments
-            munmap(_colourImagePtr, 1920 * 1080 * 3);
-            munmap(_handLandmarksPtr, 21 * 3 * 2 * 4);
+            munmap(_colourImagePtr, ColourImageSize);
+            munmap(_handLandmarksPtr, HandLandmarksSize);
+            munmap(_gesturesPtr, GesturesSize);
+            munmap(_objectDetectionsPtr, ObjectDetectionsSize);
             close(colourImageShmFd);
             close(handLandmarksShmFd);
+            close(gesturesShmFd);
+            close(objectDetectionsShmFd);
         }
         
         [DllImport("libc", SetLastError = true)]
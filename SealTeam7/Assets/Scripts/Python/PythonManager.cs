@@ -1,4 +1,5 @@
 using System;
+using System.Collections.Generic;
 using System.Diagnostics;
 using K4AdotNet.Sensor;
 using UnityEngine;
@@ -10,8 +11,14 @@ namespace Python
     {
         public static bool FlipX { get; set; } = true;
         public static bool FlipHandedness { get; set; } = false;
+        /// <summary>Namespace of the server for this table (main.py --namespace), empty for a single table</summary>
+        public static string Namespace { get; set; } = "";
         public static HandLandmarks HandLandmarks => _handLandmarks;
-        // public static Gestures Gestures => _gestures;
+        public static HandLandmarksHeader HandLandmarksHeader => _handLandmarksHeader;
+        public static Gestures Gestures => _gestures;
+        /// <summary>Most recently detected objects, the first ObjectDetectionsHeader.Count of them are valid</summary>
+        public static ObjectDetection[] ObjectDetections => _objectDetections;
+        public static ObjectDetectionsHeader ObjectDetectionsHeader => _objectDetectionsHeader;
         public static bool IsInitialized { get; private set; } = false;
         
         private const int PythonImageWidth = 1920;
@@ -21,8 +28,12 @@ namespace Python
         private static HandLandmarks _handLandmarks;  // Sometimes has a reference to _left/rightHandLandmarks
         private static Vector3[] _leftHandLandmarks;
         private static Vector3[] _rightHandLandmarks;
-        private static Vector3[] _handLandmarksBuffer;  // Temporary buffer for reading hand landmarks
-        // private static Gestures _gestures;
+        private static Vector3[] _leftHandLandmarksBuffer;  // Temporary buffers for reading hand landmarks
+        private static Vector3[] _rightHandLandmarksBuffer;
+        private static HandLandmarksHeader _handLandmarksHeader;
+        private static Gestures _gestures;
+        private static ObjectDetection[] _objectDetections;
+        private static ObjectDetectionsHeader _objectDetectionsHeader;
 
         public static bool Initialize()
         {
@@ -30,17 +41,19 @@ namespace Python
                 if (Application.platform == RuntimePlatform.WindowsEditor ||
                     Application.platform == RuntimePlatform.WindowsPlayer)
                 {
-                    _ipc = new WindowsIPC();
+                    _ipc = new WindowsIPC(Namespace);
                 }
                 else
                 {
-                    _ipc = new LinuxIPC();
+                    _ipc = new LinuxIPC(Namespace);
                 }
                 _handLandmarks = new HandLandmarks();
                 _leftHandLandmarks = new Vector3[21];
                 _rightHandLandmarks = new Vector3[21];
-                _handLandmarksBuffer = new Vector3[21];
-                // _gestures = new Gestures();
+                _leftHandLandmarksBuffer = new Vector3[21];
+                _rightHandLandmarksBuffer = new Vector3[21];
+                _gestures = new Gestures();
+                _objectDetections = new ObjectDetection[IPC.MaxObjectDetections];
                 IsInitialized = true;
                 return true;
             }
@@ -59,27 +72,28 @@ namespace Python
                 return _handLandmarks;
             }
 
-            // var kinectImage = colourImage.Memory.Span;
-            byte[] tempBuffer = new byte[colourImage.SizeBytes];
-            colourImage.CopyTo(tempBuffer);
-            
-            // Write the colour image to the memory mapped file as RGB
-            // Debug.Log($"kinect image length: {kinectImage.Length}, colour image buffer size: {_colourImageBufferStream.Capacity}");
+            if (colourImage.Format != ImageFormat.ColorBgra32 || colourImage.WidthPixels > IPC.ColourImageMaxWidth ||
+                colourImage.HeightPixels > IPC.ColourImageMaxHeight || colourImage.SizeBytes > IPC.ColourFrameCapacity) {
+                Debug.LogError($"Cannot process frame: expected a BGRA image of at most {IPC.ColourImageMaxWidth}x" +
+                               $"{IPC.ColourImageMaxHeight}, got a {colourImage.Format} image of " +
+                               $"{colourImage.WidthPixels}x{colourImage.HeightPixels}");
+                return _handLandmarks;
+            }
+
+            // Write the colour image to the memory mapped file as is (BGRA at the camera's resolution), described by
+            // the frame header, the server converts it to RGB
+            // The system timestamp is when the host received the image from the Kinect, read from the same clock as
+            // Stopwatch and the server's perf counter, so the server can track the hands by when the frames were taken
+            var captureTimestamp = colourImage.SystemTimestamp.ValueNsec;
+            if (captureTimestamp == 0) {
+                captureTimestamp = IPC.TicksToNanoseconds(Stopwatch.GetTimestamp());
+            }
             var stopwatch = new Stopwatch();
             stopwatch.Start();
-            byte* destPtr = _ipc.AcquireColourImagePtr();
-            fixed (byte* srcPtr = tempBuffer)
-            {
-                byte* src = srcPtr;
-                for (int i = 0; i < tempBuffer.Length; i += 4)
-                {
-                    *destPtr++ = *(src + 2);  // R
-                    // Debug.Log($"destPtr-1: {*(destPtr-1)}");
-                    *destPtr++ = *(src + 1);  // G
-                    *destPtr++ = *src;        // B
-                    src += 4;              // Skip to next pixel (including alpha)
-                }
-            }
+            byte* destPtr = _ipc.AcquireColourFramePtr(colourImage.WidthPixels, colourImage.HeightPixels,
+                colourImage.StrideBytes, IPC.PixelFormatBgra, captureTimestamp);
+            System.Buffer.MemoryCopy(colourImage.Buffer.ToPointer(), destPtr, IPC.ColourFrameCapacity,
+                colourImage.SizeBytes);
             
             _ipc.ReleaseColourImagePtr();
             stopwatch.Stop();
@@ -94,8 +108,8 @@ namespace Python
             
             // Read the hand landmarks from the memory mapped file
             stopwatch.Restart();
-            _ipc.ReadHandLandmarksArray(0, _handLandmarksBuffer);
-            if (_handLandmarksBuffer[0].x == 0f)
+            _ipc.ReadHandLandmarks(_leftHandLandmarksBuffer, _rightHandLandmarksBuffer, out _handLandmarksHeader);
+            if ((_handLandmarksHeader.LeftHandFlags & IPC.HandPresent) == 0)
             {
                 _handLandmarks.Left = null;
             }
@@ -104,14 +118,13 @@ namespace Python
                 for (var i = 0; i < 21; i++)
                 {
                     _leftHandLandmarks[i].x =
-                        FlipX ? PythonImageWidth - _handLandmarksBuffer[i].x : _handLandmarksBuffer[i].x;
-                    _leftHandLandmarks[i].y = _handLandmarksBuffer[i].y;
-                    _leftHandLandmarks[i].z = _handLandmarksBuffer[i].z;
+                        FlipX ? PythonImageWidth - _leftHandLandmarksBuffer[i].x : _leftHandLandmarksBuffer[i].x;
+                    _leftHandLandmarks[i].y = _leftHandLandmarksBuffer[i].y;
+                    _leftHandLandmarks[i].z = _leftHandLandmarksBuffer[i].z;
                 }
                 _handLandmarks.Left = _leftHandLandmarks;
             }
-            _ipc.ReadHandLandmarksArray(21*3*4, _handLandmarksBuffer);
-            if (_handLandmarksBuffer[0].x == 0f)
+            if ((_handLandmarksHeader.RightHandFlags & IPC.HandPresent) == 0)
             {
                 _handLandmarks.Right = null;
             }
@@ -120,19 +133,48 @@ namespace Python
                 for (var i = 0; i < 21; i++)
                 {
                     _rightHandLandmarks[i].x =
-                        FlipX ? PythonImageWidth - _handLandmarksBuffer[i].x : _handLandmarksBuffer[i].x;
-                    _rightHandLandmarks[i].y = _handLandmarksBuffer[i].y;
-                    _rightHandLandmarks[i].z = _handLandmarksBuffer[i].z;
+                        FlipX ? PythonImageWidth - _rightHandLandmarksBuffer[i].x : _rightHandLandmarksBuffer[i].x;
+                    _rightHandLandmarks[i].y = _rightHandLandmarksBuffer[i].y;
+                    _rightHandLandmarks[i].z = _rightHandLandmarksBuffer[i].z;
                 }
                 _handLandmarks.Right = _rightHandLandmarks;
             }
 
+            _ipc.ReadGestures(out _gestures);
+            _ipc.ReadObjectDetections(_objectDetections, out _objectDetectionsHeader);
+
             stopwatch.Stop();
             Debug.Log($"Reading hand landmarks from memory mapped file: {stopwatch.ElapsedMilliseconds} ms");
 
             return _handLandmarks;
         }
         
+        /// <summary>
+        /// The sandbox objects among the most recently detected objects, at the centre of their bounding boxes in the
+        /// same pixel coordinates as the hand landmarks
+        /// </summary>
+        public static List<SandboxObject> GetSandboxObjects()
+        {
+            var sandboxObjects = new List<SandboxObject>();
+            for (var i = 0; i < _objectDetectionsHeader.Count; i++)
+            {
+                var detection = _objectDetections[i];
+                var x = detection.X + detection.Width / 2;
+                var y = detection.Y + detection.Height / 2;
+                if (FlipX) x = PythonImageWidth - x;
+                switch (detection.CategoryName.ToLowerInvariant())
+                {
+                    case "bunker":
+                        sandboxObjects.Add(new SandboxObject.Bunker(x, y));
+                        break;
+                    case "spawner":
+                        sandboxObjects.Add(new SandboxObject.Spawner(x, y));
+                        break;
+                }
+            }
+            return sandboxObjects;
+        }
+
         public static void Dispose()
         {
             if (!IsInitialized) {